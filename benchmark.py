@@ -0,0 +1,223 @@
+"""离线性能基准：在本地模拟服务器（mock_server.py）上运行 crawler.py 的各阶段，统计吞吐量、耗时和内存
+
+    python benchmark.py                                   # 默认 1k/10k/100k 个直播
+    python benchmark.py --sizes 1000 --workers 16 --output bench.json
+    python benchmark.py --sizes 1000 --baseline bench.json  # 与之前的结果比较，变慢超过容差时退出码为 1
+
+每个规模在独立的子进程中运行（峰值内存互不影响），模拟服务器也运行在单独的进程中，不与爬虫争用 GIL。
+统计的阶段：
+    list    列表数据（接口1），复用基准创建的 session，不包含启动浏览器读取凭据的时间
+    enrich  合并下载接口2~5（输出 CSV）
+    excel   把列表之外的三个输出渲染为 xlsx
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TOLERANCE = 0.2     # 与基准结果比较时，耗时增加超过该比例视为性能退化
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def server_requests(base_url):
+    """模拟服务器各接口累计收到的请求数之和"""
+    with urllib.request.urlopen(f'{base_url}/__stats') as resp:
+        stats = json.load(resp)
+    return sum(item['requests'] for item in stats.values())
+
+
+@contextlib.contextmanager
+def temporary_workdir():
+    """在临时目录中运行，结束后切回原目录并删除临时目录"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='crawler-bench-') as workdir:
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous)
+
+
+@contextlib.contextmanager
+def mock_server_process(args, lives):
+    """在子进程中启动模拟服务器，返回其地址"""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(BASE_DIR, 'mock_server.py'),
+        '--port', str(port), '--lives', str(lives), '--days', str(args.days),
+        '--latency', str(args.latency), '--error-rate', str(args.error_rate), '--throttle', str(args.throttle),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        process.stdout.readline()  # 等待启动完成的提示
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run_one(args, lives):
+    """在当前进程中对 lives 个直播运行一次基准，返回各阶段的结果"""
+    sys.path.insert(0, BASE_DIR)
+    import crawler
+    from mock_server import CRAWLER_URLS
+
+    results = {'lives': lives, 'stages': {}}
+    crawler.RESPONSE_ARCHIVE.enabled = args.archive
+
+    with temporary_workdir(), mock_server_process(args, lives) as base_url:
+        for name, endpoint in CRAWLER_URLS.items():
+            setattr(crawler, name, f'{base_url}/{endpoint}')
+        session = crawler.create_http_session({'User-Agent': 'benchmark'}, {}, pool_size=args.workers)
+        start_date = (datetime.now() - timedelta(days=args.days + 1)).strftime('%Y-%m-%d')
+
+        def stage(name, func):
+            requests_before = server_requests(base_url)
+            started = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                value = func()
+            seconds = time.perf_counter() - started
+            requests = server_requests(base_url) - requests_before
+            results['stages'][name] = {
+                'seconds': round(seconds, 3),
+                'requests': requests,
+                'requests_per_second': round(requests / seconds, 1) if seconds > 0 else None,
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+            }
+            return value
+
+        live_ids = stage('list', lambda: crawler.download_half_year_data(
+            output_file='xlsx1.xlsx', start_date=start_date, session=session, return_ids=True,
+            page_size=args.page_size, workers=args.workers, rate_limit=args.rate_limit, list_mode=args.list_mode
+        ))
+        results['listed'] = len(live_ids or [])
+
+        stage('enrich', lambda: crawler.download_enrich_data(
+            list_file='xlsx1.xlsx', detail_file='xlsx2.csv', product_file='xlsx3.csv', ec_file='xlsx4.csv',
+            workers=args.workers, rate_limit=args.rate_limit, transport=args.transport, session=session,
+            resume=False, live_ids=live_ids, backup=False, cache_file=None
+        ))
+
+        stage('excel', lambda: [crawler.export_to_excel(file_path)
+                                for file_path in ('xlsx2.csv', 'xlsx3.csv', 'xlsx4.csv')])
+        session.close()
+
+    results['total_seconds'] = round(sum(item['seconds'] for item in results['stages'].values()), 3)
+    return results
+
+
+def run_all(args):
+    """每个规模在独立的子进程中运行，收集各自的结果"""
+    all_results = []
+    for lives in args.sizes:
+        print(f"运行基准: {lives} 个直播...", flush=True)
+        command = [sys.executable, os.path.abspath(__file__), '--run-one', str(lives)] + child_args(args)
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print_result(result)
+        all_results.append(result)
+    return all_results
+
+
+def child_args(args):
+    return [
+        '--workers', str(args.workers), '--rate-limit', str(args.rate_limit), '--transport', args.transport,
+        '--page-size', str(args.page_size), '--list-mode', args.list_mode, '--days', str(args.days),
+        '--latency', str(args.latency), '--error-rate', str(args.error_rate), '--throttle', str(args.throttle),
+    ] + (['--archive'] if args.archive else [])
+
+
+def print_result(result):
+    print(f"  {result['lives']} 个直播（列表返回 {result['listed']} 个），总耗时 {result['total_seconds']} 秒")
+    for name, item in result['stages'].items():
+        rate = f"{item['requests_per_second']} 请求/秒" if item['requests'] else '-'
+        print(f"    {name:<8}{item['seconds']:>10.3f} 秒  {item['requests']:>8} 个请求  {rate:>16}  "
+              f"峰值内存 {item['peak_rss_mb']} MB")
+
+
+def compare_with_baseline(results, baseline_file, tolerance=DEFAULT_TOLERANCE):
+    """与之前保存的基准结果比较，返回耗时增加超过 tolerance 的 (规模, 阶段, 之前耗时, 本次耗时) 列表"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {item['lives']: item for item in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['lives'])
+        if previous is None:
+            continue
+        for name, item in result['stages'].items():
+            before = previous['stages'].get(name, {}).get('seconds')
+            if before and item['seconds'] > before * (1 + tolerance):
+                regressions.append((result['lives'], name, before, item['seconds']))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='crawler.py 离线性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='直播数量，可指定多个')
+    parser.add_argument('--workers', type=int, default=16, help='并发数')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每个接口每秒最多请求数，<=0 表示不限速')
+    parser.add_argument('--transport', choices=('thread', 'async'), default='thread')
+    parser.add_argument('--page-size', type=int, default=50, help='列表接口每页条数')
+    parser.add_argument('--list-mode', choices=('page', 'window'), default='page')
+    parser.add_argument('--days', type=int, default=180, help='模拟直播的开播时间分布在最近多少天内')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟服务器每个请求的平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务器返回错误的请求比例')
+    parser.add_argument('--throttle', type=float, default=0, help='模拟服务器每个接口每秒最多处理的请求数')
+    parser.add_argument('--archive', action='store_true', help='同时写入原始响应归档')
+    parser.add_argument('--output', help='把结果保存为 JSON 文件')
+    parser.add_argument('--baseline', help='与之前保存的 JSON 结果比较')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的耗时增加比例')
+    parser.add_argument('--run-one', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run_one is not None:
+        print(json.dumps(run_one(args, args.run_one)))
+        return 0
+
+    results = run_all(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'args': vars(args),
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        for lives, name, before, after in regressions:
+            print(f"[退化] {lives} 个直播的 {name} 阶段: {before} 秒 -> {after} 秒")
+        if regressions:
+            return 1
+        print(f"与 {args.baseline} 相比没有超过 {args.tolerance:.0%} 的性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
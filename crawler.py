@@ -1,11 +1,27 @@
 import requests
-import pandas as pd
 from datetime import datetime, timedelta
 import time
 import shutil
 import os
-from playwright.sync_api import sync_playwright
-from openpyxl import load_workbook
+import json
+import csv
+import sys
+import itertools
+import queue
+import random
+import threading
+import asyncio
+import atexit
+import gzip
+import sqlite3
+import tempfile
+import zlib
+from collections import ChainMap, deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# pandas、openpyxl、playwright 导入较慢、占用内存较多，只在需要它们的函数中导入
+# （如登录凭据缓存有效时不会导入 playwright）
 
 # 接口2配置（预约数据）
 URL_DETAIL = 'https://channels.weixin.qq.com/micro/statistic/cgi-bin/mmfinderassistant-bin/statistic/live_single_data'
@@ -29,16 +45,349 @@ HEADERS = {}
 # COOKIES 直接写死为空（可由浏览器会话覆盖）
 COOKIES_DICT = {}
 
+# 并发抓取配置（接口2~5 按 liveObjectId 逐条请求时使用）
+DEFAULT_WORKERS = 1         # 并发工作线程数，1 表示顺序请求
+DEFAULT_RATE_LIMIT = 1.0    # 每个接口的限速：每秒最多请求数（自适应限速只在其下方调整，<=0 表示不限速）
+DEFAULT_BURST = 1           # 令牌桶容量：允许的瞬时突发请求数
+DEFAULT_POOL_SIZE = 10      # HTTP 连接池大小（keep-alive 复用的连接数）
+
+# 自适应限速（AIMD）：遇到限流信号（繁忙 errCode、HTTP 429/5xx、超时等）立即降速，
+# 之后请求持续正常时逐步恢复，但不超过 rate_limit
+ADAPTIVE_RATE_CONTROL = True
+ADAPTIVE_MIN_RATE = 0.2     # 速率下限，每秒请求数
+ADAPTIVE_INCREASE = 0.5     # 加性增加：请求持续正常时，每秒提高的速率
+ADAPTIVE_DECREASE = 0.5     # 乘性减少：遇到限流信号时速率乘以该系数
+ADAPTIVE_COOLDOWN = 1.0     # 两次降速之间至少间隔的秒数，同一批在途请求同时失败只降速一次
+# 各接口的速率上限（每秒请求数），rate_limit 更高时取该值；未列出的接口只受 rate_limit 限制
+ENDPOINT_MAX_RATES = {
+    '接口1': 5.0,
+    '接口2': 10.0,
+    '接口3': 10.0,
+    '接口4': 10.0,
+    '接口5': 10.0,
+}
+
+# 请求重试：限流等暂时性失败按指数退避（加随机抖动）重试，整个进程的重试次数受预算限制
+MAX_RETRIES = 3             # 单个请求最多重试次数
+RETRY_BACKOFF_BASE = 1.0    # 第 n 次重试前最多等待 RETRY_BACKOFF_BASE * 2**(n-1) 秒（在 0 到该值之间随机）
+RETRY_BACKOFF_MAX = 30.0    # 单次退避等待的上限（秒）
+RETRY_BUDGET_RATIO = 0.2    # 重试预算：重试总次数不超过 RETRY_BUDGET_MIN + 请求总数 * 该比例
+RETRY_BUDGET_MIN = 10
+# 服务器繁忙、请求过于频繁时接口返回的 errCode，以及 errMsg 中的关键字：这类错误视为限流信号，降速并重试；
+# 其他非 0 的 errCode（参数错误、业务错误等）重试也不会成功，不降速、不重试，直接记入失败记录
+BUSY_ERROR_CODES = (-1, 45009, 45011)
+BUSY_ERROR_KEYWORDS = ('busy', 'too many', 'frequen', '繁忙', '频繁')
+
+# 接口2~5的响应缓存（SQLite），按 (接口, liveObjectId) 保存原始响应 data；
+# 开播超过 RESPONSE_CACHE_FINAL_AGE 的直播数据不再变化，缓存永久有效，较新的直播缓存 RESPONSE_CACHE_TTL 秒
+# （RESPONSE_CACHE_FINAL_AGE 应不小于 INCREMENTAL_OVERLAP_DAYS，重叠期内的直播才会重新请求）
+RESPONSE_CACHE_FILE = './response_cache.sqlite3'
+RESPONSE_CACHE_FINAL_AGE = 3 * 86400
+RESPONSE_CACHE_TTL = 3600
+
+# 原始响应归档目录：每个成功的接口响应连同请求信息追加写入 gzip 压缩的 JSONL 文件，
+# replay_archive() 可以据此离线重新生成全部输出文件；设置 ARCHIVE_RESPONSES = False 关闭归档
+ARCHIVE_DIR = './archive'
+ARCHIVE_RESPONSES = True
+
+# 失败记录文件（位于断点续传日志目录下）：重试后仍失败的 liveObjectId，可用 retry_dead_letters 单独重试
+DEAD_LETTER_FILE = 'dead_letter.json'
+RETRY_JOURNAL_PREFIX = 'retry_'     # retry_dead_letters 的断点续传日志名称前缀，与普通下载的日志分开
+INCREMENTAL_JOURNAL_PREFIX = 'incremental_'  # 增量同步的断点续传日志名称前缀，与普通下载的日志分开
+
+# 接口1（列表数据）每页条数
+DEFAULT_PAGE_SIZE = 50
+
+# 接口1（列表数据）抓取方式：page 按页码分页；window 按开播时间窗口分片（窗口过密时自动对半拆分），
+# 分页过程中有新直播开播也不会导致记录错位重复或遗漏
+LIST_MODES = ('page', 'window')
+LIST_WINDOW_DAYS = 30               # window 模式的初始窗口长度（天）
+LIST_MIN_WINDOW_SECONDS = 3600      # 窗口不再拆分的最短长度（秒），更短的窗口仍超过一页时在窗口内分页
+
+# 接口3（带货商品数据）分页：每页商品数
+SPU_PAGE_SIZE = 15
+
+# 输出格式：xlsx（默认）、parquet（列式存储，保留数值类型并压缩）、csv
+OUTPUT_FORMATS = ('xlsx', 'parquet', 'csv')
+# 流式读写：合并或导出已有输出文件时每次读取的行数；Parquet 每个行组的记录数（写出时内存中最多保留一个行组）
+STREAM_CHUNK_SIZE = 10000
+PARQUET_ROW_GROUP_SIZE = 50000
+# 批量展平：每积累多少个直播的接口响应按列展平一次（见 flatten_batch）
+FLATTEN_BATCH_SIZE = 200
+
+# 断点续传日志目录：每个接口一个 JSONL 文件，记录已完成的 liveObjectId 及其原始响应
+JOURNAL_DIR = './journal'
+
+# 增量同步状态文件：记录上次成功同步到的时间点（高水位）
+SYNC_STATE_FILE = './sync_state.json'
+# 增量同步时向前重叠的天数：这段时间内的直播可能在上次同步时尚未结束，需要重新获取
+INCREMENTAL_OVERLAP_DAYS = 2
+
+# 列表数据的 liveObjectId 索引文件（与列表文件同名，后缀为 .ids.tsv）：列表阶段写出，
+# 下游接口直接读取 ID（以及开播时间、成交金额），不必再解析整个列表文件
+LIVE_ID_INDEX_SUFFIX = '.ids.tsv'
+LIVE_ID_INDEX_COLUMNS = ('liveObjectId', 'startTime', 'payedGmv')
+# 列表接口中可能表示开播时间的字段，按顺序取第一个存在的
+LIVE_START_TIME_FIELDS = ('startTime', 'liveStartTime', 'createTime')
+
+# 运行报告：各接口的请求数、延迟分布、重试和错误码，以及各阶段耗时，运行结束时写出 JSON；
+# PROMETHEUS_TEXTFILE 不为 None 时同时写出 Prometheus textfile（供 node_exporter 采集）
+RUN_REPORT_FILE = './run_report.json'
+PROMETHEUS_TEXTFILE = None
+# 控制台进度：每个阶段最多每 PROGRESS_INTERVAL 秒打印一行进度；VERBOSE_LOG 为 True 时打印逐条请求的详细日志
+PROGRESS_INTERVAL = 5.0
+VERBOSE_LOG = False
+
 
  
 # 浏览器 profile 目录（用于从持久化上下文读取 cookies / UA）
 BROWSER_USER_DATA_DIR = './browser_data'
 
-def get_browser_session_cookies_and_headers(user_data_dir=BROWSER_USER_DATA_DIR, url=None):
+# 登录凭据缓存：从浏览器会话读取的 headers/cookies 及其过期时间，各阶段和多次运行共用，
+# 缓存缺失、过期或被接口拒绝时才重新启动浏览器
+CREDENTIALS_FILE = './credentials.json'
+CREDENTIALS_MAX_AGE = 12 * 3600     # cookies 没有过期时间（会话 cookie）时，缓存的有效期（秒）
+CREDENTIALS_RECHECK_SECONDS = 600   # 同一进程内探测通过后，这段时间内不再重复探测
+
+# 登录失效检测：HTTP 状态码为 AUTH_HTTP_STATUS，或接口返回的 errMsg 包含 AUTH_ERROR_KEYWORDS 中的关键字时
+# 视为登录失效，暂停所有请求、重新读取一次登录凭据后重发（接口没有公开登录失效专用的 errCode，按 errMsg 判断）
+AUTH_HTTP_STATUS = (401, 403)
+AUTH_ERROR_KEYWORDS = ('登录', 'login')
+
+class RunMetrics:
+    """运行指标（线程安全）：各接口的请求数、延迟分布、重试次数、HTTP 状态码和 errCode，以及各阶段的耗时
+
+    各阶段（credentials、load_ids、fetch、flatten、save 等）用 phase() 计时，同一线程内嵌套的同名阶段只计一次。
+    运行结束时用 write_report() 写出 JSON 报告，可选写出 Prometheus textfile。
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _endpoint(self, api_name):
+        return self.endpoints.setdefault(api_name, {
+            'requests': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'skipped': 0,
+            'latencies': [], 'http_status': {}, 'err_codes': {},
+        })
+
+    def observe_request(self, api_name, seconds, status=None, err_code=None, succeeded=False):
+        """记录一次请求：耗时（秒）、HTTP 状态码（没有响应时为 None）、errCode、是否成功"""
+        with self._lock:
+            stats = self._endpoint(api_name)
+            stats['requests'] += 1
+            stats['succeeded' if succeeded else 'failed'] += 1
+            stats['latencies'].append(seconds)
+            status_key = str(status) if status is not None else 'no_response'
+            stats['http_status'][status_key] = stats['http_status'].get(status_key, 0) + 1
+            if err_code is not None:
+                stats['err_codes'][str(err_code)] = stats['err_codes'].get(str(err_code), 0) + 1
+
+    def record_retry(self, api_name):
+        with self._lock:
+            self._endpoint(api_name)['retries'] += 1
+
+    def record_skipped(self, api_name, count):
+        """记录按列表数据预先判断、没有发出的请求数"""
+        with self._lock:
+            self._endpoint(api_name)['skipped'] += count
+
+    @contextmanager
+    def phase(self, name):
+        """累计一个阶段的耗时；同一线程内已在该阶段中时不重复计时"""
+        active = self._local.__dict__.setdefault('active', set())
+        if name in active:
+            yield
+            return
+        active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            active.discard(name)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                phase = self.phases.setdefault(name, {'seconds': 0.0, 'count': 0})
+                phase['seconds'] += elapsed
+                phase['count'] += 1
+
+    def timed_iter(self, name, iterable):
+        """逐个产出 iterable 的元素，等待每个元素的时间计入 name 阶段（如等待并发请求的结果）"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def summary(self):
+        """返回可序列化为 JSON 的指标汇总"""
+        with self._lock:
+            endpoints = {}
+            for api_name, stats in sorted(self.endpoints.items()):
+                latencies = sorted(stats['latencies'])
+                endpoints[api_name] = {
+                    key: value for key, value in stats.items() if key != 'latencies'
+                }
+                endpoints[api_name]['latency_seconds'] = {
+                    'p50': _percentile(latencies, 0.5),
+                    'p90': _percentile(latencies, 0.9),
+                    'p99': _percentile(latencies, 0.99),
+                    'max': latencies[-1] if latencies else None,
+                    'mean': sum(latencies) / len(latencies) if latencies else None,
+                }
+            phases = {name: {'seconds': round(phase['seconds'], 3), 'count': phase['count']}
+                      for name, phase in self.phases.items()}
+        return {
+            'started': datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'endpoints': endpoints,
+            'phases': phases,
+            'rates': RATE_CONTROLLER.rates(),
+        }
+
+    def print_summary(self):
+        """在控制台打印各接口和各阶段的汇总"""
+        summary = self.summary()
+        print(f"运行耗时 {summary['elapsed_seconds']:.1f} 秒")
+        for api_name, stats in summary['endpoints'].items():
+            latency = stats['latency_seconds']
+            print(f"  {api_name}: 请求 {stats['requests']} 次，失败 {stats['failed']} 次，重试 {stats['retries']} 次，"
+                  f"跳过 {stats['skipped']} 次，"
+                  f"延迟 p50 {_format_seconds(latency['p50'])} / p99 {_format_seconds(latency['p99'])}")
+        for name, phase in summary['phases'].items():
+            print(f"  阶段 {name}: {phase['seconds']:.1f} 秒")
+
+    def prometheus_text(self):
+        """按 Prometheus textfile 格式输出指标"""
+        summary = self.summary()
+        lines = [
+            '# TYPE crawler_requests_total counter',
+            '# TYPE crawler_request_failures_total counter',
+            '# TYPE crawler_retries_total counter',
+            '# TYPE crawler_skipped_requests_total counter',
+            '# TYPE crawler_http_responses_total counter',
+            '# TYPE crawler_err_codes_total counter',
+            '# TYPE crawler_request_latency_seconds gauge',
+            '# TYPE crawler_phase_seconds gauge',
+            '# TYPE crawler_run_elapsed_seconds gauge',
+        ]
+        for api_name, stats in summary['endpoints'].items():
+            label = f'endpoint="{api_name}"'
+            lines.append(f'crawler_requests_total{{{label}}} {stats["requests"]}')
+            lines.append(f'crawler_request_failures_total{{{label}}} {stats["failed"]}')
+            lines.append(f'crawler_retries_total{{{label}}} {stats["retries"]}')
+            lines.append(f'crawler_skipped_requests_total{{{label}}} {stats["skipped"]}')
+            for status, count in stats['http_status'].items():
+                lines.append(f'crawler_http_responses_total{{{label},status="{status}"}} {count}')
+            for err_code, count in stats['err_codes'].items():
+                lines.append(f'crawler_err_codes_total{{{label},err_code="{err_code}"}} {count}')
+            for quantile in ('p50', 'p90', 'p99', 'max'):
+                value = stats['latency_seconds'][quantile]
+                if value is not None:
+                    lines.append(f'crawler_request_latency_seconds{{{label},quantile="{quantile}"}} {value:.6f}')
+        for name, phase in summary['phases'].items():
+            lines.append(f'crawler_phase_seconds{{phase="{name}"}} {phase["seconds"]}')
+        lines.append(f'crawler_run_elapsed_seconds {summary["elapsed_seconds"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, report_file=RUN_REPORT_FILE, prometheus_file=PROMETHEUS_TEXTFILE):
+        """写出 JSON 运行报告，prometheus_file 不为 None 时同时写出 Prometheus textfile（先写临时文件再替换）"""
+        try:
+            if report_file:
+                with open(report_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+                print(f"运行报告已保存到 {report_file}")
+            if prometheus_file:
+                tmp_file = prometheus_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(self.prometheus_text())
+                os.replace(tmp_file, prometheus_file)
+        except Exception as e:
+            print(f"[Warning] 保存运行报告失败: {e}")
+
+
+def _percentile(sorted_values, fraction):
+    """已排序列表的百分位数（最近秩法），列表为空时返回 None"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _format_seconds(value):
+    return '-' if value is None else f"{value * 1000:.0f}ms"
+
+
+METRICS = RunMetrics()
+
+
+def log_detail(message):
+    """逐条请求的详细日志，只在 VERBOSE_LOG 为 True 时打印"""
+    if VERBOSE_LOG:
+        print(message)
+
+
+class ProgressView:
+    """限频的进度输出：最多每 interval 秒打印一行（完成数、失败数、速度、预计剩余时间），结束时再打印一行
+
+    Args:
+        label: 进度行前缀，如阶段名称
+        total: 总数
+        interval: 两次打印之间的最短间隔（秒）
+    """
+
+    def __init__(self, label, total, interval=None):
+        self.label = label
+        self.total = total
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_print = self.started
+
+    def update(self, count=1, failed=0):
+        self.done += count
+        self.failed += failed
+        now = time.monotonic()
+        if now - self._last_print >= self.interval:
+            self._last_print = now
+            self._print(now)
+
+    def close(self):
+        self._print(time.monotonic())
+
+    def _print(self, now):
+        elapsed = max(now - self.started, 1e-9)
+        speed = self.done / elapsed
+        line = f"[{self.label}] {self.done}/{self.total}"
+        if self.total:
+            line += f" ({self.done / self.total:.0%})"
+        line += f"，{speed:.1f} 条/秒"
+        if self.failed:
+            line += f"，失败 {self.failed}"
+        if speed > 0 and self.total and self.done < self.total:
+            line += f"，预计剩余 {(self.total - self.done) / speed:.0f} 秒"
+        print(line)
+
+
+@METRICS.phase('browser')
+def get_browser_session_cookies_and_headers(user_data_dir=BROWSER_USER_DATA_DIR, url=None, with_expiry=False):
     """
     从 Playwright 的持久化上下文读取 cookies 和 User-Agent，返回 (headers_dict, cookies_dict)
     如果失败返回 ({}, {})
+
+    with_expiry=True 时返回 (headers_dict, cookies_dict, expires_at)，expires_at 为最早过期的 cookie 的
+    过期时间（秒级时间戳），都是会话 cookie 时为 None
     """
+    from playwright.sync_api import sync_playwright
+
+    expires_at = None
     try:
         playwright = sync_playwright().start()
         context = playwright.chromium.launch_persistent_context(
@@ -60,6 +409,8 @@ def get_browser_session_cookies_and_headers(user_data_dir=BROWSER_USER_DATA_DIR,
         try:
             cookies_list = context.cookies()
             cookies = {c.get('name'): c.get('value') for c in cookies_list}
+            expiries = [c.get('expires') for c in cookies_list if (c.get('expires') or -1) > 0]
+            expires_at = int(min(expiries)) if expiries else None
         except:
             cookies = {}
 
@@ -81,6 +432,8 @@ def get_browser_session_cookies_and_headers(user_data_dir=BROWSER_USER_DATA_DIR,
         except:
             pass
 
+        if with_expiry:
+            return headers, cookies, expires_at
         return headers, cookies
     except Exception as e:
         print(f"  [Warning] 从浏览器会话获取 cookies/headers 失败: {e}")
@@ -88,8 +441,394 @@ def get_browser_session_cookies_and_headers(user_data_dir=BROWSER_USER_DATA_DIR,
             playwright.stop()
         except:
             pass
+        if with_expiry:
+            return {}, {}, None
         return {}, {}
 
+
+def load_cached_credentials(credentials_file=CREDENTIALS_FILE):
+    """读取缓存的登录凭据，返回 (headers, cookies)；文件不存在、损坏或已过期时返回 None"""
+    if not os.path.exists(credentials_file):
+        return None
+    try:
+        with open(credentials_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except Exception as e:
+        print(f"[Warning] 读取登录凭据缓存失败: {e}")
+        return None
+    if cached.get('expires_at') and cached['expires_at'] <= time.time():
+        print("缓存的登录凭据已过期")
+        return None
+    return cached.get('headers') or {}, cached.get('cookies') or {}
+
+
+def save_cached_credentials(headers, cookies, expires_at=None, credentials_file=CREDENTIALS_FILE):
+    """缓存登录凭据（先写临时文件再替换，文件权限仅限当前用户读写）"""
+    if expires_at is None:
+        expires_at = int(time.time()) + CREDENTIALS_MAX_AGE
+    cached = {
+        'headers': headers,
+        'cookies': cookies,
+        'saved_at': int(time.time()),
+        'expires_at': expires_at,
+    }
+    tmp_file = credentials_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cached, f, ensure_ascii=False, indent=2)
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, credentials_file)
+
+
+def probe_credentials(headers=None, cookies=None, timeout=10):
+    """用一次最小的列表接口请求（pageSize=1，最近一天）检查登录凭据是否有效
+
+    只发送一次请求，不重试，也不计入自适应限速的反馈。
+    """
+    end_time = int(time.time())
+    payload = build_live_list_payload(1, 1, end_time - 86400, end_time)
+    _, _, data = _send_post_json(URL_LIST, payload, '接口1', headers=headers, cookies=cookies, timeout=timeout)
+    return data is not None
+
+
+# 同一进程内已探测通过的登录凭据：{credentials_file: (headers, cookies, 探测时间)}
+_VERIFIED_CREDENTIALS = {}
+
+
+def get_credentials(user_data_dir=BROWSER_USER_DATA_DIR, url=None, credentials_file=CREDENTIALS_FILE):
+    """获取接口请求用的登录凭据，返回 (headers, cookies, valid)
+
+    依次尝试：本进程内刚探测通过的凭据 -> 磁盘缓存（探测通过才使用）-> 启动浏览器读取会话
+    （探测通过后写入缓存）。valid 表示凭据是否通过探测；浏览器也读取不到凭据时返回 (None, None, False)。
+    """
+    CREDENTIAL_REFRESHER.user_data_dir = user_data_dir
+    CREDENTIAL_REFRESHER.credentials_file = credentials_file
+    verified = _VERIFIED_CREDENTIALS.get(credentials_file)
+    if verified is not None and time.monotonic() - verified[2] < CREDENTIALS_RECHECK_SECONDS:
+        return verified[0], verified[1], True
+
+    cached = load_cached_credentials(credentials_file)
+    if cached is not None:
+        if probe_credentials(*cached):
+            _VERIFIED_CREDENTIALS[credentials_file] = (cached[0], cached[1], time.monotonic())
+            print("使用缓存的登录凭据")
+            return cached[0], cached[1], True
+        print("缓存的登录凭据已失效，重新从浏览器会话获取")
+
+    headers, cookies, expires_at = get_browser_session_cookies_and_headers(
+        user_data_dir=user_data_dir,
+        url=url,
+        with_expiry=True
+    )
+    if not headers and not cookies:
+        return None, None, False
+
+    valid = probe_credentials(headers, cookies)
+    if valid:
+        save_cached_credentials(headers, cookies, expires_at, credentials_file)
+        _VERIFIED_CREDENTIALS[credentials_file] = (headers, cookies, time.monotonic())
+    return headers, cookies, valid
+
+
+class CredentialRefresher:
+    """登录失效时的凭据热刷新（线程安全）
+
+    任一请求检测到登录失效时调用 refresh()：刷新期间其他请求在发送前等待，同一代凭据的失效只刷新一次
+    （generation 为凭据的代数，其他同时失效的请求等待这次刷新的结果），刷新成功后各会话在下次请求前换用新凭据，
+    失败的请求重新发送。启动浏览器读取凭据较慢，期间不持有锁。刷新失败后不再反复启动浏览器，
+    后续请求直接失败；下载函数此时保留断点续传日志，重新登录后再次运行即可从中断处继续。
+    """
+
+    def __init__(self, user_data_dir=BROWSER_USER_DATA_DIR, credentials_file=CREDENTIALS_FILE):
+        self.user_data_dir = user_data_dir
+        self.credentials_file = credentials_file
+        self.generation = 0
+        self.headers = None
+        self.cookies = None
+        self.failed = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready.set()
+        self._applied = {}
+
+    def wait(self):
+        """刷新进行中时阻塞，直到刷新结束"""
+        self._ready.wait()
+
+    async def wait_async(self):
+        """wait 的异步版本，等待期间不阻塞事件循环"""
+        if not self._ready.is_set():
+            await asyncio.to_thread(self._ready.wait)
+
+    def credentials(self, headers, cookies):
+        """刷新过凭据后返回新的 headers/cookies，否则原样返回传入的值"""
+        if self.generation:
+            return self.headers, self.cookies
+        return headers, cookies
+
+    def sync_session(self, session):
+        """把最新凭据应用到会话（requests.Session 或 aiohttp.ClientSession），每个会话每代凭据只应用一次"""
+        if not self.generation or self._applied.get(id(session)) == self.generation:
+            return
+        with self._lock:
+            session.headers.update(self.headers)
+            if hasattr(session, 'cookie_jar'):
+                session.cookie_jar.update_cookies(self.cookies)
+            else:
+                session.cookies.update(self.cookies)
+            self._applied[id(session)] = self.generation
+
+    def refresh(self, generation):
+        """在第 generation 代凭据下登录失效时调用，返回是否已有可用的新凭据（调用方据此决定是否重发请求）"""
+        with self._lock:
+            if self.generation != generation:
+                return True
+            if self.failed:
+                return False
+            # 其他请求已在刷新这一代凭据：等待其结果，不重复启动浏览器
+            waiting = self._refreshing
+            if not waiting:
+                self._refreshing = True
+                self._ready.clear()
+        if waiting:
+            self._ready.wait()
+            return self.generation != generation
+
+        refreshed = False
+        try:
+            print("[登录失效] 暂停请求，从浏览器会话重新获取登录凭据...")
+            headers, cookies, expires_at = get_browser_session_cookies_and_headers(
+                user_data_dir=self.user_data_dir,
+                url=URL_LIST,
+                with_expiry=True
+            )
+            refreshed = bool(headers or cookies) and probe_credentials(headers, cookies)
+            if refreshed:
+                save_cached_credentials(headers, cookies, expires_at, self.credentials_file)
+                _VERIFIED_CREDENTIALS[self.credentials_file] = (headers, cookies, time.monotonic())
+                print("[登录失效] 已获取新的登录凭据，继续请求")
+            else:
+                print("[登录失效] 浏览器会话中的登录凭据同样无效，请重新登录后再次运行（已完成的部分会从断点续传日志继续）")
+        finally:
+            with self._lock:
+                if refreshed:
+                    self.headers, self.cookies = headers, cookies
+                    self.generation += 1
+                else:
+                    self.failed = True
+                self._refreshing = False
+            self._ready.set()
+        return refreshed
+
+
+# 全局凭据刷新器，所有阶段和传输方式共用
+CREDENTIAL_REFRESHER = CredentialRefresher()
+
+
+def login_expired():
+    """本次运行中登录是否已失效且刷新失败；为 True 时下载函数保留断点续传日志并返回失败"""
+    if CREDENTIAL_REFRESHER.failed:
+        print("登录已失效，保留断点续传日志，重新登录后再次运行即可继续")
+        return True
+    return False
+
+
+def acquire_browser_credentials(user_data_dir=BROWSER_USER_DATA_DIR, url=None, credentials_file=CREDENTIALS_FILE):
+    """获取 headers/cookies（优先使用缓存，见 get_credentials），获取不到时返回 (None, None) 以回退到默认值"""
+    with METRICS.phase('credentials'):
+        browser_headers, browser_cookies, valid = get_credentials(user_data_dir, url, credentials_file)
+    if browser_headers or browser_cookies:
+        if not valid:
+            print("  [Warning] 登录凭据未通过接口探测，可能需要重新登录")
+        print("已获取 cookies/headers，将用于接口请求")
+        return browser_headers, browser_cookies
+    return None, None
+
+
+@METRICS.phase('load_ids')
+def read_live_list(input_file='xlsx1.xlsx'):
+    """读取列表数据文件（接口1的输出），返回 DataFrame
+
+    优先读取 '列表数据' 工作表，不存在时回退到旧名称 '直播数据'（向后兼容）。
+    liveObjectId 和 newWatchPvPromotion 按文本读取，避免被解析成数字后丢失精度或格式。
+    """
+    import pandas as pd
+
+    text_columns = {'liveObjectId': str, 'newWatchPvPromotion': str}
+    output_format = get_output_format(input_file)
+    if output_format == 'parquet':
+        df = pd.read_parquet(input_file)
+        if 'liveObjectId' in df.columns:
+            df['liveObjectId'] = df['liveObjectId'].astype(str)
+        return df
+    if output_format == 'csv':
+        return pd.read_csv(input_file, dtype=text_columns, encoding='utf-8-sig')
+    try:
+        return pd.read_excel(input_file, sheet_name='列表数据', dtype=text_columns)
+    except ValueError:
+        return pd.read_excel(input_file, sheet_name='直播数据', dtype=text_columns)
+
+
+def live_id_index_path(list_file):
+    """列表数据文件对应的 liveObjectId 索引文件路径，如 xlsx1.xlsx -> xlsx1.ids.tsv"""
+    return os.path.splitext(list_file)[0] + LIVE_ID_INDEX_SUFFIX
+
+
+def live_start_time(live_object):
+    """尽量从列表接口返回的直播对象中取出开播时间（秒级时间戳），取不到时返回 None"""
+    for field in LIVE_START_TIME_FIELDS:
+        try:
+            value = int(live_object.get(field) or 0)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            # 毫秒级时间戳转换为秒
+            return value // 1000 if value > 10 ** 11 else value
+    return None
+
+
+def build_live_index_entry(live_object):
+    """由列表接口返回的直播对象构造一条索引记录"""
+    return {
+        'liveObjectId': str(live_object.get('liveObjectId')),
+        'startTime': live_start_time(live_object),
+        'payedGmv': live_object.get('payedGmv'),
+    }
+
+
+def write_live_id_index(list_file, entries):
+    """写出列表数据的 liveObjectId 索引文件（制表符分隔，每行一个直播）
+
+    先写临时文件再替换，写到一半中断时不会留下不完整的索引。
+    """
+    index_file = live_id_index_path(list_file)
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+        f.write('\t'.join(LIVE_ID_INDEX_COLUMNS) + '\n')
+        for entry in entries:
+            f.write('\t'.join('' if entry.get(column) is None else str(entry[column])
+                              for column in LIVE_ID_INDEX_COLUMNS) + '\n')
+    os.replace(tmp_file, index_file)
+
+
+def touch_live_id_index(list_file):
+    """列表文件被改写但 ID 没有变化时（如写回接口5的列），刷新索引文件的修改时间，使其继续有效"""
+    index_file = live_id_index_path(list_file)
+    if os.path.exists(index_file):
+        os.utime(index_file)
+
+
+def read_live_id_index(list_file):
+    """读取列表数据的 liveObjectId 索引文件
+
+    索引文件不存在、比列表文件旧（列表文件在索引生成后被修改过），或列表文件存在而索引为空时返回 None。
+
+    Returns:
+        list: 索引记录列表，每条为 {'liveObjectId': str, 'startTime': int 或 None, 'payedGmv': str 或 None}
+              （旧版索引文件没有 payedGmv 列时为 None）
+    """
+    index_file = live_id_index_path(list_file)
+    if not os.path.exists(index_file):
+        return None
+    if os.path.exists(list_file) and os.path.getmtime(index_file) < os.path.getmtime(list_file):
+        return None
+
+    entries = []
+    with open(index_file, 'r', encoding='utf-8') as f:
+        columns = f.readline().rstrip('\n').split('\t')
+        for line in f:
+            values = line.rstrip('\n').split('\t')
+            entry = dict(zip(columns, values))
+            entry['startTime'] = int(entry['startTime']) if entry.get('startTime') else None
+            entry['payedGmv'] = entry.get('payedGmv') or None
+            entries.append(entry)
+    # 空索引不可信（如失败的列表下载留下的），回退到解析列表文件
+    if not entries and os.path.exists(list_file):
+        return None
+    return entries
+
+
+@METRICS.phase('load_ids')
+def load_live_index(input_file='xlsx1.xlsx'):
+    """读取列表数据中的直播索引：优先读取索引文件，没有可用的索引时回退到解析列表文件
+
+    Returns:
+        list: 索引记录列表，失败时返回 None；从列表文件解析时 startTime 为 None，payedGmv 取自成交金额列
+    """
+    try:
+        entries = read_live_id_index(input_file)
+    except Exception as e:
+        print(f"[Warning] 读取索引文件 {live_id_index_path(input_file)} 失败，改为读取列表文件: {e}")
+        entries = None
+    if entries is not None:
+        return entries
+
+    try:
+        df_list = read_live_list(input_file)
+        import pandas as pd
+        gmv_values = df_list['成交金额'].tolist() if '成交金额' in df_list.columns else [None] * len(df_list)
+        return [{'liveObjectId': str(live_id), 'startTime': None, 'payedGmv': None if pd.isna(gmv) else str(gmv)}
+                for live_id, gmv in zip(df_list['liveObjectId'].tolist(), gmv_values)]
+    except Exception as e:
+        print(f"读取 {input_file} 失败: {e}")
+        return None
+
+
+def live_has_sales(entry):
+    """索引记录中的成交金额（payedGmv）大于 0 或未知时返回 True"""
+    value = entry.get('payedGmv')
+    if value is None or value == '':
+        return True
+    try:
+        return float(value) > 0
+    except (TypeError, ValueError):
+        return True
+
+
+# 按接口预先判断是否需要请求：predicate(索引记录) 返回 False 的直播不请求该接口，直接写入只有 liveObjectId 的占位记录。
+# 索引记录来自列表阶段（liveObjectId、startTime、payedGmv，见 load_live_index）；成交金额为 0 的直播没有带货商品和转换数据
+STAGE_PREDICATES = {
+    'product': live_has_sales,
+    'ec': live_has_sales,
+}
+
+# 被预先判断跳过的请求在结果中的占位值（区别于请求失败时的 None）
+SKIPPED_RESPONSE = object()
+
+
+def plan_skipped_ids(stage_keys, live_ids, list_file):
+    """根据 STAGE_PREDICATES 和列表阶段的索引，计算各接口不需要请求的 liveObjectId
+
+    Returns:
+        dict: {stage_key: set(liveObjectId)}，只包含 STAGE_PREDICATES 中有判断规则的接口
+    """
+    predicates = {key: STAGE_PREDICATES[key] for key in stage_keys if key in STAGE_PREDICATES}
+    if not predicates:
+        return {}
+
+    wanted = set(live_ids)
+    skipped = {key: set() for key in predicates}
+    for entry in load_live_index(list_file) or []:
+        if entry['liveObjectId'] not in wanted:
+            continue
+        for key, predicate in predicates.items():
+            if not predicate(entry):
+                skipped[key].add(entry['liveObjectId'])
+
+    for key, ids in skipped.items():
+        if ids:
+            print(f"[跳过] {ENRICH_STAGES[key]['name']}: {len(ids)} 个直播按列表数据判断无需请求（如成交金额为 0），写入占位记录")
+            METRICS.record_skipped(FETCH_API_NAMES[ENRICH_STAGES[key]['fetch']], len(ids))
+    return skipped
+
+
+def load_live_ids(input_file='xlsx1.xlsx'):
+    """读取列表数据中的 liveObjectId 列表（优先读取索引文件），失败时返回 None"""
+    entries = load_live_index(input_file)
+    if entries is None:
+        return None
+    return [entry['liveObjectId'] for entry in entries]
+
 def get_time_range_for_half_year(start_date_str=None, end_date_str=None):
     """获取时间范围
 
@@ -125,24 +864,201 @@ def get_time_range_for_half_year(start_date_str=None, end_date_str=None):
 
     return start_time, end_time
 
-def fetch_live_data(page_size=10, current_page=1, start_time=None, end_time=None, headers=None, cookies=None):
-    """获取直播列表数据（接口1）
+def _resolve_credentials(headers=None, cookies=None):
+    """优先使用传入的 headers/cookies（来自浏览器会话），否则回退到写死的 HEADERS/COOKIES_DICT"""
+    request_headers = headers if headers is not None and headers else HEADERS
+    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
+    return request_headers, request_cookies
+
+
+def _parse_api_response(j, api_name):
+    """解析接口返回的 JSON，errCode 为 0 时返回 data 字典，否则打印错误并返回 None"""
+    if j.get('errCode') == 0:
+        return j.get('data', {})
+    log_detail(f"{api_name}返回错误: {j.get('errMsg')}")
+    return None
+
+
+def create_http_session(headers=None, cookies=None, pool_size=DEFAULT_POOL_SIZE):
+    """创建复用 TCP/TLS 连接的 requests.Session，预置 headers/cookies
 
     Args:
-        page_size: 每页数据条数，默认10
-        current_page: 当前页码，默认1
-        start_time: 开始时间戳，如果为None则使用默认时间范围
-        end_time: 结束时间戳，如果为None则使用默认时间范围
-        headers: 请求头，如果为None则使用默认headers
-        cookies: cookies字典，如果为None则使用默认cookies
+        headers: 请求头，为空时使用 HEADERS
+        cookies: cookies字典，为空时使用 COOKIES_DICT
+        pool_size: 连接池大小，并发请求时应不小于线程数
 
     Returns:
-        dict: API响应数据，包含直播列表信息或None（请求失败时）
+        requests.Session: 开启 keep-alive 的会话，用完后调用 close()
+    """
+    request_headers, request_cookies = _resolve_credentials(headers, cookies)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(request_headers)
+    session.headers['Connection'] = 'keep-alive'
+    session.cookies.update(request_cookies)
+    return session
+
+
+def _rate_feedback(status, j, data):
+    """根据一次请求的结果判断限流信号：成功返回 True，限流信号返回 False，与速率无关的错误返回 None
+
+    没有拿到响应（超时、连接失败）、HTTP 429/5xx、响应无法解析，以及服务器繁忙的 errCode（见 is_busy_error）
+    视为限流信号，降速并重试；其他 errCode（如参数错误、业务错误）和其他 4xx 不调整速率，也不重试。
+    """
+    if data is not None:
+        return True
+    if status is None or status == 429 or status >= 500:
+        return False
+    if status < 400 and (not isinstance(j, dict) or is_busy_error(j)):
+        return False
+    return None
+
+
+class RetryBudget:
+    """重试预算（线程安全）：重试总次数不超过 minimum + ratio * 请求总数，
+    服务端持续出错时避免每个请求都重试多次而把请求量放大数倍"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        """记录一次请求（包括重试）"""
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self):
+        """尝试占用一次重试机会，预算用完时返回 False"""
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+# 全局重试预算，所有接口共用
+RETRY_BUDGET = RetryBudget()
+
+
+def retry_delay(attempt):
+    """第 attempt 次重试前的等待秒数：指数退避 + 全抖动（在 0 到退避上限之间随机）"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _should_retry(api_name, feedback, attempt, max_retries):
+    """请求结果是限流等暂时性失败、还有重试次数且重试预算未用完时返回 True"""
+    if feedback is not False or attempt >= max_retries:
+        return False
+    if not RETRY_BUDGET.try_spend():
+        log_detail(f"  [重试] 重试预算已用完，{api_name}不再重试")
+        return False
+    return True
+
+
+def is_auth_error(status, j=None):
+    """判断一次请求是否因登录失效而失败（见 AUTH_HTTP_STATUS / AUTH_ERROR_KEYWORDS）"""
+    if status in AUTH_HTTP_STATUS:
+        return True
+    if not isinstance(j, dict) or j.get('errCode') == 0:
+        return False
+    err_msg = str(j.get('errMsg') or '').lower()
+    return any(keyword in err_msg for keyword in AUTH_ERROR_KEYWORDS)
+
+
+def is_busy_error(j):
+    """判断接口返回的错误是否为服务器繁忙、请求过于频繁（见 BUSY_ERROR_CODES / BUSY_ERROR_KEYWORDS）"""
+    if not isinstance(j, dict) or j.get('errCode') == 0:
+        return False
+    if j.get('errCode') in BUSY_ERROR_CODES:
+        return True
+    err_msg = str(j.get('errMsg') or '').lower()
+    return any(keyword in err_msg for keyword in BUSY_ERROR_KEYWORDS)
+
+
+def _response_err_code(j):
+    """取出响应 JSON 中的 errCode，没有响应或不是 JSON 对象时返回 None"""
+    return j.get('errCode') if isinstance(j, dict) else None
+
+
+def _send_post_json(url, payload, api_name, headers=None, cookies=None, timeout=10, session=None):
+    """发送一次 POST 请求并解析响应，返回 (HTTP 状态码, 响应 JSON, data)
+
+    没有拿到响应时状态码为 None，响应不是 JSON 时响应 JSON 为 None，失败时 data 为 None。
+    """
+    status = None
+    j = None
+    data = None
+    started = time.perf_counter()
+    try:
+        if session is not None:
+            resp = session.post(url, json=payload, timeout=timeout)
+        else:
+            request_headers, request_cookies = _resolve_credentials(headers, cookies)
+            resp = requests.post(url, json=payload, headers=request_headers, cookies=request_cookies, timeout=timeout)
+        status = resp.status_code
+        resp.raise_for_status()
+        j = resp.json()
+        data = _parse_api_response(j, api_name)
+    except Exception as e:
+        log_detail(f"请求{api_name}失败: {e}")
+    METRICS.observe_request(api_name, time.perf_counter() - started, status, _response_err_code(j), data is not None)
+    return status, j, data
+
+
+def _post_json(url, payload, api_name, headers=None, cookies=None, timeout=10, session=None,
+               max_retries=MAX_RETRIES):
+    """同步发送 POST 请求并解析响应，返回 data 字典或 None
+
+    传入 session 时复用其连接池和预置的 headers/cookies，否则每次新建连接。
+    请求结果会反馈给 RATE_CONTROLLER，用于调整该接口的自适应限速；
+    限流等暂时性失败按指数退避重试（最多 max_retries 次，受 RETRY_BUDGET 限制）；
+    登录失效时由 CREDENTIAL_REFRESHER 刷新一次登录凭据后重发。
     """
+    attempt = 0
+    auth_retried = False
+    while True:
+        if CREDENTIAL_REFRESHER.failed:
+            return None
+        CREDENTIAL_REFRESHER.wait()
+        generation = CREDENTIAL_REFRESHER.generation
+        if session is not None:
+            CREDENTIAL_REFRESHER.sync_session(session)
+        else:
+            headers, cookies = CREDENTIAL_REFRESHER.credentials(headers, cookies)
+
+        RETRY_BUDGET.record_request()
+        status, j, data = _send_post_json(url, payload, api_name, headers=headers, cookies=cookies,
+                                          timeout=timeout, session=session)
+        if is_auth_error(status, j):
+            if not auth_retried and CREDENTIAL_REFRESHER.refresh(generation):
+                auth_retried = True
+                continue
+            return None
+
+        feedback = _rate_feedback(status, j, data)
+        RATE_CONTROLLER.report(api_name, feedback)
+        if not _should_retry(api_name, feedback, attempt, max_retries):
+            RESPONSE_ARCHIVE.record(api_name, url, payload, data)
+            return data
+        attempt += 1
+        delay = retry_delay(attempt)
+        METRICS.record_retry(api_name)
+        log_detail(f"  [重试] {api_name}第 {attempt} 次重试，{delay:.1f} 秒后发送")
+        time.sleep(delay)
+        RATE_CONTROLLER.acquire(api_name)
+
+
+def build_live_list_payload(page_size=10, current_page=1, start_time=None, end_time=None):
+    """构造接口1（直播列表）的请求体"""
     if start_time is None or end_time is None:
         start_time, end_time = get_time_range_for_half_year()
-    
-    payload = {
+
+    return {
         "pageSize": page_size,
         "currentPage": current_page,
         "reqType": 2,
@@ -154,32 +1070,495 @@ def fetch_live_data(page_size=10, current_page=1, start_time=None, end_time=None
         "scene": 7,
         "reqScene": 7
     }
-    
-    # 优先使用传入的 headers/cookies（来自浏览器会话），否则回退到写死的 HEADERS/COOKIES_DICT
-    request_headers = headers if headers is not None and headers else HEADERS
-    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
 
-    try:
-        response = requests.post(
-            URL_LIST,
-            json=payload,
-            headers=request_headers,
-            cookies=request_cookies,
-            timeout=10
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('errCode') == 0:
-            return data.get('data', {})
-        else:
-            print(f"API error: {data.get('errMsg')}")
+
+def fetch_live_data(page_size=10, current_page=1, start_time=None, end_time=None, headers=None, cookies=None, session=None):
+    """获取直播列表数据（接口1）
+
+    Args:
+        page_size: 每页数据条数，默认10
+        current_page: 当前页码，默认1
+        start_time: 开始时间戳，如果为None则使用默认时间范围
+        end_time: 结束时间戳，如果为None则使用默认时间范围
+        headers: 请求头，如果为None则使用默认headers
+        cookies: cookies字典，如果为None则使用默认cookies
+        session: create_http_session 创建的会话，传入时复用连接
+
+    Returns:
+        dict: API响应数据，包含直播列表信息或None（请求失败时）
+    """
+    payload = build_live_list_payload(page_size, current_page, start_time, end_time)
+    return _post_json(URL_LIST, payload, '接口1', headers=headers, cookies=cookies, session=session)
+
+def _union_columns(records):
+    """按首次出现的顺序合并所有记录的键，得到列名列表（与 pd.DataFrame(records) 的列顺序一致）"""
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+# 输出文件的一列：列名、类型（'text'、'int'、'float'），以及取自原始数据中的哪个字段
+# （source 为字段名或嵌套字段的路径元组，None 表示不从原始数据中取值；default 为字段不存在时的值）
+SchemaColumn = namedtuple('SchemaColumn', ('name', 'dtype', 'source', 'default'), defaults=(None, None))
+
+
+class RecordSchema:
+    """一个输出文件的列定义（见 RECORD_SCHEMAS）：列顺序、类型，以及每列取自原始数据中的哪个字段
+
+    声明的列总排在最前面，按声明的顺序排列；原始数据中未声明的字段（如按场景展开的预约人数、接口新增的字段）
+    按首次出现的顺序追加在后面，类型为 extra_dtype（为 None 时写出 Parquet 时按内容推断）。
+    展平时值保持接口返回的类型，只在写出时按列类型转换：xlsx/CSV 渲染为文本或数字，Parquet 使用对应的列类型。
+
+    Args:
+        columns: SchemaColumn 列表
+        extra_dtype: 未声明字段的类型
+    """
+
+    __slots__ = ('columns', 'dtypes', '_sources', 'extra_dtype')
+
+    def __init__(self, columns, extra_dtype=None):
+        self.columns = [column.name for column in columns]
+        self.dtypes = {column.name: column.dtype for column in columns}
+        # (列名, 第一层字段, 其余嵌套字段, 默认值)
+        self._sources = []
+        for column in columns:
+            if column.source is not None:
+                path = column.source if isinstance(column.source, tuple) else (column.source,)
+                self._sources.append((column.name, path[0], path[1:], column.default))
+        self.extra_dtype = extra_dtype
+
+    def dtype(self, column):
+        """列的类型，未声明的列为 extra_dtype"""
+        return self.dtypes.get(column, self.extra_dtype)
+
+    def extract(self, obj):
+        """按声明的来源字段从原始数据中取出各列的值，返回按声明顺序排列的 {列名: 值}（不取值的列为 None）"""
+        record = dict.fromkeys(self.columns)
+        for name, key, nested, default in self._sources:
+            value = obj.get(key)
+            for key in nested:
+                value = value.get(key) if isinstance(value, dict) else None
+            record[name] = default if value is None else value
+        return record
+
+    def extract_columns(self, objs):
+        """批量版 extract：逐列从一批原始数据中取值，返回 {列名: 值列表}（不取值的列全部为 None）"""
+        count = len(objs)
+        data = {name: [None] * count for name in self.columns}
+        for name, key, nested, default in self._sources:
+            values = [obj.get(key) for obj in objs]
+            for nested_key in nested:
+                values = [value.get(nested_key) if isinstance(value, dict) else None for value in values]
+            if default is not None:
+                values = [default if value is None else value for value in values]
+            data[name] = values
+        return data
+
+
+class ColumnBuffer:
+    """按列保存的一批记录：每列一个列表，同一位置的各列值组成一行（缺失为 None）
+
+    比逐行的字典紧凑，写出 Parquet 时直接按列构造表，写出 CSV/xlsx 时按行取值也不需要逐个查找键。
+    """
+
+    __slots__ = ('columns', '_data', '_length')
+
+    def __init__(self, columns=()):
+        self.columns = []
+        self._data = {}
+        self._length = 0
+        for column in columns:
+            self.add_column(column)
+
+    @classmethod
+    def from_columns(cls, data):
+        """由 {列名: 值列表} 直接构造（各列长度相同），不复制列表"""
+        buffer = cls()
+        for column, values in data.items():
+            buffer.columns.append(column)
+            buffer._data[column] = values
+            buffer._length = len(values)
+        return buffer
+
+    def add_column(self, column):
+        """新增一列，已有的行在该列的值为 None"""
+        if column not in self._data:
+            self.columns.append(column)
+            self._data[column] = [None] * self._length
+
+    def append(self, record):
+        """追加一条记录字典，记录中新出现的键作为新列"""
+        for key in record:
+            if key not in self._data:
+                self.add_column(key)
+        for column, values in self._data.items():
+            values.append(record.get(column))
+        self._length += 1
+
+    def append_row(self, values):
+        """追加一行，values 按 columns 的顺序排列，比 columns 短时其余列为 None"""
+        for column, value in itertools.zip_longest(self.columns, values):
+            self._data[column].append(value)
+        self._length += 1
+
+    def column(self, name):
+        """某一列的值列表，不存在的列全部为 None"""
+        values = self._data.get(name)
+        return values if values is not None else [None] * self._length
+
+    def rows(self, columns):
+        """按 columns 的顺序逐行产出值元组"""
+        return zip(*(self.column(column) for column in columns)) if columns else iter(())
+
+    def __len__(self):
+        return self._length
+
+
+def iter_column_chunks(records, columns, chunk_size=STREAM_CHUNK_SIZE):
+    """把记录字典（或已经按列保存的 ColumnBuffer）整理成每块最多 chunk_size 行的 ColumnBuffer，逐块产出"""
+    buffer = ColumnBuffer(columns)
+    for item in records:
+        if isinstance(item, ColumnBuffer):
+            if len(buffer):
+                yield buffer
+                buffer = ColumnBuffer(columns)
+            yield item
+            continue
+        buffer.append(item)
+        if len(buffer) >= chunk_size:
+            yield buffer
+            buffer = ColumnBuffer(columns)
+    if len(buffer):
+        yield buffer
+
+
+def _to_number(value, dtype):
+    """把数字或数字文本转换为 int（dtype 为 'int' 且是整数时）或 float，无法转换时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text) if dtype == 'int' else float(text)
+        except ValueError:
+            try:
+                return float(text)
+            except ValueError:
+                return None
+    return None
+
+
+def get_output_format(file_path):
+    """根据扩展名判断输出格式，未知扩展名按 xlsx 处理"""
+    ext = os.path.splitext(file_path)[1].lower().lstrip('.')
+    return ext if ext in OUTPUT_FORMATS else 'xlsx'
+
+
+def with_output_format(file_path, output_format=None):
+    """把文件扩展名替换为 output_format 对应的扩展名，output_format 为 None 时原样返回"""
+    if output_format is None:
+        return file_path
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选 {OUTPUT_FORMATS}")
+    return os.path.splitext(file_path)[0] + '.' + output_format
+
+
+def _is_id_column(column):
+    """以 id 结尾的列（liveObjectId、spuId、srcSpuId 等）按文本保存，避免长数字丢失精度"""
+    return str(column).lower().endswith('id')
+
+
+def coerce_numeric_columns(df):
+    """把全部由数字组成的文本列转换为数值类型（空字符串视为缺失），ID 列和其余列保持文本"""
+    import pandas as pd
+
+    for column in df.columns:
+        series = df[column]
+        if _is_id_column(column) or pd.api.types.is_numeric_dtype(series):
+            continue
+        present = series.notna() & (series.astype(str).str.strip() != '')
+        if not present.any():
+            continue
+        converted = pd.to_numeric(series.where(present), errors='coerce')
+        if converted[present].notna().all():
+            df[column] = converted
+    return df
+
+
+def write_records_to_parquet(output_file, records, columns, id_column_name='liveObjectId',
+                             row_group_size=PARQUET_ROW_GROUP_SIZE, schema=None):
+    """写出为 Parquet 文件：数字列保存为数值类型，ID 列保存为文本，使用 zstd 压缩
+
+    按 row_group_size 条一组分块写出，内存中最多保留一组记录。一列是否全部为数字要看完所有记录才能确定，
+    因此先把各组按文本写入临时文件并逐列统计，再逐组转换类型写出最终文件。
+    schema 中声明为 'text' 的列保持文本；声明为 'int'/'float' 的列使用对应类型（允许缺失值，
+    'int' 列出现小数时改用 float），出现非数字的值时退回文本；未声明的列规则同 coerce_numeric_columns。
+
+    Returns:
+        int: 写入的记录条数
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = [str(column) for column in columns]
+    declared = {column: schema.dtypes.get(column) for column in columns} if schema is not None else {}
+    text_schema = pa.schema([(column, pa.string()) for column in columns])
+    # 每列的统计：是否有非空值、非空值是否全为数字、是否全为整数、是否有缺失值
+    stats = {column: {'present': False, 'numeric': True, 'integer': True, 'missing': False}
+             for column in columns if not _is_id_column(column) and declared.get(column) != 'text'}
+
+    def to_text(value):
+        if value is None or (isinstance(value, float) and value != value):
             return None
+        return str(value)
+
+    count = 0
+    spool_file = output_file + '.text.parquet'
+    try:
+        with pq.ParquetWriter(spool_file, text_schema, compression='zstd') as writer:
+            for chunk in iter_column_chunks(records, columns, row_group_size):
+                df = pd.DataFrame({column: [to_text(value) for value in chunk.column(column)] for column in columns},
+                                  columns=columns)
+                for column, stat in stats.items():
+                    series = df[column]
+                    present = series.notna() & (series.str.strip() != '')
+                    stat['missing'] = stat['missing'] or not present.all()
+                    if present.any() and stat['numeric']:
+                        stat['present'] = True
+                        converted = pd.to_numeric(series[present], errors='coerce')
+                        stat['numeric'] = bool(converted.notna().all())
+                        stat['integer'] = stat['integer'] and pd.api.types.is_integer_dtype(converted)
+                writer.write_table(pa.Table.from_pandas(df, schema=text_schema, preserve_index=False))
+                count += len(df)
+
+        numeric_types = {}
+        for column, stat in stats.items():
+            dtype = declared.get(column)
+            if not stat['numeric']:
+                if dtype is not None:
+                    print(f"  [Warning] {output_file} 的 {column} 列声明为 {dtype}，但包含非数字的值，按文本保存")
+                continue
+            if dtype is not None:
+                numeric_types[column] = 'Int64' if dtype == 'int' and stat['integer'] else 'float64'
+            elif stat['present']:
+                numeric_types[column] = 'int64' if stat['integer'] and not stat['missing'] else 'float64'
+        arrow_types = {'Int64': pa.int64(), 'int64': pa.int64(), 'float64': pa.float64()}
+        schema_arrow = pa.schema([(column, arrow_types[numeric_types[column]] if column in numeric_types
+                                   else pa.string()) for column in columns])
+        with pq.ParquetWriter(output_file, schema_arrow, compression='zstd') as writer:
+            for batch in pq.ParquetFile(spool_file).iter_batches(batch_size=row_group_size):
+                df = batch.to_pandas()
+                for column, dtype in numeric_types.items():
+                    series = df[column]
+                    present = series.notna() & (series.str.strip() != '')
+                    if dtype == 'Int64':
+                        # 可空整数列按整数解析，避免经过 float 丢失大整数的精度
+                        converted = pd.to_numeric(series.where(present), errors='coerce', dtype_backend='numpy_nullable')
+                    else:
+                        converted = pd.to_numeric(series.where(present), errors='coerce')
+                    df[column] = converted.astype(dtype)
+                writer.write_table(pa.Table.from_pandas(df, schema=schema_arrow, preserve_index=False))
+    finally:
+        if os.path.exists(spool_file):
+            os.remove(spool_file)
+    return count
+
+
+def write_records_to_csv(output_file, records, columns):
+    """逐块写出为 CSV 文件（UTF-8 带 BOM，Excel 直接打开不乱码），缺失值写为空
+
+    Returns:
+        int: 写入的记录条数
+    """
+    count = 0
+    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in iter_column_chunks(records, columns):
+            writer.writerows(chunk.rows(columns))
+            count += len(chunk)
+    return count
+
+
+@METRICS.phase('save')
+def write_records(output_file, records, columns, sheet_name, id_column_name='liveObjectId', schema=None):
+    """按 output_file 的扩展名写出记录：.xlsx（默认）、.parquet、.csv
+
+    Args:
+        records: 记录字典或 ColumnBuffer 的可迭代对象
+        schema: 输出的 RecordSchema，决定 Parquet 的列类型和 xlsx 单元格按文本还是数字写入；
+                为 None 时 Parquet 按内容推断类型，xlsx 按值原样写入
+
+    Returns:
+        int: 写入的记录条数
+    """
+    output_format = get_output_format(output_file)
+    if output_format == 'parquet':
+        return write_records_to_parquet(output_file, records, columns, id_column_name, schema=schema)
+    if output_format == 'csv':
+        return write_records_to_csv(output_file, records, columns)
+    return write_records_to_excel(output_file, records, columns, sheet_name, id_column_name, schema=schema)
+
+
+def read_records_table(file_path, dtype=str):
+    """按扩展名读取输出文件（xlsx 读第一个工作表），返回 DataFrame"""
+    import pandas as pd
+
+    output_format = get_output_format(file_path)
+    if output_format == 'parquet':
+        df = pd.read_parquet(file_path)
+        return df.astype(dtype) if dtype is not None else df
+    if output_format == 'csv':
+        return pd.read_csv(file_path, dtype=dtype, keep_default_na=False, encoding='utf-8-sig')
+    return pd.read_excel(file_path, sheet_name=0, dtype=dtype)
+
+
+def read_table_columns(file_path):
+    """只读取输出文件的表头，返回列名列表"""
+    output_format = get_output_format(file_path)
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(file_path).schema_arrow.names)
+    if output_format == 'csv':
+        with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+            return next(csv.reader(f), [])
+
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        header = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    return [str(column) for column in header if column is not None]
+
+
+def iter_records_table(file_path, text=True, chunk_size=STREAM_CHUNK_SIZE):
+    """按块读取输出文件（xlsx 读第一个工作表），逐条产出记录字典，内存中最多保留 chunk_size 行
+
+    Args:
+        file_path: 输出文件路径
+        text: True 时所有值按文本读取（缺失值为空字符串），False 时保留文件中的类型
+        chunk_size: 每次读取的行数
+    """
+    output_format = get_output_format(file_path)
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+            for record in batch.to_pylist():
+                if text:
+                    record = {key: '' if value is None else str(value) for key, value in record.items()}
+                yield record
+        return
+
+    if output_format == 'csv':
+        import pandas as pd
+        with pd.read_csv(file_path, dtype=str if text else None, keep_default_na=False, encoding='utf-8-sig',
+                         chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield from chunk.to_dict('records')
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        for row in rows:
+            if text:
+                row = ['' if value is None else str(value) for value in row]
+            yield {column: value for column, value in zip(header, row) if column is not None}
+    finally:
+        wb.close()
+
+
+def export_to_excel(input_file, output_file=None, sheet_name='Sheet1', id_column_name='liveObjectId'):
+    """把 Parquet/CSV 输出渲染为 xlsx（可选的最后一步，供需要 Excel 的使用者查看）
+
+    Args:
+        input_file: .parquet 或 .csv 文件
+        output_file: 输出的 xlsx 文件路径，默认与 input_file 同名
+        sheet_name: 工作表名称
+        id_column_name: ID列名称（设置为文本格式）
+
+    Returns:
+        bool: 是否成功导出
+    """
+    output_file = output_file or with_output_format(input_file, 'xlsx')
+    try:
+        count = write_records_to_excel(output_file, iter_records_table(input_file, text=False),
+                                       read_table_columns(input_file), sheet_name, id_column_name)
+        print(f"  导出 {count} 条记录到 {output_file}")
+        return True
     except Exception as e:
-        print(f"Request error: {e}")
-        return None
+        print(f"  [Error] 导出Excel失败: {e}")
+        return False
+
+
+def write_records_to_excel(output_file, records, columns, sheet_name, id_column_name='liveObjectId', schema=None):
+    """使用 openpyxl 只写模式逐行写出记录，ID 列在写入时直接设为文本格式
+
+    Args:
+        output_file: Excel文件路径（覆盖写入）
+        records: 记录字典或 ColumnBuffer 的可迭代对象，可以是生成器
+        columns: 列名列表
+        sheet_name: 工作表名称
+        id_column_name: ID列名称（设置为文本格式，避免长数字被 Excel 转成科学计数法）
+        schema: 输出的 RecordSchema：声明为 'int'/'float' 的列写为数字，其余列写为文本；
+                为 None 时按值原样写入
 
-def save_records_to_excel_file(output_file, all_records, sheet_name='产品数据', id_column_name='liveobjectid', silent=False):
+    Returns:
+        int: 写入的记录条数
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    id_index = columns.index(id_column_name) if id_column_name in columns else None
+
+    def text_cell(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.number_format = '@'  # '@' 表示文本格式
+        return cell
+
+    header = list(columns)
+    if id_index is not None:
+        header[id_index] = text_cell(id_column_name)
+    ws.append(header)
+
+    # 各列的渲染方式：None 表示按值原样写入，否则为 'text' 或数字类型
+    dtypes = [None if schema is None else (schema.dtype(column) or 'text') for column in columns]
+
+    count = 0
+    for chunk in iter_column_chunks(records, columns):
+        for values in chunk.rows(columns):
+            row = []
+            for value, dtype in zip(values, dtypes):
+                # DataFrame 中的缺失值（NaN）写为空单元格
+                if value is None or (isinstance(value, float) and value != value):
+                    value = None
+                elif dtype == 'text':
+                    value = str(value)
+                elif dtype is not None:
+                    number = _to_number(value, dtype)
+                    value = str(value) if number is None else number
+                row.append(value)
+            if id_index is not None and row[id_index] is not None:
+                row[id_index] = text_cell(str(row[id_index]))
+            ws.append(row)
+            count += 1
+
+    wb.save(output_file)
+    return count
+
+
+def save_records_to_excel_file(output_file, all_records, sheet_name='产品数据', id_column_name='liveobjectid', silent=False,
+                               output_format=None):
     """保存所有记录到Excel文件（覆盖写入，不追加）
 
     Args:
@@ -188,6 +1567,7 @@ def save_records_to_excel_file(output_file, all_records, sheet_name='产品数
         sheet_name: 工作表名称
         id_column_name: ID列名称（用于设置文本格式）
         silent: 是否静默模式（不输出日志）
+        output_format: 输出格式（'xlsx'/'parquet'/'csv'），为 None 时按 output_file 的扩展名决定
 
     Returns:
         bool: 是否成功保存
@@ -196,39 +1576,8 @@ def save_records_to_excel_file(output_file, all_records, sheet_name='产品数
         if not all_records:
             return True
 
-        # 确保所有记录的 ID 列是字符串格式
-        for record in all_records:
-            if id_column_name in record:
-                record[id_column_name] = str(record[id_column_name])
-
-        # 创建DataFrame
-        df = pd.DataFrame(all_records)
-
-        # 确保 ID 列是字符串类型
-        if id_column_name in df.columns:
-            df[id_column_name] = df[id_column_name].astype(str)
-
-        # 保存到Excel文件，使用 openpyxl 引擎以便后续设置格式
-        with pd.ExcelWriter(output_file, engine='openpyxl', mode='w') as writer:
-            df.to_excel(writer, index=False, sheet_name=sheet_name)
-
-            # 获取工作表并设置 ID 列为文本格式
-            ws = writer.sheets[sheet_name]
-            # 查找 ID 列的索引
-            header_row = 1
-            id_col = None
-            for col_idx, cell in enumerate(ws[header_row], 1):
-                if cell.value == id_column_name:
-                    id_col = col_idx
-                    break
-
-            if id_col:
-                # 设置该列所有单元格的格式为文本（包括表头和数据）
-                for row_idx in range(1, ws.max_row + 1):  # 包括表头
-                    cell = ws.cell(row=row_idx, column=id_col)
-                    if cell.value is not None:
-                        cell.value = str(cell.value)
-                    cell.number_format = '@'  # '@' 表示文本格式
+        output_file = with_output_format(output_file, output_format)
+        write_records(output_file, all_records, _union_columns(all_records), sheet_name, id_column_name)
 
         if not silent:
             print(f"  保存 {len(all_records)} 条记录到 {output_file}")
@@ -240,8 +1589,313 @@ def save_records_to_excel_file(output_file, all_records, sheet_name='产品数
             print(f"  [Error] 保存记录到Excel文件失败: {e}")
         return False
 
+
+def iter_kept_records(output_file, replaced_ids, id_column_name='liveObjectId'):
+    """按块读取已有输出文件，逐条产出不在 replaced_ids 里的行（值均为文本），文件不存在时不产出任何行"""
+    if not os.path.exists(output_file):
+        return
+
+    replaced = set(str(live_id) for live_id in replaced_ids)
+    for record in iter_records_table(output_file):
+        if str(record.get(id_column_name)) not in replaced:
+            yield record
+
+
+def patch_records(existing_records, new_records, replaced_ids, id_column_name='liveObjectId'):
+    """按原位置替换记录：已有记录中 replaced_ids 对应的行换成同一ID的新记录（可以是多行），
+    其余行顺序不变；已有记录中不存在的ID的新记录追加在最后"""
+    replaced = set(str(live_id) for live_id in replaced_ids)
+    new_by_id = {}
+    for record in new_records:
+        new_by_id.setdefault(str(record.get(id_column_name)), []).append(record)
+
+    for record in existing_records:
+        live_id = str(record.get(id_column_name))
+        if live_id not in replaced:
+            yield record
+        elif live_id in new_by_id:
+            yield from new_by_id.pop(live_id)
+    for records in new_by_id.values():
+        yield from records
+
+
+def merge_records_into_excel_file(output_file, new_records, replaced_ids, sheet_name, id_column_name='liveObjectId',
+                                  schema=None):
+    """将新记录合并进已有的输出文件：已有文件中 replaced_ids 对应的行被新记录替换，其余行保留在新记录之后
+
+    Args:
+        output_file: Excel文件路径，不存在时直接保存新记录
+        new_records: 新记录字典的可迭代对象
+        replaced_ids: 需要被替换的ID列表（一般为本次重新获取的 liveObjectId）
+        sheet_name: 工作表名称
+        id_column_name: ID列名称
+        schema: 输出的 RecordSchema
+
+    Returns:
+        bool: 是否成功保存；读取已有文件失败时不覆盖，返回 False
+    """
+    sink = RecordSink(output_file, sheet_name, id_column_name, merge_ids=replaced_ids, schema=schema)
+    sink.extend(new_records)
+    return sink.close()
+
+
+class RecordSink:
+    """流式输出：下载过程中把新记录逐行追加到中间文件（JSONL），结束时一次性生成 xlsx
+
+    中间文件只追加新行，实时保存的开销与新增记录数成正比，而不是每次重写整个工作簿；
+    最终的 xlsx 用只写模式逐行生成，ID 列在写入时直接设置为文本格式。
+    中间文件每行是按列顺序排列的 JSON 数组（不重复写键名），生成最终文件时按块读回为 ColumnBuffer；
+    合并时已有文件也按块读取，内存占用与记录总数无关；先写到临时文件再替换，生成失败时已有的输出文件保持不变。
+
+    Args:
+        output_file: 最终输出的Excel文件路径
+        sheet_name: 工作表名称
+        id_column_name: ID列名称
+        merge_ids: 不为 None 时，结束时合并进已有的输出文件（替换这些ID对应的行，其余行保留）
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份同名的 xlsx 文件
+        patch: 合并时新记录放在被替换行的原位置（用于重试失败记录），否则放在保留的行之前
+        schema: 输出的 RecordSchema（见 RECORD_SCHEMAS），声明的列总是输出并排在最前面，写出时按其类型转换
+        flatten_func: append_response 使用的展平函数（flatten_live_single_data 等），
+                      接口响应每积累 batch_size 个直播用 flatten_batch 按列展平一次
+        batch_size: 批量展平的直播数
+    """
+
+    def __init__(self, output_file, sheet_name, id_column_name='liveObjectId', merge_ids=None, render_excel=False,
+                 patch=False, schema=None, flatten_func=None, batch_size=FLATTEN_BATCH_SIZE):
+        self.output_file = output_file
+        self.sheet_name = sheet_name
+        self.id_column_name = id_column_name
+        self.merge_ids = merge_ids
+        self.patch = patch
+        self.schema = schema
+        self.render_excel = render_excel and get_output_format(output_file) != 'xlsx'
+        self.partial_file = output_file + '.partial.jsonl'
+        self.count = 0
+        # {列名: 在中间文件每行数组中的位置}
+        self._columns = {column: index for index, column in enumerate(schema.columns if schema else ())}
+        self.flatten_func = flatten_func
+        self.batch_size = batch_size
+        self._pending_ids = []
+        self._pending_responses = []
+        self._file = open(self.partial_file, 'w', encoding='utf-8')
+
+    def append(self, record):
+        """追加一条记录"""
+        if self.id_column_name in record:
+            record[self.id_column_name] = str(record[self.id_column_name])
+        for key in record:
+            if key not in self._columns:
+                self._columns[key] = len(self._columns)
+        row = [None] * len(self._columns)
+        for key, value in record.items():
+            row[self._columns[key]] = value
+        # 末尾的缺失值不写出，读回时补为 None
+        while row and row[-1] is None:
+            row.pop()
+        self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def extend(self, records):
+        """追加多条记录"""
+        for record in records:
+            self.append(record)
+
+    def append_columns(self, buffer):
+        """追加一个 ColumnBuffer 中的全部记录（如批量展平的结果）"""
+        for column in buffer.columns:
+            if column not in self._columns:
+                self._columns[column] = len(self._columns)
+        positions = [self._columns[column] for column in buffer.columns]
+        in_order = positions == list(range(len(positions)))
+        width = len(self._columns)
+        if self.id_column_name in buffer.columns:
+            ids = buffer.column(self.id_column_name)
+            ids[:] = [None if live_id is None else str(live_id) for live_id in ids]
+
+        lines = []
+        for values in buffer.rows(buffer.columns):
+            if in_order:
+                row = list(values)
+            else:
+                row = [None] * width
+                for position, value in zip(positions, values):
+                    row[position] = value
+            while row and row[-1] is None:
+                row.pop()
+            lines.append(json.dumps(row, ensure_ascii=False) + '\n')
+        self._file.write(''.join(lines))
+        self.count += len(buffer)
+
+    def append_response(self, live_id, data):
+        """追加一个直播的接口原始响应，积累 batch_size 个后批量展平；data 为 None 时写入只有ID的占位记录"""
+        self._pending_ids.append(live_id)
+        self._pending_responses.append(data)
+        if len(self._pending_ids) >= self.batch_size:
+            self._flatten_pending()
+
+    def _flatten_pending(self):
+        if not self._pending_ids:
+            return
+        with METRICS.phase('flatten'):
+            buffer = flatten_batch(self.flatten_func, self._pending_ids, self._pending_responses, self.id_column_name)
+        self._pending_ids = []
+        self._pending_responses = []
+        self.append_columns(buffer)
+
+    def __len__(self):
+        return self.count
+
+    def flush(self):
+        """实时保存：把已追加的记录刷到磁盘（append_response 尚未展平的响应已在断点续传日志中，不在此展平）"""
+        with METRICS.phase('save'):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _iter_partial(self, columns):
+        """按块读回中间文件，逐块产出 ColumnBuffer；columns 以本对象的列开头（顺序相同）"""
+        buffer = ColumnBuffer(columns)
+        with open(self.partial_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                buffer.append_row(json.loads(line))
+                if len(buffer) >= STREAM_CHUNK_SIZE:
+                    yield buffer
+                    buffer = ColumnBuffer(columns)
+        if len(buffer):
+            yield buffer
+
+    def _iter_partial_records(self, columns):
+        """逐条读回中间文件中的记录字典"""
+        for chunk in self._iter_partial(columns):
+            for values in chunk.rows(columns):
+                yield dict(zip(columns, values))
+
+    def discard(self):
+        """放弃已追加的记录：关闭并删除中间文件，不生成输出文件"""
+        self._pending_ids = []
+        self._pending_responses = []
+        self._file.close()
+        if os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+
+    def close(self, silent=False):
+        """生成最终的输出文件并删除中间文件；生成失败时保留中间文件，返回 False"""
+        self._flatten_pending()
+        return self._close(silent)
+
+    @METRICS.phase('save')
+    def _close(self, silent=False):
+        self._file.close()
+        base, ext = os.path.splitext(self.output_file)
+        writing_file = base + '.writing' + ext
+        try:
+            if self.count == 0 and self.merge_ids is None:
+                os.remove(self.partial_file)
+                return True
+
+            columns = list(self._columns)
+            merging = self.merge_ids is not None and os.path.exists(self.output_file)
+            if merging:
+                try:
+                    existing_columns = read_table_columns(self.output_file)
+                except Exception as e:
+                    print(f"  [Error] 读取已有文件 {self.output_file} 失败，未合并: {e}")
+                    return False
+                columns = _union_columns([self._columns, dict.fromkeys(existing_columns)])
+
+            def iter_output():
+                if not merging:
+                    return self._iter_partial(columns)
+                # 原位替换时需要遍历全部已有行以确定位置，被替换的行在 patch_records 中跳过
+                kept_records = iter_kept_records(self.output_file, [] if self.patch else self.merge_ids,
+                                                 self.id_column_name)
+                if self.patch:
+                    return patch_records(kept_records, self._iter_partial_records(columns), self.merge_ids,
+                                         self.id_column_name)
+                return itertools.chain(self._iter_partial(columns), kept_records)
+
+            total = write_records(writing_file, iter_output(), columns, self.sheet_name, self.id_column_name,
+                                  schema=self.schema)
+            if self.render_excel:
+                excel_file = with_output_format(self.output_file, 'xlsx')
+                write_records_to_excel(excel_file, iter_output(), columns, self.sheet_name, self.id_column_name,
+                                       schema=self.schema)
+                if not silent:
+                    print(f"  导出 {total} 条记录到 {excel_file}")
+            os.replace(writing_file, self.output_file)
+            os.remove(self.partial_file)
+
+            if not silent:
+                if merging:
+                    print(f"  合并: 新记录 {self.count} 条，合并后共 {total} 条")
+                print(f"  保存 {total} 条记录到 {self.output_file}")
+            return True
+        except Exception as e:
+            if os.path.exists(writing_file):
+                os.remove(writing_file)
+            print(f"  [Error] 保存记录到Excel文件失败: {e}（已获取的数据保留在 {self.partial_file}）")
+            return False
+
+
+# 各输出文件的列定义（接口1~4），键与 ENRICH_STAGES 相同；列表数据为 'list'
+# 只声明确定存在的字段，接口返回的其余字段按首次出现的顺序追加在后面
+RECORD_SCHEMAS = {
+    'list': RecordSchema([
+        SchemaColumn('liveObjectId', 'text', 'liveObjectId'),
+        SchemaColumn('直播信息', 'text', 'description'),
+        SchemaColumn('直播时长', 'int', ('liveStats', 'liveDurationInSeconds'), 0),
+        SchemaColumn('观看人数', 'int', ('liveStats', 'totalAudienceCount'), 0),
+        SchemaColumn('最高在线', 'int', 'maxOnlineCount', 0),
+        SchemaColumn('总热度', 'int', 'hotQuota', 0),
+        SchemaColumn('成交金额', 'int', 'payedGmv', '0'),
+    ]),
+    'detail': RecordSchema([
+        SchemaColumn('liveObjectId', 'text'),
+        SchemaColumn('reserveNoticeUserCount', 'int', 'reserveNoticeUserCount'),
+        SchemaColumn('reserveNoticeJoinliveRatio', 'float', 'reserveNoticeJoinliveRatio'),
+    ], extra_dtype='int'),  # 按场景展开的 scene_<场景>_reserveNoticeUserCount
+    'product': RecordSchema([
+        SchemaColumn('liveObjectId', 'text'),
+        SchemaColumn('srcSpuId', 'text', ('baseData', 'srcSpuId')),
+        SchemaColumn('spuId', 'text', ('baseData', 'spuId')),
+        SchemaColumn('src', 'int', ('baseData', 'src')),
+        SchemaColumn('spuName', 'text', ('baseData', 'spuName')),
+        SchemaColumn('thumbUrl', 'text', ('baseData', 'thumbUrl')),
+        SchemaColumn('price', 'int', ('baseData', 'price')),
+        SchemaColumn('srcName', 'text', ('baseData', 'srcName')),
+        SchemaColumn('baseStock', 'int', ('baseData', 'stock')),  # 重命名避免与商品的其他字段冲突
+        # 商品指标（build_spu_payload 的 fieldList，stock、id 在 baseData 中），金额单位为分
+        SchemaColumn('gmv', 'int', 'gmv'),
+        SchemaColumn('refund_amount', 'int', 'refund_amount'),
+        SchemaColumn('exp_pv', 'int', 'exp_pv'),
+        SchemaColumn('exp_uv', 'int', 'exp_uv'),
+        SchemaColumn('clk_pv', 'int', 'clk_pv'),
+        SchemaColumn('clk_uv', 'int', 'clk_uv'),
+        SchemaColumn('create_pv', 'int', 'create_pv'),
+        SchemaColumn('create_uv', 'int', 'create_uv'),
+        SchemaColumn('pay_pv', 'int', 'pay_pv'),
+        SchemaColumn('pay_uv', 'int', 'pay_uv'),
+        SchemaColumn('new_customer_pay_pv', 'int', 'new_customer_pay_pv'),
+        SchemaColumn('no_finish_pv', 'int', 'no_finish_pv'),
+        SchemaColumn('share_uv', 'int', 'share_uv'),
+        SchemaColumn('refund_pv', 'int', 'refund_pv'),
+        SchemaColumn('refund_uv', 'int', 'refund_uv'),
+        SchemaColumn('explanation_count', 'int', 'explanation_count'),
+        SchemaColumn('exp_clk_ratio', 'float', 'exp_clk_ratio'),
+        SchemaColumn('clk_pay_ratio', 'float', 'clk_pay_ratio'),
+        SchemaColumn('clk_pay_ratio_pv', 'float', 'clk_pay_ratio_pv'),
+        SchemaColumn('new_customer_conversion_rate', 'float', 'new_customer_conversion_rate'),
+        SchemaColumn('new_customer_conversion_rate_pv', 'float', 'new_customer_conversion_rate_pv'),
+        SchemaColumn('refund_rate', 'float', 'refund_rate'),
+    ]),
+    # 接口4的字段名未确认，只声明 liveObjectId，其余字段按返回的原始键名追加、按内容推断类型
+    'ec': RecordSchema([
+        SchemaColumn('liveObjectId', 'text'),
+    ]),
+}
+
+
 def flatten_live_data(live_object):
-    """将直播列表数据展平为标准格式
+    """将直播列表数据展平为标准格式（列见 RECORD_SCHEMAS['list']）
 
     Args:
         live_object: 直播对象数据字典，包含直播的基本信息和统计数据
@@ -249,19 +1903,8 @@ def flatten_live_data(live_object):
     Returns:
         dict: 展平后的直播数据，包含liveObjectId、直播信息、直播时长、观看人数等字段
     """
-    live_stats = live_object.get('liveStats', {})
-
-    # 只保留需要的字段，按照表头顺序
-    flat_data = {
-        'liveObjectId': str(live_object.get('liveObjectId')),  # 转换为字符串
-        '直播信息': live_object.get('description'),
-        '直播时长': live_object.get('liveStats', {}).get('liveDurationInSeconds', 0),
-        '观看人数': live_object.get('liveStats', {}).get('totalAudienceCount', 0),
-        '最高在线': live_object.get('maxOnlineCount', 0),
-        '总热度': live_object.get('hotQuota', 0),
-        '成交金额': live_object.get('payedGmv', '0'),
-    }
-
+    flat_data = RECORD_SCHEMAS['list'].extract(live_object)
+    flat_data['liveObjectId'] = str(flat_data['liveObjectId'])  # 转换为字符串
     return flat_data
 
 def backup_file(file_path):
@@ -271,9 +1914,10 @@ def backup_file(file_path):
         file_path: 要备份的文件路径
     """
     if os.path.exists(file_path):
-        # 生成备份文件名
-        if file_path.endswith('.xlsx'):
-            backup_path = file_path[:-5] + '_backup.xlsx'
+        # 生成备份文件名（xlsx2.xlsx -> xlsx2_backup.xlsx）
+        base, ext = os.path.splitext(file_path)
+        if ext:
+            backup_path = base + '_backup' + ext
         else:
             backup_path = file_path + '_backup'
 
@@ -284,7 +1928,559 @@ def backup_file(file_path):
             print(f"[Warning] 备份文件失败: {e}")
 
 
-def download_detail_data(output_file='xlsx2.xlsx', user_data_dir='./browser_data'):
+class CheckpointJournal:
+    """追加写入的断点续传日志（JSONL），每行记录一个已完成的 liveObjectId 及其原始响应 data
+
+    下载中断后重新运行时，日志中已有的 liveObjectId 不再请求，直接使用记录的原始响应；
+    下载全部完成并保存成功后调用 clear() 删除日志。completed 在内存中只保存每条记录在日志中的位置，
+    原始响应在取用时才读取。
+
+    Args:
+        name: 日志名称（一般为接口名，如 'detail'），对应文件 {journal_dir}/{name}.jsonl
+        journal_dir: 日志目录
+        resume: 是否读取已有日志继续下载，False 时丢弃旧日志重新开始
+    """
+
+    def __init__(self, name, journal_dir=JOURNAL_DIR, resume=True):
+        self.path = os.path.join(journal_dir, f'{name}.jsonl')
+        self.completed = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+        if resume:
+            self.completed = self._load()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _load(self):
+        """扫描已完成的记录，返回只读映射 {liveObjectId: data}
+
+        中断时写了一半的最后一行会被忽略，并从文件中截掉，之后追加的记录从新的一行开始。
+        """
+        offsets = {}
+        if not os.path.exists(self.path):
+            return offsets
+
+        offset = 0
+        good_end = 0
+        newline = True
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if entry is not None:
+                    offsets[str(entry['liveObjectId'])] = offset
+                    good_end = offset + len(line)
+                    newline = line.endswith(b'\n')
+                offset += len(line)
+        if good_end != offset or not newline:
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+                if not newline:
+                    f.seek(good_end)
+                    f.write(b'\n')
+        return _JournalEntries(self.path, offsets)
+
+    def append(self, live_id, data):
+        """追加一条已完成的记录并立即刷盘（线程安全）"""
+        line = json.dumps({'liveObjectId': str(live_id), 'data': data}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        """下载完成后删除日志文件"""
+        self.close()
+        if isinstance(self.completed, _JournalEntries):
+            self.completed.close()
+        self.completed = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _JournalEntries:
+    """CheckpointJournal.completed：{liveObjectId: 日志中的行偏移}，data 在取用时才从日志文件读取"""
+
+    def __init__(self, path, offsets):
+        self._path = path
+        self._offsets = offsets
+        self._file = None
+
+    def __contains__(self, live_id):
+        return live_id in self._offsets
+
+    def __getitem__(self, live_id):
+        offset = self._offsets[live_id]
+        if self._file is None:
+            self._file = open(self._path, 'rb')
+        self._file.seek(offset)
+        return json.loads(self._file.readline())['data']
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ResponseCache:
+    """接口响应的本地缓存（SQLite，线程安全），命中时不再请求接口
+
+    以 (接口名, liveObjectId) 为键保存 zlib 压缩后的原始响应 data。开播时间早于 final_age 秒之前的直播
+    缓存永久有效；较新或开播时间未知的直播缓存 ttl 秒后过期。每个接口分别统计命中/未命中次数，
+    close() 时打印。
+
+    Args:
+        path: 缓存数据库文件
+        final_age: 开播超过该秒数的直播视为数据不再变化
+        ttl: 其余直播的缓存有效期（秒）
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_FILE, final_age=RESPONSE_CACHE_FINAL_AGE, ttl=RESPONSE_CACHE_TTL):
+        self.path = path
+        self.final_age = final_age
+        self.ttl = ttl
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'endpoint TEXT NOT NULL, live_id TEXT NOT NULL, data BLOB NOT NULL, '
+            'fetched_at INTEGER NOT NULL, expires_at INTEGER, PRIMARY KEY (endpoint, live_id))'
+        )
+        self._conn.commit()
+
+    def fresh_ids(self, endpoint, live_ids):
+        """返回 live_ids 中缓存未过期的 liveObjectId 集合，并计入该接口的命中/未命中统计"""
+        wanted = set(str(live_id) for live_id in live_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT live_id FROM responses WHERE endpoint = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (endpoint, int(time.time()))
+            ).fetchall()
+        fresh = {row[0] for row in rows} & wanted
+        stats = self.stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        stats['hits'] += len(fresh)
+        stats['misses'] += len(wanted) - len(fresh)
+        return fresh
+
+    def get(self, endpoint, live_id):
+        """读取缓存的响应 data，不存在时返回 None（不检查过期，调用前应先用 fresh_ids 筛选）"""
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM responses WHERE endpoint = ? AND live_id = ?',
+                                     (endpoint, str(live_id))).fetchone()
+        return None if row is None else json.loads(zlib.decompress(row[0]))
+
+    def put(self, endpoint, live_id, data, start_time=None):
+        """保存一条响应；start_time 为直播开播时间（秒级时间戳），决定缓存是否永久有效"""
+        now = int(time.time())
+        expires_at = None if start_time and now - start_time > self.final_age else now + self.ttl
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                               (endpoint, str(live_id), blob, now, expires_at))
+            self._pending_writes += 1
+            if self._pending_writes >= 100:
+                self._conn.commit()
+                self._pending_writes = 0
+
+    def view(self, endpoint, live_ids):
+        """返回一个只读映射 {liveObjectId: data}，只包含 live_ids 中缓存命中的直播，data 在取用时才读取"""
+        return _CachedResponses(self, endpoint, self.fresh_ids(endpoint, live_ids))
+
+    def report(self):
+        """打印各接口的缓存命中统计"""
+        for endpoint, stats in self.stats.items():
+            total = stats['hits'] + stats['misses']
+            if total:
+                print(f"[缓存] {endpoint}: 命中 {stats['hits']} 条，未命中 {stats['misses']} 条"
+                      f"（命中率 {stats['hits'] / total:.0%}）")
+
+    def close(self):
+        """提交未写入的缓存并关闭数据库，同时打印命中统计"""
+        self.report()
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class _CachedResponses:
+    """ResponseCache.view 返回的只读映射，配合 ChainMap 与断点续传日志中的已完成数据合并使用"""
+
+    def __init__(self, cache, endpoint, live_ids):
+        self._cache = cache
+        self._endpoint = endpoint
+        self._live_ids = live_ids
+
+    def __contains__(self, live_id):
+        return live_id in self._live_ids
+
+    def __getitem__(self, live_id):
+        if live_id not in self._live_ids:
+            raise KeyError(live_id)
+        return self._cache.get(self._endpoint, live_id)
+
+    def __len__(self):
+        return len(self._live_ids)
+
+    def __iter__(self):
+        return iter(self._live_ids)
+
+
+def open_response_cache(cache_file=RESPONSE_CACHE_FILE):
+    """打开响应缓存，cache_file 为 None 时返回 None（不使用缓存）"""
+    if cache_file is None:
+        return None
+    try:
+        return ResponseCache(cache_file)
+    except Exception as e:
+        print(f"[Warning] 打开响应缓存 {cache_file} 失败，本次不使用缓存: {e}")
+        return None
+
+
+def load_live_start_times(list_file):
+    """读取列表数据中各直播的开播时间 {liveObjectId: 秒级时间戳}（来自索引文件），读取不到时返回空字典"""
+    entries = load_live_index(list_file) or []
+    return {entry['liveObjectId']: entry['startTime'] for entry in entries if entry.get('startTime')}
+
+
+class ResponseArchive:
+    """原始响应归档（线程安全）：把每个成功的接口响应连同请求信息追加写入 gzip 压缩的 JSONL 文件
+
+    每次运行在 archive_dir 下新建一个文件（raw-<时间>-<进程号>.jsonl.gz），已有的归档文件只读不改。
+    每行为 {"api": 接口名, "url": 请求地址, "payload": 请求体, "fetchedAt": 秒级时间戳, "data": 响应 data}。
+    """
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, enabled=ARCHIVE_RESPONSES):
+        self.archive_dir = archive_dir
+        self.enabled = enabled
+        self.path = None
+        self.count = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, api_name, url, payload, data):
+        """追加一条响应；data 为 None（请求失败）或未启用归档时忽略"""
+        if not self.enabled or data is None:
+            return
+        line = json.dumps({'api': api_name, 'url': url, 'payload': payload, 'fetchedAt': int(time.time()),
+                           'data': data}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.archive_dir, exist_ok=True)
+                self.path = os.path.join(self.archive_dir,
+                                         f"raw-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz")
+                self._file = gzip.open(self.path, 'at', encoding='utf-8')
+                atexit.register(self.close)
+            self._file.write(line + '\n')
+            self.count += 1
+            # 定期刷新压缩流，进程意外退出时已刷新的部分仍可读取
+            if self.count % 100 == 0:
+                self._file.flush()
+
+    def close(self):
+        """关闭当前归档文件，之后的响应写入新文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+RESPONSE_ARCHIVE = ResponseArchive()
+
+
+def iter_archive_records(archive_dir=ARCHIVE_DIR):
+    """按写入顺序（文件名即时间顺序）逐条读取归档中的响应记录，文件末尾不完整的部分会被跳过"""
+    if not os.path.isdir(archive_dir):
+        return
+    for name in sorted(os.listdir(archive_dir)):
+        if not name.endswith('.jsonl.gz'):
+            continue
+        path = os.path.join(archive_dir, name)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        except (EOFError, OSError, ValueError) as e:
+            print(f"[Warning] 归档文件 {path} 不完整，已读取到出错位置为止: {e}")
+
+
+class DeadLetterQueue:
+    """持久化的失败记录：重试后仍未获取到数据的 liveObjectId，按接口分组，并记录结果所在的输出文件
+
+    文件 {journal_dir}/dead_letter.json 的格式为 {接口: {"output_file": 输出文件, "ids": [liveObjectId, ...]}}，
+    接口为 ENRICH_STAGES 的键（detail / product / ec / diagnostic）。retry_dead_letters 只重新请求这些
+    liveObjectId 并合并进原输出文件，不必重新下载整个接口。
+
+    Args:
+        journal_dir: 断点续传日志目录，失败记录文件保存在该目录下
+    """
+
+    def __init__(self, journal_dir=JOURNAL_DIR):
+        self.path = os.path.join(journal_dir, DEAD_LETTER_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"[Warning] 读取失败记录 {self.path} 失败: {e}")
+
+    def ids(self, stage_key):
+        """某个接口的失败 liveObjectId 列表"""
+        return list(self.entries.get(stage_key, {}).get('ids', []))
+
+    def output_file(self, stage_key):
+        """某个接口的失败记录对应的输出文件"""
+        return self.entries.get(stage_key, {}).get('output_file')
+
+    def update(self, stage_key, output_file, failed_ids, succeeded_ids=()):
+        """记录一次下载的结果：移除本次成功获取的 liveObjectId，加入本次失败的 liveObjectId
+
+        输出文件与已有记录不同时（改用了别的输出文件），已有记录作废。
+        """
+        entry = self.entries.get(stage_key)
+        if entry is None or entry.get('output_file') != output_file:
+            entry = {'output_file': output_file, 'ids': []}
+        resolved = {str(live_id) for live_id in succeeded_ids}
+        ids = [live_id for live_id in entry['ids'] if live_id not in resolved]
+        ids.extend(str(live_id) for live_id in failed_ids)
+        entry['ids'] = list(dict.fromkeys(ids))
+
+        if entry['ids']:
+            self.entries[stage_key] = entry
+            print(f"  [失败记录] {stage_key} 共 {len(entry['ids'])} 个 liveObjectId 未获取到数据，"
+                  f"可运行 retry_dead_letters() 单独重试")
+        else:
+            self.entries.pop(stage_key, None)
+
+    def save(self):
+        """保存失败记录（先写临时文件再替换），没有失败记录时删除文件"""
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
+
+
+def record_dead_letters(journal_dir, stage_key, output_file, failed_ids, succeeded_ids):
+    """把一次下载中失败和成功的 liveObjectId 更新到失败记录文件"""
+    dead_letters = DeadLetterQueue(journal_dir)
+    dead_letters.update(stage_key, output_file, failed_ids, succeeded_ids)
+    dead_letters.save()
+
+
+class RateLimiter:
+    """令牌桶限速器（线程安全），同一次下载的所有工作线程共享一个实例
+
+    Args:
+        rate: 每秒补充的令牌数，即稳定状态下每秒最多请求数（<=0 表示不限速）
+        burst: 令牌桶容量，即允许的瞬时突发请求数
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预占一个令牌，返回拿到令牌前需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """异步版本的 acquire，等待期间不阻塞事件循环"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """自适应令牌桶限速器（AIMD）：遇到限流信号时乘性降低速率，请求正常时加性恢复，速率不超过初始速率
+
+    Args:
+        rate: 初始速率，也是速率上限，每秒请求数
+        burst: 令牌桶容量
+        min_rate: 速率下限
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST, min_rate=ADAPTIVE_MIN_RATE):
+        super().__init__(rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = min(self.rate, min_rate)
+        self._last_decrease = 0.0
+
+    def on_success(self):
+        """请求正常：速率每秒约提高 ADAPTIVE_INCREASE，不超过 max_rate"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + ADAPTIVE_INCREASE / self.rate)
+
+    def on_throttle(self):
+        """遇到限流信号：速率乘以 ADAPTIVE_DECREASE，并清空已积累的令牌，使后续请求立即放慢
+
+        Returns:
+            bool: 是否实际降速（冷却期内的重复信号被忽略）
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < ADAPTIVE_COOLDOWN:
+                return False
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * ADAPTIVE_DECREASE)
+            self._tokens = min(self._tokens, 0.0)
+            return True
+
+
+class RateController:
+    """按接口管理限速器：同一进程中同一接口的所有请求共享一个自适应限速器，
+    _post_json / _async_post_json 把每次请求的结果反馈给对应接口的限速器"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, api_name, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST):
+        """返回接口的限速器并登记为该接口当前的限速器（acquire 使用）
+
+        速率上限为 rate 与 ENDPOINT_MAX_RATES 中该接口上限的较小值，自适应限速只在上限以下调整；
+        已存在自适应限速器时沿用之前降低后的速率。rate<=0（不限速）或关闭 ADAPTIVE_RATE_CONTROL 时
+        使用固定速率的 RateLimiter。
+        """
+        with self._lock:
+            if not ADAPTIVE_RATE_CONTROL or rate <= 0:
+                limiter = RateLimiter(rate, burst)
+                self._limiters[api_name] = limiter
+                return limiter
+            max_rate = min(float(rate), ENDPOINT_MAX_RATES.get(api_name, float(rate)))
+            limiter = self._limiters.get(api_name)
+            if not isinstance(limiter, AdaptiveRateLimiter):
+                limiter = AdaptiveRateLimiter(max_rate, burst)
+                self._limiters[api_name] = limiter
+            else:
+                with limiter._lock:
+                    limiter.max_rate = max_rate
+                    limiter.rate = min(limiter.rate, max_rate)
+                    limiter.min_rate = min(max_rate, ADAPTIVE_MIN_RATE)
+            return limiter
+
+    def acquire(self, api_name):
+        """按接口当前的速率等待一个令牌（用于重试、分页等不经过工作线程池的请求），接口没有限速器时不等待"""
+        limiter = self._limiters.get(api_name)
+        if limiter is not None:
+            limiter.acquire()
+
+    async def acquire_async(self, api_name):
+        """acquire 的异步版本"""
+        limiter = self._limiters.get(api_name)
+        if limiter is not None:
+            await limiter.acquire_async()
+
+    def report(self, api_name, ok):
+        """反馈一次请求结果：ok 为 True 表示成功，False 表示限流信号，None 表示与速率无关"""
+        limiter = self._limiters.get(api_name)
+        if not isinstance(limiter, AdaptiveRateLimiter) or ok is None:
+            return
+        if ok:
+            limiter.on_success()
+        elif limiter.on_throttle():
+            print(f"  [限速] {api_name}收到限流信号，速率降至 {limiter.rate:.2f} 次/秒")
+
+    def rates(self):
+        """各接口当前的速率，{api_name: 每秒请求数}"""
+        return {api_name: limiter.rate for api_name, limiter in self._limiters.items()}
+
+
+# 全局限速控制器，所有阶段和传输方式共用
+RATE_CONTROLLER = RateController()
+
+
+def iter_fetch_results(items, fetch_one, workers=DEFAULT_WORKERS, limiter=None):
+    """并发执行 fetch_one(item)，并按 items 的原始顺序逐个产出 (item, result)
+
+    使用有界线程池，同时在途的任务数不超过 workers * 2，避免一次性提交全部任务。
+    fetch_one 抛出的异常会被捕获并当作 None 结果返回。
+
+    Args:
+        items: 待处理的元素列表（如 liveObjectId 列表）
+        fetch_one: 处理单个元素的函数
+        workers: 并发线程数，<=1 时顺序执行
+        limiter: RateLimiter 实例，每次调用 fetch_one 前先获取令牌；为 None 时不限速
+
+    Yields:
+        tuple: (item, result)
+    """
+    def run(item):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fetch_one(item)
+        except Exception as e:
+            print(f"  [Error] 处理 {item} 失败: {e}")
+            return None
+
+    if workers <= 1:
+        for item in items:
+            yield item, run(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(run, item)))
+            if len(pending) >= workers * 2:
+                head_item, future = pending.popleft()
+                yield head_item, future.result()
+        while pending:
+            head_item, future = pending.popleft()
+            yield head_item, future.result()
+
+
+def download_detail_data(output_file='xlsx2.xlsx', user_data_dir='./browser_data',
+                         workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST,
+                         transport='thread', session=None, pool_size=DEFAULT_POOL_SIZE,
+                         resume=True, journal_dir=JOURNAL_DIR, output_format=None, render_excel=False,
+                         list_file='xlsx1.xlsx', live_ids=None, cache_file=RESPONSE_CACHE_FILE,
+                         plan=True):
     """下载预约数据（接口2）"""
     return download_api_data(
         output_file=output_file,
@@ -293,81 +2489,136 @@ def download_detail_data(output_file='xlsx2.xlsx', user_data_dir='./browser_data
         flatten_func=flatten_live_single_data,
         sheet_name='预约数据',
         id_column_name='liveObjectId',
-        user_data_dir=user_data_dir
+        schema=RECORD_SCHEMAS['detail'],
+        user_data_dir=user_data_dir,
+        workers=workers,
+        rate_limit=rate_limit,
+        burst=burst,
+        transport=transport,
+        session=session,
+        pool_size=pool_size,
+        journal_name='detail',
+        resume=resume,
+        journal_dir=journal_dir,
+        output_format=output_format,
+        render_excel=render_excel,
+        list_file=list_file,
+        live_ids=live_ids,
+        cache_file=cache_file,
+        plan=plan
     )
 
-def download_product_data(output_file='xlsx3.xlsx', user_data_dir='./browser_data'):
+def download_product_data(output_file='xlsx3.xlsx', user_data_dir='./browser_data',
+                          workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST,
+                          transport='thread', session=None, pool_size=DEFAULT_POOL_SIZE,
+                          resume=True, journal_dir=JOURNAL_DIR, output_format=None, render_excel=False,
+                          list_file='xlsx1.xlsx', live_ids=None, cache_file=RESPONSE_CACHE_FILE,
+                          plan=True):
     """下载直播带货商品SPU数据（接口3）
 
     Args:
         output_file: 输出Excel文件路径，默认 'xlsx3.xlsx'
         user_data_dir: 浏览器数据目录，用于获取cookies和headers
+        workers: 并发线程数，1 表示顺序请求
+        rate_limit: 全局限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        transport: 'thread' 使用线程池，'async' 使用 asyncio + aiohttp 在同一事件循环中并发
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        resume: 是否从断点续传日志继续上次中断的下载
+        journal_dir: 断点续传日志目录
+        output_format: 输出格式（'xlsx'/'parquet'/'csv'），为 None 时按 output_file 的扩展名决定
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        list_file: 读取 liveObjectId 的列表数据文件（优先读取其索引文件）
+        live_ids: 直接使用的 liveObjectId 列表，为 None 时从 list_file 读取
+        cache_file: 响应缓存文件，为 None 时不使用缓存
+        plan: 是否按 STAGE_PREDICATES 和列表数据跳过没有成交的直播（写入占位记录，不请求接口）
 
     Returns:
         bool: 下载是否成功
     """
-    # 备份旧文件
-    backup_file(output_file)
+    output_file = with_output_format(output_file, output_format)
+
+    # 断点续传：续传时输出文件是上次中断时的半成品，不覆盖之前的备份
+    journal = CheckpointJournal('product', journal_dir, resume)
+    if journal.completed:
+        print(f"[断点续传] 发现未完成的下载日志: {journal.path}")
+    else:
+        backup_file(output_file)
 
     print(f"开始下载直播商品SPU数据...")
     print(f"输出文件: {output_file}")
 
-    all_records = []
-
-    # 读取 liveObjectId 列表（来自 xlsx1.xlsx）
-    try:
-        # 尝试读取新工作表名称，如果不存在则回退到旧名称（向后兼容）
-        try:
-            df_list = pd.read_excel('xlsx1.xlsx', sheet_name='列表数据')
-        except ValueError:
-            # 如果新工作表名称不存在，尝试旧的工作表名称
-            df_list = pd.read_excel('xlsx1.xlsx', sheet_name='直播数据')
-        live_ids = [str(live_id) for live_id in df_list['liveObjectId'].tolist()]
-    except Exception as e:
-        print(f"读取 xlsx1.xlsx 失败: {e}")
-        return False
-
-    # 尝试从浏览器会话获取 headers/cookies（只做一次）
-    browser_headers, browser_cookies = get_browser_session_cookies_and_headers(
-        user_data_dir=user_data_dir,
-        url=URL_DETAIL  # 使用接口2的URL来获取cookies
-    )
-    if browser_headers or browser_cookies:
-        print("已从浏览器会话获取 cookies/headers，将用于接口请求")
+    # 读取 liveObjectId 列表（优先使用调用方直接传入的列表，其次是列表文件的索引）
+    if live_ids is None:
+        live_ids = load_live_ids(list_file)
+        if live_ids is None:
+            return False
+    live_ids = [str(live_id) for live_id in live_ids]
+
+    # 整个下载过程复用同一个连接池会话，避免每次请求重新握手；
+    # 没有传入会话时才获取登录凭据（优先使用缓存，使用接口2的URL来获取cookies）
+    own_session = session is None
+    if own_session:
+        browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_DETAIL)
+        session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
     else:
-        browser_headers, browser_cookies = None, None
-
-    for idx, live_id in enumerate(live_ids, 1):
-        print(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的带货商品的数据...")
-        data = fetch_spu_data(live_id, headers=browser_headers, cookies=browser_cookies)
-        if data is None:
-            print(f"  警告: 未获取到数据，保存空记录")
-            rec = {'liveObjectId': str(live_id)}
-            all_records.append(rec)
-        else:
-            rec_list = flatten_spu_data(live_id, data)
-            all_records.extend(rec_list)
+        browser_headers, browser_cookies = dict(session.headers), session.cookies.get_dict()
+
+    # 新记录流式追加到中间文件，结束时一次性生成 xlsx
+    sink = RecordSink(output_file, sheet_name='产品数据', id_column_name='liveObjectId', render_excel=render_excel,
+                      schema=RECORD_SCHEMAS['product'], flatten_func=flatten_spu_data)
+    cache = open_response_cache(cache_file)
+    skip_ids = plan_skipped_ids(['product'], live_ids, list_file).get('product') if plan else None
+
+    # 多个工作线程共享同一个限速器，结果按 live_ids 原始顺序返回
+    results = iter_live_results(
+        live_ids, fetch_spu_data, headers=browser_headers, cookies=browser_cookies,
+        workers=workers, rate_limit=rate_limit, burst=burst, transport=transport, session=session,
+        journal=journal, cache=cache, start_times=load_live_start_times(list_file) if cache else None,
+        skip_ids=skip_ids
+    )
 
-        # 每次请求间隔 1 秒，避免过快
-        time.sleep(1)
+    failed_ids = []
+    progress = ProgressView('带货商品的数据', len(live_ids))
+    for idx, (live_id, data) in enumerate(METRICS.timed_iter('fetch', results), 1):
+        log_detail(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的带货商品的数据...")
+        if data is SKIPPED_RESPONSE:
+            sink.append_response(live_id, None)
+        elif data is None:
+            log_detail(f"  警告: 未获取到数据，保存空记录")
+            sink.append_response(live_id, None)
+            failed_ids.append(live_id)
+        else:
+            # 原始响应按批展平后写入（见 flatten_batch）
+            sink.append_response(live_id, data)
+        progress.update(failed=data is None)
 
         # 每 50 条实时保存一次，防止意外中断丢失数据
         if idx % 50 == 0:
-            save_records_to_excel_file(output_file, all_records, sheet_name='产品数据', id_column_name='liveObjectId', silent=True)
+            sink.flush()
+    progress.close()
+
+    if own_session:
+        session.close()
+    if cache is not None:
+        cache.close()
 
     # 最终保存
-    success = save_records_to_excel_file(output_file, all_records, sheet_name='产品数据', id_column_name='liveObjectId', silent=False)
+    success = sink.close() and not login_expired()
     if success:
-        print(f"直播商品SPU数据已保存到 {output_file}，共 {len(all_records)} 条记录")
+        journal.clear()
+        record_dead_letters(journal_dir, 'product', output_file, failed_ids, live_ids)
+        print(f"直播商品SPU数据已保存到 {output_file}，共 {sink.count} 条记录")
         return True
     else:
         print("保存直播商品SPU数据失败")
         return False
 
 
-def fetch_live_single_data(live_object_id, headers=None, cookies=None, timeout=10):
-    """调用接口2，获取指定 liveObjectId 的预约数据汇总，返回 data 字典或 None"""
-    payload = {
+def build_live_single_payload(live_object_id):
+    """构造接口2（预约数据）的请求体"""
+    return {
         "liveObjectId": str(live_object_id),
         "timestamp": str(int(time.time() * 1000)),
         "_log_finder_uin": None,
@@ -378,26 +2629,10 @@ def fetch_live_single_data(live_object_id, headers=None, cookies=None, timeout=1
         "reqScene": 7
     }
 
-    request_headers = headers if headers is not None and headers else HEADERS
-    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
-
-    try:
-        resp = requests.post(URL_DETAIL, json=payload, headers=request_headers, cookies=request_cookies, timeout=timeout)
-        resp.raise_for_status()
-        j = resp.json()
-        if j.get('errCode') == 0:
-            return j.get('data', {})
-        else:
-            print(f"接口2返回错误: {j.get('errMsg')}")
-            return None
-    except Exception as e:
-        print(f"请求接口2失败: {e}")
-        return None
-
 
-def fetch_ec_summary(live_object_id, headers=None, cookies=None, timeout=10):
-    """调用接口4，获取指定 liveObjectId 的带货数据的整体转换数据，返回 data 字典或 None"""
-    payload = {
+def build_ec_summary_payload(live_object_id):
+    """构造接口4（带货整体转换数据）的请求体"""
+    return {
         "liveObjectId": str(live_object_id),
         "timestamp": str(int(time.time() * 1000)),
         "_log_finder_uin": None,
@@ -408,29 +2643,13 @@ def fetch_ec_summary(live_object_id, headers=None, cookies=None, timeout=10):
         "reqScene": 7
     }
 
-    request_headers = headers if headers is not None and headers else HEADERS
-    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
-
-    try:
-        resp = requests.post(URL_EC_SUMMARY, json=payload, headers=request_headers, cookies=request_cookies, timeout=timeout)
-        resp.raise_for_status()
-        j = resp.json()
-        if j.get('errCode') == 0:
-            return j.get('data', {})
-        else:
-            print(f"接口4返回错误: {j.get('errMsg')}")
-            return None
-    except Exception as e:
-        print(f"请求接口4失败: {e}")
-        return None
-
 
-def fetch_spu_data(live_object_id, headers=None, cookies=None, timeout=10):
-    """调用接口3，获取指定 liveObjectId 的带货商品的数据，返回 data 字典或 None"""
-    payload = {
+def build_spu_payload(live_object_id, offset=0, limit=SPU_PAGE_SIZE):
+    """构造接口3（带货商品数据）的请求体，offset/limit 为商品分页参数"""
+    return {
         "liveObjectId": str(live_object_id),
-        "offset": 0,
-        "limit": 15,
+        "offset": offset,
+        "limit": limit,
         "spuType": 0,
         "spuThreshold": {
             "lowStock": "10",
@@ -455,26 +2674,10 @@ def fetch_spu_data(live_object_id, headers=None, cookies=None, timeout=10):
         "reqScene": 7
     }
 
-    request_headers = headers if headers is not None and headers else HEADERS
-    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
-
-    try:
-        resp = requests.post(URL_PRODUCT, json=payload, headers=request_headers, cookies=request_cookies, timeout=timeout)
-        resp.raise_for_status()
-        j = resp.json()
-        if j.get('errCode') == 0:
-            return j.get('data', {})
-        else:
-            print(f"接口3返回错误: {j.get('errMsg')}")
-            return None
-    except Exception as e:
-        print(f"请求接口3失败: {e}")
-        return None
-
 
-def fetch_live_diagnostic_data(live_object_id, headers=None, cookies=None, timeout=10):
-    """调用接口5，获取指定 liveObjectId 的数据增强诊断数据，返回 data 字典或 None"""
-    payload = {
+def build_diagnostic_payload(live_object_id):
+    """构造接口5（数据增强诊断数据）的请求体"""
+    return {
         "objectId": str(live_object_id),
         "timestamp": str(int(time.time() * 1000)),
         "_log_finder_uin": None,
@@ -485,40 +2688,419 @@ def fetch_live_diagnostic_data(live_object_id, headers=None, cookies=None, timeo
         "reqScene": 7
     }
 
-    request_headers = headers if headers is not None and headers else HEADERS
-    request_cookies = cookies if cookies is not None and cookies else COOKIES_DICT
 
-    print(f"  [接口5] 请求参数: objectId={live_object_id}")
+def _log_diagnostic_result(data):
+    """打印接口5返回的 newWatchPvPromotion 值"""
+    if data and 'newWatchPvPromotion' in data:
+        promotion_value = data['newWatchPvPromotion'].get('value', 'N/A')
+        log_detail(f"  [接口5] 获取到newWatchPvPromotion: {promotion_value}")
+
+
+def fetch_live_single_data(live_object_id, headers=None, cookies=None, timeout=10, session=None):
+    """调用接口2，获取指定 liveObjectId 的预约数据汇总，返回 data 字典或 None"""
+    payload = build_live_single_payload(live_object_id)
+    return _post_json(URL_DETAIL, payload, '接口2', headers=headers, cookies=cookies, timeout=timeout, session=session)
+
+
+def fetch_ec_summary(live_object_id, headers=None, cookies=None, timeout=10, session=None):
+    """调用接口4，获取指定 liveObjectId 的带货数据的整体转换数据，返回 data 字典或 None"""
+    payload = build_ec_summary_payload(live_object_id)
+    return _post_json(URL_EC_SUMMARY, payload, '接口4', headers=headers, cookies=cookies, timeout=timeout, session=session)
+
+
+def spu_total_count(spu_data):
+    """从接口3的 data 中取出商品总数，响应中没有总数字段时返回 None"""
+    for field in ('totalCount', 'total'):
+        try:
+            return int(spu_data[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def spu_page_offsets(first_page, page_size=SPU_PAGE_SIZE):
+    """根据第1页响应中的商品总数计算其余各页的 offset；没有总数时返回 None"""
+    total = spu_total_count(first_page)
+    if total is None:
+        return None
+    return list(range(page_size, total, page_size))
+
+
+def merge_spu_pages(pages):
+    """把接口3各页的 data 按页顺序合并为一个 data 字典（spuDataList 依次拼接）"""
+    merged = dict(pages[0])
+    merged['spuDataList'] = [item for page in pages for item in (page.get('spuDataList') or [])]
+    return merged
+
+
+def fetch_spu_data(live_object_id, headers=None, cookies=None, timeout=10, session=None):
+    """调用接口3，分页获取指定 liveObjectId 的全部带货商品数据，返回合并后的 data 字典或 None
+
+    先请求第1页，再根据响应中的商品总数依次请求其余各页；响应没有总数字段时逐页请求，
+    直到某一页不满 SPU_PAGE_SIZE 条。任一页请求失败时返回 None，不返回缺页的数据。
+    第1页的令牌由调用方（工作线程池）获取，其余各页各自从接口3的限速器获取令牌，总速率不超过限速。
+    各页在调用方的工作线程中依次请求，不另开线程池：同时在途的请求数不超过工作线程数，
+    不会超出会话的连接池，连接可以保持复用。
+    """
+    def fetch_page(offset):
+        if offset:
+            RATE_CONTROLLER.acquire('接口3')
+        payload = build_spu_payload(live_object_id, offset=offset)
+        return _post_json(URL_PRODUCT, payload, '接口3', headers=headers, cookies=cookies, timeout=timeout,
+                          session=session)
+
+    first_page = fetch_page(0)
+    if first_page is None:
+        return None
+
+    pages = [first_page]
+    offsets = spu_page_offsets(first_page)
+    if offsets is None:
+        while len(pages[-1].get('spuDataList') or []) >= SPU_PAGE_SIZE:
+            page = fetch_page(len(pages) * SPU_PAGE_SIZE)
+            if page is None:
+                return None
+            pages.append(page)
+    else:
+        for offset in offsets:
+            page = fetch_page(offset)
+            if page is None:
+                log_detail(f"  [接口3] {live_object_id} 第 {offset // SPU_PAGE_SIZE + 1} 页商品获取失败")
+                return None
+            pages.append(page)
+
+    return merge_spu_pages(pages)
+
+
+def fetch_live_diagnostic_data(live_object_id, headers=None, cookies=None, timeout=10, session=None):
+    """调用接口5，获取指定 liveObjectId 的数据增强诊断数据，返回 data 字典或 None"""
+    log_detail(f"  [接口5] 请求参数: objectId={live_object_id}")
+    payload = build_diagnostic_payload(live_object_id)
+    data = _post_json(URL_DIAGNOSTIC, payload, '接口5', headers=headers, cookies=cookies, timeout=timeout, session=session)
+    _log_diagnostic_result(data)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# 异步传输层：与上面的同步 fetch_* 共用请求体构造和响应解析，
+# 所有请求在同一个事件循环里发出，由信号量限制并发数
+# ---------------------------------------------------------------------------
+
+def create_async_session(headers=None, cookies=None, concurrency=DEFAULT_WORKERS):
+    """创建 aiohttp 会话（需在事件循环内调用），连接池大小与并发上限一致"""
+    import aiohttp
+
+    request_headers, request_cookies = _resolve_credentials(headers, cookies)
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    return aiohttp.ClientSession(headers=request_headers, cookies=request_cookies, connector=connector)
+
+
+async def _async_send_post_json(session, url, payload, api_name, timeout=10):
+    """异步发送一次 POST 请求并解析响应，返回 (HTTP 状态码, 响应 JSON, data)，含义同 _send_post_json"""
+    import aiohttp
+
+    status = None
+    j = None
+    data = None
+    started = time.perf_counter()
+    try:
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            status = resp.status
+            resp.raise_for_status()
+            j = await resp.json(content_type=None)
+        data = _parse_api_response(j, api_name)
+    except Exception as e:
+        log_detail(f"请求{api_name}失败: {e}")
+    METRICS.observe_request(api_name, time.perf_counter() - started, status, _response_err_code(j), data is not None)
+    return status, j, data
+
+
+async def _async_post_json(session, url, payload, api_name, timeout=10, max_retries=MAX_RETRIES):
+    """异步发送 POST 请求并解析响应，返回 data 字典或 None；限速反馈、重试和登录失效刷新规则同 _post_json"""
+    attempt = 0
+    auth_retried = False
+    while True:
+        if CREDENTIAL_REFRESHER.failed:
+            return None
+        await CREDENTIAL_REFRESHER.wait_async()
+        generation = CREDENTIAL_REFRESHER.generation
+        CREDENTIAL_REFRESHER.sync_session(session)
+
+        RETRY_BUDGET.record_request()
+        status, j, data = await _async_send_post_json(session, url, payload, api_name, timeout=timeout)
+        if is_auth_error(status, j):
+            # 刷新会启动浏览器，放到线程中执行，避免阻塞事件循环
+            if not auth_retried and await asyncio.to_thread(CREDENTIAL_REFRESHER.refresh, generation):
+                auth_retried = True
+                continue
+            return None
+
+        feedback = _rate_feedback(status, j, data)
+        RATE_CONTROLLER.report(api_name, feedback)
+        if not _should_retry(api_name, feedback, attempt, max_retries):
+            RESPONSE_ARCHIVE.record(api_name, url, payload, data)
+            return data
+        attempt += 1
+        delay = retry_delay(attempt)
+        METRICS.record_retry(api_name)
+        log_detail(f"  [重试] {api_name}第 {attempt} 次重试，{delay:.1f} 秒后发送")
+        await asyncio.sleep(delay)
+        await RATE_CONTROLLER.acquire_async(api_name)
+
+
+async def async_fetch_live_data(session, page_size=10, current_page=1, start_time=None, end_time=None, timeout=10):
+    """异步获取直播列表数据（接口1），返回 data 字典或 None"""
+    payload = build_live_list_payload(page_size, current_page, start_time, end_time)
+    return await _async_post_json(session, URL_LIST, payload, '接口1', timeout=timeout)
+
+
+async def async_fetch_live_single_data(session, live_object_id, timeout=10):
+    """异步调用接口2，返回 data 字典或 None"""
+    payload = build_live_single_payload(live_object_id)
+    return await _async_post_json(session, URL_DETAIL, payload, '接口2', timeout=timeout)
+
+
+async def async_fetch_spu_data(session, live_object_id, timeout=10):
+    """异步调用接口3，分页获取全部带货商品数据（第1页之后的各页并发请求，各自从接口3的限速器获取令牌），
+    返回合并后的 data 字典或 None"""
+    async def fetch_page(offset):
+        if offset:
+            await RATE_CONTROLLER.acquire_async('接口3')
+        payload = build_spu_payload(live_object_id, offset=offset)
+        return await _async_post_json(session, URL_PRODUCT, payload, '接口3', timeout=timeout)
+
+    first_page = await fetch_page(0)
+    if first_page is None:
+        return None
+
+    pages = [first_page]
+    offsets = spu_page_offsets(first_page)
+    if offsets is None:
+        while len(pages[-1].get('spuDataList') or []) >= SPU_PAGE_SIZE:
+            page = await fetch_page(len(pages) * SPU_PAGE_SIZE)
+            if page is None:
+                return None
+            pages.append(page)
+    else:
+        rest = await asyncio.gather(*(fetch_page(offset) for offset in offsets))
+        if any(page is None for page in rest):
+            log_detail(f"  [接口3] {live_object_id} 部分商品页获取失败")
+            return None
+        pages.extend(rest)
+
+    return merge_spu_pages(pages)
+
+
+async def async_fetch_ec_summary(session, live_object_id, timeout=10):
+    """异步调用接口4，返回 data 字典或 None"""
+    payload = build_ec_summary_payload(live_object_id)
+    return await _async_post_json(session, URL_EC_SUMMARY, payload, '接口4', timeout=timeout)
+
+
+async def async_fetch_live_diagnostic_data(session, live_object_id, timeout=10):
+    """异步调用接口5，返回 data 字典或 None"""
+    payload = build_diagnostic_payload(live_object_id)
+    data = await _async_post_json(session, URL_DIAGNOSTIC, payload, '接口5', timeout=timeout)
+    _log_diagnostic_result(data)
+    return data
+
+
+# 同步 fetch_* 与对应异步实现的映射，供下载函数在 transport='async' 时查找
+# 同步获取函数对应的接口名称，用于按接口获取限速器
+FETCH_API_NAMES = {
+    fetch_live_data: '接口1',
+    fetch_live_single_data: '接口2',
+    fetch_spu_data: '接口3',
+    fetch_ec_summary: '接口4',
+    fetch_live_diagnostic_data: '接口5',
+}
+
+ASYNC_FETCH_FUNCS = {
+    fetch_live_data: async_fetch_live_data,
+    fetch_live_single_data: async_fetch_live_single_data,
+    fetch_spu_data: async_fetch_spu_data,
+    fetch_ec_summary: async_fetch_ec_summary,
+    fetch_live_diagnostic_data: async_fetch_live_diagnostic_data,
+}
+
+
+def iter_async_fetch_results(items, async_fetch_one, headers=None, cookies=None, concurrency=DEFAULT_WORKERS,
+                             limiter=None):
+    """在后台线程的事件循环里并发执行 async_fetch_one(session, item)，按 items 原始顺序逐个产出 (item, result)
+
+    与 iter_fetch_results 一样，同时在途的任务不超过 concurrency * 2 个，已完成、尚未被取走的结果也不超过
+    这个数量，内存占用与 items 的总数无关。async_fetch_one 抛出的异常会被捕获并当作 None 结果返回。
+
+    Args:
+        items: 待处理的元素（如 liveObjectId 列表），可以是生成器
+        async_fetch_one: 异步获取函数，签名为 (session, item)
+        headers: 请求头
+        cookies: cookies字典
+        concurrency: 同时在途的最大请求数
+        limiter: RateLimiter 实例，为 None 时不限速
+
+    Yields:
+        tuple: (item, result)
+    """
+    window = max(1, concurrency) * 2
+    results = queue.Queue(maxsize=window)
+    finished = object()
+    stopped = threading.Event()
+
+    async def produce():
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        loop = asyncio.get_running_loop()
+
+        async with create_async_session(headers, cookies, concurrency) as session:
+            async def run(item):
+                async with semaphore:
+                    if limiter is not None:
+                        await limiter.acquire_async()
+                    try:
+                        return await async_fetch_one(session, item)
+                    except Exception as e:
+                        print(f"  [Error] 处理 {item} 失败: {e}")
+                        return None
+
+            async def hand_over(item, task):
+                # 队列满时在线程池中等待，不阻塞事件循环里其余在途的请求
+                await loop.run_in_executor(None, results.put, (item, await task))
+
+            pending = deque()
+            for item in items:
+                if stopped.is_set():
+                    break
+                pending.append((item, asyncio.ensure_future(run(item))))
+                if len(pending) >= window:
+                    await hand_over(*pending.popleft())
+            while pending:
+                await hand_over(*pending.popleft())
+
+    def worker():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(finished)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            entry = results.get()
+            if entry is finished:
+                break
+            if isinstance(entry, BaseException):
+                raise entry
+            yield entry
+    finally:
+        # 调用方提前停止迭代时，取走剩余结果让后台线程结束
+        stopped.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def iter_live_results(live_ids, fetch_func, headers=None, cookies=None, workers=DEFAULT_WORKERS,
+                      rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST, transport='thread', session=None,
+                      journal=None, cache=None, start_times=None, skip_ids=None):
+    """按 live_ids 原始顺序产出 (live_id, data)
+
+    Args:
+        live_ids: liveObjectId 列表
+        fetch_func: 同步获取函数（fetch_live_single_data 等）
+        headers: 请求头
+        cookies: cookies字典
+        workers: 并发数（线程数或异步在途请求数）
+        rate_limit: 全局限速，每秒最多请求数
+        burst: 令牌桶容量
+        transport: 'thread' 使用线程池 + 同步请求，'async' 使用 asyncio + aiohttp
+        session: create_http_session 创建的会话（仅 transport='thread' 时使用）
+        journal: CheckpointJournal 实例，已完成的 liveObjectId 直接取日志中的数据，新获取的数据追加到日志
+        cache: ResponseCache 实例，缓存命中的 liveObjectId 不再请求接口，新获取的数据写入缓存
+        start_times: {liveObjectId: 开播时间}，决定新写入的缓存是否永久有效
+        skip_ids: 不需要请求的 liveObjectId（见 plan_skipped_ids），其 data 为 SKIPPED_RESPONSE
+    """
+    api_name = FETCH_API_NAMES.get(fetch_func, fetch_func.__name__)
+    limiter = RATE_CONTROLLER.limiter(api_name, rate_limit, burst)
+    start_times = start_times or {}
+
+    completed = journal.completed if journal is not None else {}
+    if completed:
+        resumed = sum(1 for live_id in live_ids if live_id in completed)
+        print(f"断点续传: 已完成 {resumed} 条，剩余 {len(live_ids) - resumed} 条")
+    skip_ids = skip_ids or set()
+    if cache is not None:
+        completed = ChainMap(completed, cache.view(api_name, [live_id for live_id in live_ids
+                                                              if live_id not in completed and live_id not in skip_ids]))
+    if skip_ids:
+        completed = ChainMap(completed, dict.fromkeys(skip_ids, SKIPPED_RESPONSE))
+
+    pending_ids = live_ids
+    if completed:
+        pending_ids = [live_id for live_id in live_ids if live_id not in completed]
+
+    def record(live_id, data):
+        if data is not None:
+            if journal is not None:
+                journal.append(live_id, data)
+            if cache is not None:
+                cache.put(api_name, live_id, data, start_times.get(live_id))
+        return data
+
+    if transport == 'async':
+        async_func = ASYNC_FETCH_FUNCS[fetch_func]
+
+        async def fetch_one(async_session, live_id):
+            return record(live_id, await async_func(async_session, live_id))
+
+        results = iter_async_fetch_results(
+            pending_ids,
+            fetch_one,
+            headers=headers,
+            cookies=cookies,
+            concurrency=workers,
+            limiter=limiter
+        )
+    else:
+        results = iter_fetch_results(
+            pending_ids,
+            lambda live_id: record(live_id, fetch_func(live_id, headers=headers, cookies=cookies, session=session)),
+            workers=workers,
+            limiter=limiter
+        )
+
+    if pending_ids is live_ids:
+        return results
+    return _merge_journal_results(live_ids, completed, results)
 
-    try:
-        resp = requests.post(URL_DIAGNOSTIC, json=payload, headers=request_headers, cookies=request_cookies, timeout=timeout)
-        resp.raise_for_status()
-        j = resp.json()
-        print(f"  [接口5] 响应状态码: {resp.status_code}, errCode: {j.get('errCode')}")
-        if j.get('errCode') == 0:
-            data = j.get('data', {})
-            if data and 'newWatchPvPromotion' in data:
-                promotion_value = data['newWatchPvPromotion'].get('value', 'N/A')
-                print(f"  [接口5] 获取到newWatchPvPromotion: {promotion_value}")
-            return data
+
+def _merge_journal_results(live_ids, completed, fetched_results):
+    """按 live_ids 原始顺序合并已完成的数据（断点续传日志、响应缓存）和新获取的结果"""
+    fetched = iter(fetched_results)
+    for live_id in live_ids:
+        if live_id in completed:
+            yield live_id, completed[live_id]
         else:
-            print(f"接口5返回错误: {j.get('errMsg')}")
-            return None
-    except Exception as e:
-        print(f"请求接口5失败: {e}")
-        return None
+            yield next(fetched)
+
+
+def _clean_value(value):
+    """未声明字段的值：文本去掉首尾空白，其余保持原类型（写出时再转换）"""
+    return value.strip() if isinstance(value, str) else value
 
 
 def flatten_live_single_data(live_object_id, single_data):
-    """将接口2的 data 展平为一条记录（dict），并确保所有值为字符串"""
+    """将接口2的 data 展平为一条记录（dict），列见 RECORD_SCHEMAS['detail']"""
     if single_data is None:
         return None
 
-    flat = {'liveObjectId': str(live_object_id)}
-
-    # 处理预约通知用户数和比率
-    flat['reserveNoticeUserCount'] = str(single_data.get('reserveNoticeUserCount', ''))
-    flat['reserveNoticeJoinliveRatio'] = str(single_data.get('reserveNoticeJoinliveRatio', ''))
+    # 预约通知用户数和比率
+    flat = RECORD_SCHEMAS['detail'].extract(single_data)
+    flat['liveObjectId'] = str(live_object_id)
 
     # 处理场景数组，将每个场景的数据作为单独字段
     # 遍历data中的所有项，找出数组类型的项（即场景数据）
@@ -527,34 +3109,26 @@ def flatten_live_single_data(live_object_id, single_data):
             # 这是场景数据数组
             for item in value:
                 if isinstance(item, dict) and 'scene' in item and 'reserveNoticeUserCount' in item:
-                    scene = item['scene']
-                    count = item['reserveNoticeUserCount']
-                    flat[f'scene_{scene}_reserveNoticeUserCount'] = str(count)
+                    flat[f"scene_{item['scene']}_reserveNoticeUserCount"] = item['reserveNoticeUserCount']
 
     return flat
 
 
 def flatten_ec_summary(live_object_id, ec_data):
-    """将接口4的 data 展平为一条记录（dict），并确保所有值为字符串"""
+    """将接口4的 data 展平为一条记录（dict），保持原始键名，列见 RECORD_SCHEMAS['ec']"""
     if ec_data is None:
         return None
 
-    flat = {'liveObjectId': str(live_object_id)}
-    # 将 data 中的键值全部转为字符串并加入
+    flat = RECORD_SCHEMAS['ec'].extract(ec_data)
+    flat['liveObjectId'] = str(live_object_id)
     for k, v in ec_data.items():
-        # 保持原始键名，值转换为字符串（None -> ''）
-        if v is None:
-            flat[k] = ''
-        elif isinstance(v, (int, float, bool)):
-            flat[k] = str(v)
-        else:
-            flat[k] = str(v).strip()
+        flat[k] = _clean_value(v)
 
     return flat
 
 
 def flatten_spu_data(live_object_id, spu_data):
-    """将接口3的 data 展平为多条记录（list），每条记录的第一列是liveObjectId"""
+    """将接口3的 data 展平为多条记录（list），每条记录的第一列是liveObjectId，列见 RECORD_SCHEMAS['product']"""
     if spu_data is None:
         return []
 
@@ -564,32 +3138,18 @@ def flatten_spu_data(live_object_id, spu_data):
         # 如果没有数据，至少返回一条包含liveObjectId的记录
         return [{'liveObjectId': str(live_object_id)}]
 
+    schema = RECORD_SCHEMAS['product']
     flattened_data = []
 
     for spu_item in spu_data_list:
-        flat_record = {'liveObjectId': str(live_object_id)}
-
-        # 处理baseData字段
-        base_data = spu_item.get('baseData', {})
-        if base_data:
-            flat_record['srcSpuId'] = str(base_data.get('srcSpuId', ''))
-            flat_record['spuId'] = str(base_data.get('spuId', ''))
-            flat_record['src'] = str(base_data.get('src', ''))
-            flat_record['spuName'] = str(base_data.get('spuName', ''))
-            flat_record['thumbUrl'] = str(base_data.get('thumbUrl', ''))
-            flat_record['price'] = str(base_data.get('price', ''))
-            flat_record['srcName'] = str(base_data.get('srcName', ''))
-            flat_record['baseStock'] = str(base_data.get('stock', ''))  # 重命名避免冲突
+        # baseData 中的字段按 schema 取出（stock 重命名为 baseStock）
+        flat_record = schema.extract(spu_item)
+        flat_record['liveObjectId'] = str(live_object_id)
 
         # 处理其他字段
         for key, value in spu_item.items():
-            if key not in ['baseData']:  # baseData已单独处理
-                if value is None:
-                    flat_record[key] = ''
-                elif isinstance(value, (int, float, bool)):
-                    flat_record[key] = str(value)
-                else:
-                    flat_record[key] = str(value).strip()
+            if key != 'baseData':  # baseData已单独处理
+                flat_record[key] = _clean_value(value)
 
         flattened_data.append(flat_record)
 
@@ -613,7 +3173,141 @@ def flatten_live_diagnostic_data(live_object_id, diagnostic_data):
     return flat
 
 
-def download_ec_summary(output_file='xlsx4.xlsx', user_data_dir='./browser_data'):
+def _merge_extra_columns(data, objs, exclude=()):
+    """把一批原始数据中未声明的字段（文本去掉首尾空白）按首次出现的顺序追加到 data（{列名: 值列表}）
+
+    字段与已有列同名时，含该字段的行取字段值，其余行保留原值（与逐条展平时后写入的值覆盖先写入的值一致）。
+    """
+    keys = dict.fromkeys(itertools.chain.from_iterable(objs))
+    for key in exclude:
+        keys.pop(key, None)
+    for key in keys:
+        values = [obj.get(key) for obj in objs]
+        values = [value.strip() if isinstance(value, str) else value for value in values]
+        old_values = data.get(key)
+        if old_values is not None:
+            values = [value if key in obj else old_value for obj, value, old_value in zip(objs, values, old_values)]
+        data[key] = values
+    return data
+
+
+def flatten_live_data_batch(live_objects):
+    """flatten_live_data 的批量版：一批直播列表数据按列展平为一个 ColumnBuffer"""
+    data = RECORD_SCHEMAS['list'].extract_columns(live_objects)
+    data['liveObjectId'] = [str(live_id) for live_id in data['liveObjectId']]
+    return ColumnBuffer.from_columns(data)
+
+
+def flatten_live_single_data_batch(live_ids, responses):
+    """flatten_live_single_data 的批量版：一批接口2的 data 按列展平为一个 ColumnBuffer，data 为 None 的直播只有 liveObjectId"""
+    objs = [response if response is not None else {} for response in responses]
+    data = RECORD_SCHEMAS['detail'].extract_columns(objs)
+    data['liveObjectId'] = [str(live_id) for live_id in live_ids]
+
+    # 场景数据：data 中数组类型的项，每个场景一列
+    for row, obj in enumerate(objs):
+        for value in obj.values():
+            if not isinstance(value, list):
+                continue
+            for item in value:
+                if isinstance(item, dict) and 'scene' in item and 'reserveNoticeUserCount' in item:
+                    column = f"scene_{item['scene']}_reserveNoticeUserCount"
+                    if column not in data:
+                        data[column] = [None] * len(objs)
+                    data[column][row] = item['reserveNoticeUserCount']
+
+    # 占位记录（data 为 None）只有 liveObjectId，不取声明列的默认值
+    for row, response in enumerate(responses):
+        if response is None:
+            for column, values in data.items():
+                if column != 'liveObjectId':
+                    values[row] = None
+    return ColumnBuffer.from_columns(data)
+
+
+def flatten_ec_summary_batch(live_ids, responses):
+    """flatten_ec_summary 的批量版：一批接口4的 data 按列展平为一个 ColumnBuffer，data 为 None 的直播只有 liveObjectId"""
+    objs = [response if response is not None else {} for response in responses]
+    data = RECORD_SCHEMAS['ec'].extract_columns(objs)
+    data['liveObjectId'] = [str(live_id) for live_id in live_ids]
+    return ColumnBuffer.from_columns(_merge_extra_columns(data, objs))
+
+
+def flatten_spu_data_batch(live_ids, responses):
+    """flatten_spu_data 的批量版：一批接口3的 data 按列展平为一个 ColumnBuffer（每个商品一行）
+
+    data 为 None 或没有商品的直播写一行只有 liveObjectId 的记录。
+    """
+    row_ids = []
+    items = []
+    placeholders = []
+    for live_id, response in zip(live_ids, responses):
+        spu_data_list = response.get('spuDataList', []) if response is not None else None
+        if spu_data_list:
+            row_ids.extend([str(live_id)] * len(spu_data_list))
+            items.extend(spu_data_list)
+        else:
+            placeholders.append(len(items))
+            row_ids.append(str(live_id))
+            items.append({})
+
+    data = RECORD_SCHEMAS['product'].extract_columns(items)
+    data['liveObjectId'] = row_ids
+    _merge_extra_columns(data, items, exclude=('baseData',))
+    # 占位记录只有 liveObjectId，不取声明列的默认值
+    for row in placeholders:
+        for column, values in data.items():
+            if column != 'liveObjectId':
+                values[row] = None
+    return ColumnBuffer.from_columns(data)
+
+
+# 有批量版本的展平函数，flatten_batch 使用批量版本按列展平
+BATCH_FLATTEN_FUNCS = {
+    flatten_live_single_data: flatten_live_single_data_batch,
+    flatten_ec_summary: flatten_ec_summary_batch,
+    flatten_spu_data: flatten_spu_data_batch,
+}
+
+
+def flatten_batch(flatten_func, live_ids, responses, id_column_name='liveObjectId'):
+    """批量展平一批直播的接口原始响应，返回 ColumnBuffer
+
+    flatten_func 在 BATCH_FLATTEN_FUNCS 中有批量版本时按列展平，否则逐条调用 flatten_func。
+    response 为 None（获取失败或计划跳过）的直播写一行只有ID的占位记录。
+
+    Args:
+        flatten_func: 逐条展平函数 flatten_func(live_id, data)，返回一条记录（dict）或多条记录（list）
+        live_ids: liveObjectId 列表
+        responses: 与 live_ids 一一对应的接口 data
+        id_column_name: ID列名
+
+    Returns:
+        ColumnBuffer: 展平后的记录，顺序与 live_ids 一致
+    """
+    batch_func = BATCH_FLATTEN_FUNCS.get(flatten_func)
+    if batch_func is not None and id_column_name == 'liveObjectId':
+        return batch_func(live_ids, responses)
+
+    buffer = ColumnBuffer([id_column_name])
+    for live_id, data in zip(live_ids, responses):
+        flattened = flatten_func(live_id, data) if data is not None else None
+        if flattened is None:
+            buffer.append({id_column_name: str(live_id)})
+        elif isinstance(flattened, list):
+            for record in flattened:
+                buffer.append(record)
+        else:
+            buffer.append(flattened)
+    return buffer
+
+
+def download_ec_summary(output_file='xlsx4.xlsx', user_data_dir='./browser_data',
+                        workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST,
+                        transport='thread', session=None, pool_size=DEFAULT_POOL_SIZE,
+                        resume=True, journal_dir=JOURNAL_DIR, output_format=None, render_excel=False,
+                        list_file='xlsx1.xlsx', live_ids=None, cache_file=RESPONSE_CACHE_FILE,
+                        plan=True):
     """下载带货数据的整体转换数据（接口4）"""
     return download_api_data(
         output_file=output_file,
@@ -622,33 +3316,87 @@ def download_ec_summary(output_file='xlsx4.xlsx', user_data_dir='./browser_data'
         flatten_func=flatten_ec_summary,
         sheet_name='EC汇总',
         id_column_name='liveObjectId',
-        user_data_dir=user_data_dir
+        schema=RECORD_SCHEMAS['ec'],
+        user_data_dir=user_data_dir,
+        workers=workers,
+        rate_limit=rate_limit,
+        burst=burst,
+        transport=transport,
+        session=session,
+        pool_size=pool_size,
+        journal_name='ec',
+        resume=resume,
+        journal_dir=journal_dir,
+        output_format=output_format,
+        render_excel=render_excel,
+        list_file=list_file,
+        live_ids=live_ids,
+        cache_file=cache_file,
+        plan=plan
     )
 
 
-def download_live_diagnostic_data(input_file='xlsx1.xlsx', user_data_dir='./browser_data'):
+def diagnostic_value(live_id, data):
+    """从接口5的 data 中取出 newWatchPvPromotion 值，获取失败或格式异常时返回空字符串"""
+    if data is None:
+        log_detail(f"  警告: 未获取到 {live_id} 的数据，使用空值")
+        return ''
+
+    flattened = flatten_live_diagnostic_data(live_id, data)
+    if flattened and 'newWatchPvPromotion' in flattened:
+        value = flattened['newWatchPvPromotion']
+        log_detail(f"  获取到newWatchPvPromotion: {value}")
+        return value
+
+    print(f"  警告: {live_id} 的数据格式异常，使用空值")
+    return ''
+
+
+@METRICS.phase('save')
+def write_diagnostic_column(input_file, df, values):
+    """将接口5的 newWatchPvPromotion 值写入列表数据 DataFrame，并覆盖保存回 input_file"""
+    df['newWatchPvPromotion'] = values
+    # DataFrame 的各列直接作为一个 ColumnBuffer 写出，不逐行转换为字典
+    buffer = ColumnBuffer.from_columns({str(column): df[column].tolist() for column in df.columns})
+    write_records(input_file, [buffer], buffer.columns, '列表数据', 'liveObjectId', schema=RECORD_SCHEMAS['list'])
+    touch_live_id_index(input_file)
+
+
+def download_live_diagnostic_data(input_file='xlsx1.xlsx', user_data_dir='./browser_data',
+                                  workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST,
+                                  transport='thread', session=None, pool_size=DEFAULT_POOL_SIZE,
+                                  resume=True, journal_dir=JOURNAL_DIR, cache_file=RESPONSE_CACHE_FILE):
     """下载数据增强诊断数据（接口5），并将数据插入到xlsx1.xlsx的newWatchPvPromotion列中
 
     Args:
         input_file: 输入的xlsx1.xlsx文件路径
         user_data_dir: 浏览器数据目录，用于获取cookies和headers
+        workers: 并发线程数，1 表示顺序请求
+        rate_limit: 全局限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        transport: 'thread' 使用线程池，'async' 使用 asyncio + aiohttp 在同一事件循环中并发
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        resume: 是否从断点续传日志继续上次中断的下载
+        journal_dir: 断点续传日志目录
+        cache_file: 响应缓存文件，为 None 时不使用缓存
 
     Returns:
         bool: 下载是否成功
     """
-    # 备份原文件
-    backup_file(input_file)
+    # 断点续传：续传时不覆盖之前的备份
+    journal = CheckpointJournal('diagnostic', journal_dir, resume)
+    if journal.completed:
+        print(f"[断点续传] 发现未完成的下载日志: {journal.path}")
+    else:
+        backup_file(input_file)
 
     print(f"开始下载数据增强诊断数据...")
     print(f"输入文件: {input_file}")
 
     try:
         # 读取现有的xlsx1.xlsx文件
-        try:
-            df = pd.read_excel(input_file, sheet_name='列表数据')
-        except ValueError:
-            # 如果新工作表名称不存在，尝试旧的工作表名称
-            df = pd.read_excel(input_file, sheet_name='直播数据')
+        df = read_live_list(input_file)
 
         # 确保liveObjectId列存在
         if 'liveObjectId' not in df.columns:
@@ -658,63 +3406,48 @@ def download_live_diagnostic_data(input_file='xlsx1.xlsx', user_data_dir='./brow
         live_ids = [str(live_id) for live_id in df['liveObjectId'].tolist()]
         print(f"找到 {len(live_ids)} 个直播ID需要处理")
 
-        # 尝试从浏览器会话获取 headers/cookies（只做一次）
-        browser_headers, browser_cookies = get_browser_session_cookies_and_headers(
-            user_data_dir=user_data_dir,
-            url=URL_DIAGNOSTIC
-        )
-        if browser_headers or browser_cookies:
-            print("已从浏览器会话获取 cookies/headers，将用于接口请求")
+        # 整个下载过程复用同一个连接池会话，避免每次请求重新握手；
+        # 传入了会话时直接使用其 headers/cookies，不再获取浏览器会话
+        own_session = session is None
+        if own_session:
+            browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_DIAGNOSTIC)
+            session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
         else:
-            browser_headers, browser_cookies = None, None
+            browser_headers, browser_cookies = dict(session.headers), session.cookies.get_dict()
 
         # 为每个liveObjectId获取诊断数据
         new_watch_pv_promotion_values = []
 
-        for idx, live_id in enumerate(live_ids, 1):
-            print(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的数据增强诊断数据...")
-            data = fetch_live_diagnostic_data(live_id, headers=browser_headers, cookies=browser_cookies)
+        # 多个工作线程共享同一个限速器，结果按 live_ids 原始顺序返回
+        cache = open_response_cache(cache_file)
+        results = iter_live_results(
+            live_ids, fetch_live_diagnostic_data, headers=browser_headers, cookies=browser_cookies,
+            workers=workers, rate_limit=rate_limit, burst=burst, transport=transport, session=session,
+            journal=journal, cache=cache, start_times=load_live_start_times(input_file) if cache else None
+        )
 
+        failed_ids = []
+        progress = ProgressView('数据增强诊断数据', len(live_ids))
+        for idx, (live_id, data) in enumerate(METRICS.timed_iter('fetch', results), 1):
+            log_detail(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的数据增强诊断数据...")
+            with METRICS.phase('flatten'):
+                new_watch_pv_promotion_values.append(diagnostic_value(live_id, data))
             if data is None:
-                print(f"  警告: 未获取到 {live_id} 的数据，使用空值")
-                new_watch_pv_promotion_values.append('')
-            else:
-                flattened = flatten_live_diagnostic_data(live_id, data)
-                if flattened and 'newWatchPvPromotion' in flattened:
-                    value = flattened['newWatchPvPromotion']
-                    print(f"  获取到newWatchPvPromotion: {value}")
-                    new_watch_pv_promotion_values.append(value)
-                else:
-                    print(f"  警告: {live_id} 的数据格式异常，使用空值")
-                    new_watch_pv_promotion_values.append('')
-
-            # 每次请求间隔 1 秒，避免过快
-            time.sleep(1)
-
-        # 将新数据添加到DataFrame
-        df['newWatchPvPromotion'] = new_watch_pv_promotion_values
-
-        # 保存回Excel文件
-        with pd.ExcelWriter(input_file, engine='openpyxl', mode='w') as writer:
-            df.to_excel(writer, index=False, sheet_name='列表数据')
-
-            # 获取工作表并设置liveObjectId列为文本格式
-            ws = writer.sheets['列表数据']
-            # 查找liveObjectId列的索引
-            header_row = 1
-            id_col = None
-            for col_idx, cell in enumerate(ws[header_row], 1):
-                if cell.value == 'liveObjectId':
-                    id_col = col_idx
-                    break
-
-            if id_col:
-                # 设置该列所有单元格的格式为文本
-                for row_idx in range(1, ws.max_row + 1):
-                    cell = ws.cell(row=row_idx, column=id_col)
-                    if cell.value is not None:
-                        cell.value = str(cell.value)
-                    cell.number_format = '@'  # '@' 表示文本格式
+                failed_ids.append(live_id)
+            progress.update(failed=data is None)
+        progress.close()
+
+        if own_session:
+            session.close()
+        if cache is not None:
+            cache.close()
+
+        # 将新数据添加到DataFrame并保存回Excel文件
+        write_diagnostic_column(input_file, df, new_watch_pv_promotion_values)
+        if login_expired():
+            return False
+        journal.clear()
+        record_dead_letters(journal_dir, 'diagnostic', input_file, failed_ids, live_ids)
 
         print(f"数据增强诊断数据已更新到 {input_file}，共处理 {len(live_ids)} 条记录")
         return True
@@ -723,13 +3456,593 @@ def download_live_diagnostic_data(input_file='xlsx1.xlsx', user_data_dir='./brow
         print(f"[Error] 下载数据增强诊断数据失败: {e}")
         return False
 
-def check_login_status(user_data_dir='./browser_data'):
-    """检查登录状态，询问用户是否已登录，如果未登录则使用 Playwright 打开登录页面"""
+
+# 接口2~5 都按 liveObjectId 逐条请求，合并下载时按此表把结果分发到各自的输出
+ENRICH_STAGES = {
+    'detail': {
+        'name': '预约数据',
+        'fetch': fetch_live_single_data,
+        'flatten': flatten_live_single_data,
+        'sheet_name': '预约数据',
+    },
+    'product': {
+        'name': '带货商品的数据',
+        'fetch': fetch_spu_data,
+        'flatten': flatten_spu_data,
+        'sheet_name': '产品数据',
+    },
+    'ec': {
+        'name': '带货数据的整体转换数据',
+        'fetch': fetch_ec_summary,
+        'flatten': flatten_ec_summary,
+        'sheet_name': 'EC汇总',
+    },
+    'diagnostic': {
+        'name': '数据增强诊断数据',
+        'fetch': fetch_live_diagnostic_data,
+        'flatten': flatten_live_diagnostic_data,
+        'sheet_name': '列表数据',
+    },
+}
+
+
+def iter_enrich_results(live_ids, stage_keys, headers=None, cookies=None, workers=DEFAULT_WORKERS,
+                        rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST, transport='thread', session=None,
+                        journals=None, cache=None, start_times=None, refresh_ids=None, skip=None):
+    """对每个 liveObjectId 并发请求 stage_keys 对应的接口，按 live_ids 原始顺序产出 (live_id, {stage_key: data})
+
+    每个接口各自使用一个限速器，互不占用配额，因此总耗时接近最慢的那个接口，而不是各接口耗时之和。
+    journals 为 {stage_key: CheckpointJournal}，日志中已完成的 (liveObjectId, 接口) 不再请求；
+    cache 为 ResponseCache，缓存命中的 (liveObjectId, 接口) 也不再请求，refresh_ids 中的 liveObjectId 不使用缓存。
+    skip 为 {stage_key: set(liveObjectId)}（见 plan_skipped_ids），这些请求不发出，data 为 SKIPPED_RESPONSE。
+    """
+    journals = journals or {}
+    start_times = start_times or {}
+    api_names = {key: FETCH_API_NAMES[ENRICH_STAGES[key]['fetch']] for key in stage_keys}
+    limiters = {key: RATE_CONTROLLER.limiter(api_names[key], rate_limit, burst) for key in stage_keys}
+
+    # 每个接口已完成的数据：先查断点续传日志，再查响应缓存
+    completed = {}
+    refresh_ids = set(refresh_ids or ())
+    skip = skip or {}
+    for key in stage_keys:
+        completed[key] = journals[key].completed if key in journals else {}
+        skip_ids = skip.get(key) or set()
+        if cache is not None:
+            lookup_ids = [live_id for live_id in live_ids
+                          if live_id not in completed[key] and live_id not in refresh_ids and live_id not in skip_ids]
+            completed[key] = ChainMap(completed[key], cache.view(api_names[key], lookup_ids))
+        if skip_ids:
+            completed[key] = ChainMap(completed[key], dict.fromkeys(skip_ids, SKIPPED_RESPONSE))
+
+    def is_done(live_id, key):
+        return live_id in completed[key]
+
+    # 任务在提交时才逐个生成，不预先构造 (liveObjectId, 接口) 的完整列表
+    tasks = ((live_id, key) for live_id in live_ids for key in stage_keys if not is_done(live_id, key))
+    skipped = sum(1 for live_id in live_ids for key in stage_keys if is_done(live_id, key))
+    if skipped:
+        print(f"断点续传/缓存/预判: 跳过 {skipped} 个请求，剩余 {len(live_ids) * len(stage_keys) - skipped} 个")
+
+    def record(task, data):
+        live_id, key = task
+        if data is not None:
+            if key in journals:
+                journals[key].append(live_id, data)
+            if cache is not None:
+                cache.put(api_names[key], live_id, data, start_times.get(live_id))
+        return data
+
+    if transport == 'async':
+        async def fetch_one(async_session, task):
+            live_id, key = task
+            await limiters[key].acquire_async()
+            async_func = ASYNC_FETCH_FUNCS[ENRICH_STAGES[key]['fetch']]
+            return record(task, await async_func(async_session, live_id))
+
+        results = iter_async_fetch_results(tasks, fetch_one, headers=headers, cookies=cookies, concurrency=workers)
+    else:
+        def fetch_one(task):
+            live_id, key = task
+            limiters[key].acquire()
+            return record(task, ENRICH_STAGES[key]['fetch'](live_id, headers=headers, cookies=cookies, session=session))
+
+        results = iter_fetch_results(tasks, fetch_one, workers=workers)
+
+    # 任务按 (liveObjectId, 接口) 顺序提交，逐个 liveObjectId 凑齐各接口结果后产出
+    fetched = iter(results)
+    for live_id in live_ids:
+        stage_results = {}
+        for key in stage_keys:
+            if is_done(live_id, key):
+                stage_results[key] = completed[key][live_id]
+            else:
+                _, stage_results[key] = next(fetched)
+        yield live_id, stage_results
+
+
+def download_enrich_data(
+    list_file='xlsx1.xlsx',
+    detail_file='xlsx2.xlsx',
+    product_file='xlsx3.xlsx',
+    ec_file='xlsx4.xlsx',
+    user_data_dir='./browser_data',
+    workers=len(ENRICH_STAGES),
+    rate_limit=DEFAULT_RATE_LIMIT,
+    burst=DEFAULT_BURST,
+    transport='thread',
+    session=None,
+    pool_size=DEFAULT_POOL_SIZE,
+    resume=True,
+    journal_dir=JOURNAL_DIR,
+    live_ids=None,
+    merge=False,
+    backup=True,
+    output_format=None,
+    render_excel=False,
+    stages=None,
+    patch=False,
+    cache_file=RESPONSE_CACHE_FILE,
+    refresh_ids=None,
+    plan=True,
+    journal_prefix=''
+):
+    """合并下载接口2~5的数据：只读取一次 liveObjectId 列表、只获取一次浏览器会话，
+    对每个 liveObjectId 并发请求四个接口，再把结果分发到各自的输出
+
+    Args:
+        list_file: 列表数据文件（接口1的输出），接口5的结果会写回该文件的newWatchPvPromotion列
+        detail_file: 预约数据（接口2）输出文件
+        product_file: 带货商品数据（接口3）输出文件
+        ec_file: 带货数据的整体转换数据（接口4）输出文件
+        user_data_dir: 浏览器数据目录，用于获取cookies和headers
+        workers: 并发数，默认每个接口一个
+        rate_limit: 每个接口各自的限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        transport: 'thread' 使用线程池，'async' 使用 asyncio + aiohttp 在同一事件循环中并发
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        resume: 是否从断点续传日志继续上次中断的下载
+        journal_dir: 断点续传日志目录
+        live_ids: 只处理这些 liveObjectId，为 None 时处理 list_file 中的全部直播
+        merge: 是否把结果合并进已有的输出文件（替换 live_ids 对应的行），否则覆盖写入
+        backup: 是否在下载前备份输出文件
+        output_format: 接口2~4输出格式（'xlsx'/'parquet'/'csv'），为 None 时按各文件的扩展名决定
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        stages: 只下载这些接口（ENRICH_STAGES 的键，如 ['product']），为 None 时下载全部四个接口
+        patch: 合并时新记录放在被替换行的原位置，而不是放在最前面
+        cache_file: 响应缓存文件，为 None 时不使用缓存
+        refresh_ids: 这些 liveObjectId 不使用缓存，总是重新请求（如增量同步中仍可能变化的直播）
+        plan: 是否按 STAGE_PREDICATES 和列表数据跳过不需要请求的接口（如成交金额为 0 的直播的接口3、4），写入占位记录
+        journal_prefix: 断点续传日志名称的前缀（日志为 {journal_dir}/{journal_prefix}{接口}.jsonl），
+                        用于与普通下载的日志互不干扰（如 retry_dead_letters）
+
+    Returns:
+        bool: 下载是否成功
+    """
+    stage_keys = [key for key in ENRICH_STAGES if stages is None or key in stages]
+    output_files = {
+        key: with_output_format(file_path, output_format)
+        for key, file_path in (('detail', detail_file), ('product', product_file), ('ec', ec_file))
+        if key in stage_keys
+    }
+    journals = {key: CheckpointJournal(journal_prefix + key, journal_dir, resume) for key in stage_keys}
+    write_diagnostic = 'diagnostic' in stage_keys
+
+    # 断点续传：续传时输出文件是上次中断时的半成品，不覆盖之前的备份
+    if any(journal.completed for journal in journals.values()):
+        print(f"[断点续传] 发现未完成的下载日志: {journal_dir}")
+    elif backup:
+        for file_path in list(output_files.values()) + ([list_file] if write_diagnostic else []):
+            backup_file(file_path)
+
+    print(f"开始合并下载{'、'.join(ENRICH_STAGES[key]['name'] for key in stage_keys)}...")
+    print(f"输入文件: {list_file}")
+
+    # 接口5的结果要写回列表文件，需要读取整个列表；否则只需要 liveObjectId（优先读取索引文件）
+    df = None
+    if write_diagnostic:
+        try:
+            df = read_live_list(list_file)
+        except Exception as e:
+            print(f"读取 {list_file} 失败: {e}")
+            return False
+
+        if 'liveObjectId' not in df.columns:
+            print(f"错误: {list_file}中没有找到liveObjectId列")
+            return False
+
+    if live_ids is None:
+        live_ids = load_live_ids(list_file) if df is None else df['liveObjectId'].tolist()
+        if live_ids is None:
+            return False
+    live_ids = [str(live_id) for live_id in live_ids]
+    print(f"找到 {len(live_ids)} 个直播ID需要处理")
+
+    # 浏览器会话和连接池会话都只创建一次，供四个接口共用
+    own_session = session is None
+    if own_session:
+        browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_DETAIL)
+        session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
+    else:
+        browser_headers, browser_cookies = dict(session.headers), session.cookies.get_dict()
+
+    # 新记录流式追加到各自的中间文件，结束时一次性生成 xlsx（合并模式下替换本次获取的直播对应的行）
+    sinks = {
+        key: RecordSink(output_file, ENRICH_STAGES[key]['sheet_name'], 'liveObjectId',
+                        merge_ids=live_ids if merge else None, render_excel=render_excel, patch=patch,
+                        schema=RECORD_SCHEMAS[key], flatten_func=ENRICH_STAGES[key]['flatten'])
+        for key, output_file in output_files.items()
+    }
+    diagnostic_values = {}
+    failed_ids = {key: [] for key in stage_keys}
+    cache = open_response_cache(cache_file)
+
+    results = iter_enrich_results(
+        live_ids, stage_keys, headers=browser_headers, cookies=browser_cookies,
+        workers=workers, rate_limit=rate_limit, burst=burst, transport=transport, session=session,
+        journals=journals, cache=cache, start_times=load_live_start_times(list_file) if cache else None,
+        refresh_ids=refresh_ids, skip=plan_skipped_ids(stage_keys, live_ids, list_file) if plan else None
+    )
+
+    progress = ProgressView('接口2~5', len(live_ids))
+    for idx, (live_id, stage_results) in enumerate(METRICS.timed_iter('fetch', results), 1):
+        log_detail(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的接口2~5数据...")
+
+        for key, data in stage_results.items():
+            if data is None:
+                failed_ids[key].append(live_id)
+            elif data is SKIPPED_RESPONSE:
+                if key == 'diagnostic':
+                    diagnostic_values[live_id] = ''
+                else:
+                    sinks[key].append_response(live_id, None)
+                continue
+            if key == 'diagnostic':
+                with METRICS.phase('flatten'):
+                    diagnostic_values[live_id] = diagnostic_value(live_id, data)
+                continue
+
+            if data is None:
+                log_detail(f"  警告: 未获取到{ENRICH_STAGES[key]['name']}，保存空记录")
+            # 原始响应按批展平后写入（见 flatten_batch）
+            sinks[key].append_response(live_id, data)
+        progress.update(failed=any(data is None for data in stage_results.values()))
+
+        # 每 50 条实时保存一次，防止意外中断丢失数据
+        if idx % 50 == 0:
+            for sink in sinks.values():
+                sink.flush()
+    progress.close()
+
+    if own_session:
+        session.close()
+    if cache is not None:
+        cache.close()
+
+    # 最终保存
+    success = True
+    for key, output_file in output_files.items():
+        stage = ENRICH_STAGES[key]
+        if sinks[key].close():
+            print(f"{stage['name']}已保存到 {output_file}，共 {sinks[key].count} 条记录")
+        else:
+            print(f"保存{stage['name']}失败")
+            success = False
+
+    try:
+        if write_diagnostic:
+            # 只更新本次获取的直播，其余行保留原有的 newWatchPvPromotion 值
+            if 'newWatchPvPromotion' in df.columns:
+                old_values = df['newWatchPvPromotion'].fillna('').astype(str).tolist()
+            else:
+                old_values = [''] * len(df)
+            column = [diagnostic_values.get(str(live_id), old_value)
+                      for live_id, old_value in zip(df['liveObjectId'].tolist(), old_values)]
+            write_diagnostic_column(list_file, df, column)
+            print(f"数据增强诊断数据已更新到 {list_file}，共处理 {len(live_ids)} 条记录")
+    except Exception as e:
+        print(f"[Error] 保存数据增强诊断数据失败: {e}")
+        success = False
+
+    success = success and not login_expired()
+    if success:
+        for journal in journals.values():
+            journal.clear()
+
+        # 仍然失败的 liveObjectId 记入失败记录，之前失败、本次成功的从失败记录中移除
+        dead_letters = DeadLetterQueue(journal_dir)
+        for key in stage_keys:
+            output_file = list_file if key == 'diagnostic' else output_files[key]
+            dead_letters.update(key, output_file, failed_ids[key], live_ids)
+        dead_letters.save()
+
+    return success
+
+
+def retry_dead_letters(
+    list_file='xlsx1.xlsx',
+    stages=None,
+    user_data_dir='./browser_data',
+    workers=len(ENRICH_STAGES),
+    rate_limit=DEFAULT_RATE_LIMIT,
+    burst=DEFAULT_BURST,
+    transport='thread',
+    session=None,
+    pool_size=DEFAULT_POOL_SIZE,
+    journal_dir=JOURNAL_DIR,
+    render_excel=False,
+    cache_file=RESPONSE_CACHE_FILE
+):
+    """只重新获取失败记录中的 liveObjectId，并把结果合并进原来的输出文件（替换对应的空记录）
+
+    失败记录由各下载函数在 {journal_dir}/dead_letter.json 中维护；本次获取成功的 liveObjectId 会从
+    失败记录中移除，仍然失败的保留，可以再次重试。重试使用单独的断点续传日志（名称加
+    RETRY_JOURNAL_PREFIX 前缀），不会读取或清除被中断的普通下载的日志。
+
+    Args:
+        list_file: 列表数据文件，接口5的失败记录写回其中；其他接口按失败记录中保存的输出文件合并
+        stages: 只重试这些接口（ENRICH_STAGES 的键），为 None 时重试全部有失败记录的接口
+        user_data_dir: 浏览器数据目录
+        workers: 并发数
+        rate_limit: 每个接口各自的限速，每秒最多请求数
+        burst: 令牌桶容量
+        transport: 'thread' 或 'async'
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        journal_dir: 断点续传日志目录（失败记录文件所在目录）
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        cache_file: 响应缓存文件，为 None 时不使用缓存（失败的请求不会写入缓存，重试时总会重新请求）
+
+    Returns:
+        bool: 重试过程是否成功（不代表所有失败记录都已获取到数据）
+    """
+    dead_letters = DeadLetterQueue(journal_dir)
+    stage_keys = [key for key in ENRICH_STAGES
+                  if (stages is None or key in stages) and dead_letters.ids(key)]
+    if not stage_keys:
+        print("没有需要重试的失败记录")
+        return True
+
+    own_session = session is None
+    if own_session:
+        browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_DETAIL)
+        session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
+
+    success = True
+    try:
+        for key in stage_keys:
+            live_ids = dead_letters.ids(key)
+            output_file = dead_letters.output_file(key)
+            print(f"重试{ENRICH_STAGES[key]['name']}: {len(live_ids)} 个 liveObjectId，合并到 {output_file}")
+            files = {'detail_file': 'xlsx2.xlsx', 'product_file': 'xlsx3.xlsx', 'ec_file': 'xlsx4.xlsx'}
+            if key == 'diagnostic':
+                stage_list_file = output_file or list_file
+            else:
+                stage_list_file = list_file
+                files[f'{key}_file'] = output_file
+            success = download_enrich_data(
+                list_file=stage_list_file,
+                user_data_dir=user_data_dir,
+                workers=workers,
+                rate_limit=rate_limit,
+                burst=burst,
+                transport=transport,
+                session=session,
+                journal_dir=journal_dir,
+                live_ids=live_ids,
+                merge=True,
+                render_excel=render_excel,
+                stages=[key],
+                patch=True,
+                cache_file=cache_file,
+                journal_prefix=RETRY_JOURNAL_PREFIX,
+                **files
+            ) and success
+    finally:
+        if own_session:
+            session.close()
+
+    remaining = DeadLetterQueue(journal_dir).entries
+    if remaining:
+        summary = '，'.join(f"{key} {len(entry['ids'])} 个" for key, entry in remaining.items())
+        print(f"仍有失败记录: {summary}")
+    else:
+        print("失败记录已全部重新获取")
+    return success
+
+
+def _merge_archived_spu_pages(pages):
+    """收齐全部分页时返回合并后的接口3 data，还缺页时返回 None
+
+    Args:
+        pages: {offset: data}，同一次获取的各页
+    """
+    if 0 not in pages:
+        return None
+    offsets = spu_page_offsets(pages[0])
+    if offsets is None:
+        # 没有总数时逐页请求，直到某一页不满 SPU_PAGE_SIZE 条
+        offsets = []
+        offset = 0
+        while len(pages[offset].get('spuDataList') or []) >= SPU_PAGE_SIZE:
+            offset += SPU_PAGE_SIZE
+            if offset not in pages:
+                return None
+            offsets.append(offset)
+    elif not all(offset in pages for offset in offsets):
+        return None
+    return merge_spu_pages([pages[0]] + [pages[offset] for offset in offsets])
+
+
+def load_archived_responses(archive_dir=ARCHIVE_DIR):
+    """按写入顺序逐条读取归档，生成 (stage_key, liveObjectId, data)
+
+    stage_key 为 'list' 时 data 为接口1中的一个直播对象，否则为 ENRICH_STAGES 的键。同一个直播可能出现多次，
+    以最后一次为准。接口3的各页按 offset 合并，收齐全部分页后才生成；缺页的直播不生成。
+    内存中只暂存尚未收齐的接口3分页。
+    """
+    api_stages = {FETCH_API_NAMES[stage['fetch']]: key for key, stage in ENRICH_STAGES.items()}
+    spu_pages = {}
+
+    for entry in iter_archive_records(archive_dir):
+        api_name, payload, data = entry.get('api'), entry.get('payload') or {}, entry.get('data')
+        if api_name == '接口1':
+            for live_object in data.get('liveObjectList') or []:
+                yield 'list', str(live_object.get('liveObjectId')), live_object
+            continue
+        key = api_stages.get(api_name)
+        live_id = payload.get('liveObjectId') or payload.get('objectId')
+        if key is None or live_id is None:
+            continue
+        live_id = str(live_id)
+        if key != 'product':
+            yield key, live_id, data
+            continue
+
+        # 每次重新获取都从第1页开始，第1页到达时丢弃之前未收齐的各页
+        offset = int(payload.get('offset') or 0)
+        if offset == 0:
+            spu_pages[live_id] = {}
+        pages = spu_pages.get(live_id)
+        if pages is None:
+            continue
+        pages[offset] = data
+        merged = _merge_archived_spu_pages(pages)
+        if merged is not None:
+            del spu_pages[live_id]
+            yield key, live_id, merged
+
+    for live_id in spu_pages:
+        print(f"  [Warning] 归档中 {live_id} 的带货商品数据缺页，跳过")
+
+
+def replay_archive(
+    archive_dir=ARCHIVE_DIR,
+    list_file='xlsx1.xlsx',
+    detail_file='xlsx2.xlsx',
+    product_file='xlsx3.xlsx',
+    ec_file='xlsx4.xlsx',
+    output_format=None,
+    render_excel=False,
+    stages=None
+):
+    """离线重放：不请求任何接口，只根据原始响应归档重新展平并生成各输出文件
+
+    修改 flatten_* 函数（如新增列）后运行即可更新全部输出，无需重新抓取。每个直播使用归档中最新的响应；
+    列表中有、但归档中没有某接口响应的直播，与下载时一样写入只有 liveObjectId 的空记录。
+    归档中的响应逐条转存到临时目录中的各接口日志，内存中只保留每个直播的开播时间和日志中的位置。
+
+    Args:
+        archive_dir: 原始响应归档目录
+        list_file: 列表数据（接口1）输出文件，接口5的 newWatchPvPromotion 写入其中
+        detail_file: 预约数据（接口2）输出文件
+        product_file: 带货商品数据（接口3）输出文件
+        ec_file: 带货数据的整体转换数据（接口4）输出文件
+        output_format: 输出格式（'xlsx'/'parquet'/'csv'），为 None 时按各文件的扩展名决定
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        stages: 只生成这些输出（'list' 及 ENRICH_STAGES 的键），为 None 时生成全部
+
+    Returns:
+        bool: 是否全部生成成功
+    """
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix='replay-') as spool_dir:
+        journals = {key: CheckpointJournal(key, spool_dir, resume=False) for key in ('list',) + tuple(ENRICH_STAGES)}
+        start_times = {}
+        for key, live_id, data in load_archived_responses(archive_dir):
+            if key == 'list':
+                start_times[live_id] = live_start_time(data) or 0
+            journals[key].append(live_id, data)
+        for journal in journals.values():
+            journal.close()
+
+        if not start_times:
+            print(f"归档 {archive_dir} 中没有列表数据，无法重放")
+            return False
+        responses = {key: CheckpointJournal(key, spool_dir).completed for key in journals}
+        try:
+            return _replay_responses(responses, start_times, list_file, detail_file, product_file, ec_file,
+                                     output_format, render_excel, stages, start)
+        finally:
+            for entries in responses.values():
+                if isinstance(entries, _JournalEntries):
+                    entries.close()
+
+
+def _replay_responses(responses, start_times, list_file, detail_file, product_file, ec_file, output_format,
+                      render_excel, stages, start):
+    """replay_archive 的写出部分：responses 为 {stage_key: {liveObjectId: data}}（'list' 为直播对象）"""
+    # 直播按开播时间从新到旧排列，与列表接口的返回顺序一致
+    live_ids = sorted(start_times, key=start_times.get, reverse=True)
+    print(f"从归档读取 {len(live_ids)} 个直播，"
+          + '，'.join(f"{ENRICH_STAGES[key]['name']} {len(responses[key])} 条" for key in ENRICH_STAGES))
+
+    def wanted(key):
+        return stages is None or key in stages
+
+    # 展平后的记录逐条写入各输出的中间文件，不在内存中累积
+    success = True
+    if wanted('list') or wanted('diagnostic'):
+        list_output = with_output_format(list_file, output_format)
+        sink = RecordSink(list_output, '列表数据', 'liveObjectId', render_excel=render_excel,
+                          schema=RECORD_SCHEMAS['list'])
+        index_entries = []
+        for start_index in range(0, len(live_ids), FLATTEN_BATCH_SIZE):
+            live_objects = [responses['list'][live_id]
+                            for live_id in live_ids[start_index:start_index + FLATTEN_BATCH_SIZE]]
+            index_entries.extend(build_live_index_entry(live_object) for live_object in live_objects)
+            buffer = flatten_live_data_batch(live_objects)
+            if wanted('diagnostic'):
+                column = []
+                for live_id in buffer.column('liveObjectId'):
+                    data = responses['diagnostic'][live_id] if live_id in responses['diagnostic'] else None
+                    flat = flatten_live_diagnostic_data(live_id, data) if data is not None else None
+                    column.append(flat['newWatchPvPromotion'] if flat else '')
+                buffer.add_column('newWatchPvPromotion')
+                buffer.column('newWatchPvPromotion')[:] = column
+            sink.append_columns(buffer)
+        saved = sink.close()
+        if saved and sink.count:
+            write_live_id_index(list_output, index_entries)
+        success = success and saved
+
+    for key, output_file in (('detail', detail_file), ('product', product_file), ('ec', ec_file)):
+        if not wanted(key):
+            continue
+        stage = ENRICH_STAGES[key]
+        sink = RecordSink(with_output_format(output_file, output_format), stage['sheet_name'], 'liveObjectId',
+                          render_excel=render_excel, schema=RECORD_SCHEMAS[key], flatten_func=stage['flatten'])
+        for live_id in live_ids:
+            sink.append_response(live_id, responses[key][live_id] if live_id in responses[key] else None)
+        success = sink.close() and success
+
+    print(f"重放完成，用时 {time.time() - start:.1f} 秒")
+    return success
+
+
+def check_login_status(user_data_dir='./browser_data', prompt=True, credentials_file=CREDENTIALS_FILE):
+    """检查登录状态：先用缓存或浏览器会话中的登录凭据探测接口，通过时直接返回 True；
+    未通过时询问用户是否已登录，如果未登录则使用 Playwright 打开登录页面
+
+    Args:
+        user_data_dir: 浏览器数据目录
+        prompt: 探测未通过时是否交互询问；为 False 时直接返回 False（用于定时任务等无人值守的运行）
+        credentials_file: 登录凭据缓存文件
+    """
     login_url = 'https://channels.weixin.qq.com/login.html'
     
     print("=" * 60)
     print("登录状态检查")
     print("=" * 60)
+
+    _, _, valid = get_credentials(user_data_dir, url=URL_LIST, credentials_file=credentials_file)
+    if valid:
+        print("登录凭据有效，开始执行程序...")
+        return True
+    if not prompt:
+        print(f"登录凭据无效或不存在，请先登录: {login_url}")
+        return False
     
     while True:
         user_input = input("您是否已登录微信视频号助手？(y/n): ").strip().lower()
@@ -743,6 +4056,7 @@ def check_login_status(user_data_dir='./browser_data'):
             print("\n正在使用 Playwright 打开登录页面...")
             
             # 使用 Playwright 打开登录页面
+            from playwright.sync_api import sync_playwright
             playwright = sync_playwright().start()
             try:
                 # 使用持久化上下文，这样登录状态会被保存
@@ -797,7 +4111,24 @@ def download_api_data(
     id_column_name,
     user_data_dir='./browser_data',
     is_batch_request=False,
-    batch_params=None
+    batch_params=None,
+    workers=DEFAULT_WORKERS,
+    rate_limit=DEFAULT_RATE_LIMIT,
+    burst=DEFAULT_BURST,
+    transport='thread',
+    session=None,
+    pool_size=DEFAULT_POOL_SIZE,
+    journal_name=None,
+    resume=True,
+    journal_dir=JOURNAL_DIR,
+    output_format=None,
+    render_excel=False,
+    list_file='xlsx1.xlsx',
+    live_ids=None,
+    return_ids=False,
+    cache_file=RESPONSE_CACHE_FILE,
+    plan=True,
+    schema=None
 ):
     """
     统一的API数据下载函数
@@ -812,26 +4143,54 @@ def download_api_data(
         user_data_dir: 浏览器数据目录
         is_batch_request: 是否为批量请求（如接口1的分页）
         batch_params: 批量请求的参数（仅当is_batch_request=True时使用）
+        workers: 并发线程数，1 表示顺序请求（批量请求时为第1页之后其余页的并发数）
+        rate_limit: 全局限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        transport: 'thread' 使用线程池，'async' 使用 asyncio + aiohttp 在同一事件循环中并发
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        journal_name: 单条请求时的断点续传日志名称，也是失败记录中的接口名，默认使用 fetch_func 的函数名
+        resume: 单条请求时是否从断点续传日志继续上次中断的下载
+        journal_dir: 断点续传日志目录
+        output_format: 输出格式（'xlsx'/'parquet'/'csv'），为 None 时按 output_file 的扩展名决定
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        list_file: 单条请求时读取 liveObjectId 的列表数据文件（优先读取其索引文件）
+        live_ids: 单条请求时直接使用的 liveObjectId 列表，为 None 时从 list_file 读取
+        return_ids: 批量请求时，成功后返回获取到的 liveObjectId 列表而不是 True（失败时返回 None），
+                    可直接传给后续接口的 live_ids 参数
+        cache_file: 单条请求时使用的响应缓存文件，为 None 时不使用缓存
+        plan: 单条请求时是否按 STAGE_PREDICATES 和列表数据跳过不需要请求的直播（写入占位记录）
+        schema: 输出的 RecordSchema（见 RECORD_SCHEMAS）
+
+    Returns:
+        bool: 下载是否成功；批量请求且 return_ids=True 时见 return_ids
     """
-    # 备份旧文件
-    backup_file(output_file)
+    output_file = with_output_format(output_file, output_format)
+
+    # 断点续传日志只用于单条请求（接口2、4），续传时不覆盖之前的备份
+    journal = None
+    stage_key = journal_name or fetch_func.__name__
+    if not is_batch_request:
+        journal = CheckpointJournal(stage_key, journal_dir, resume)
+
+    if journal is not None and journal.completed:
+        print(f"[断点续传] 发现未完成的下载日志: {journal.path}")
+    else:
+        backup_file(output_file)
 
     print(f"开始下载{data_type_name}...")
     print(f"输出文件: {output_file}")
 
-    all_records = []
-
     # 对于批量请求（接口1），不需要读取xlsx1.xlsx，直接进行批量获取
     if is_batch_request:
-        # 尝试从浏览器会话获取 headers/cookies（只做一次）
-        browser_headers, browser_cookies = get_browser_session_cookies_and_headers(
-            user_data_dir=user_data_dir,
-            url=URL_LIST
-        )
-        if browser_headers or browser_cookies:
-            print("已从浏览器会话获取 cookies/headers，将用于接口请求")
+        # 整个下载过程复用同一个连接池会话，避免每次请求重新握手；
+        # 传入了会话时直接使用其 headers/cookies，不再获取浏览器会话
+        own_session = session is None
+        if own_session:
+            browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_LIST)
+            session = create_http_session(browser_headers, browser_cookies, pool_size=pool_size)
         else:
-            browser_headers, browser_cookies = None, None
+            browser_headers, browser_cookies = dict(session.headers), session.cookies.get_dict()
 
         # 批量请求处理（接口1）
         start_date = batch_params.get('start_date') if batch_params else None
@@ -844,111 +4203,320 @@ def download_api_data(
         if start_date or end_date:
             print(f"自定义时间范围: {start_date or '默认'} 到 {end_date or '当前时间'}")
 
-        current_page = 1
-        page_size = batch_params.get('page_size', 50) if batch_params else 50
-        total_count = None
-
-        while True:
-            print(f"正在下载第 {current_page} 页...")
-
-            result = fetch_func(
-                page_size=page_size,
-                current_page=current_page,
-                start_time=start_time,
-                end_time=end_time,
-                headers=browser_headers,
-                cookies=browser_cookies
-            )
-
-            if result is None:
-                print(f"第 {current_page} 页下载失败，停止")
-                break
-
-            data_list = result.get('liveObjectList', [])
-
-            if not data_list:
-                print(f"第 {current_page} 页无数据，下载完成")
-                break
-
-            # 展平数据并添加到列表
-            for data_obj in data_list:
-                flat_obj = flatten_func(data_obj)
-                all_records.append(flat_obj)
+        page_size = batch_params.get('page_size', DEFAULT_PAGE_SIZE) if batch_params else DEFAULT_PAGE_SIZE
+        index_entries = []
+        # 记录逐页追加到中间文件，不在内存中累积
+        sink = RecordSink(output_file, sheet_name=sheet_name, id_column_name=id_column_name, render_excel=render_excel,
+                          schema=schema)
+        crawl_func = get_list_crawler(batch_params.get('list_mode', 'page') if batch_params else 'page')
+        _, complete = crawl_func(
+            start_time, end_time, page_size=page_size, headers=browser_headers, cookies=browser_cookies,
+            session=session, fetch_func=fetch_func, flatten_func=flatten_func, index=index_entries,
+            workers=workers, rate_limit=rate_limit, burst=burst, records=sink
+        )
 
-            # 获取总数
-            if total_count is None:
-                total_count = result.get('totalLiveCount', 0)
-                print(f"总共有 {total_count} 条数据")
+        if own_session:
+            session.close()
 
-            print(f"已下载 {len(all_records)} 条数据")
+        if not complete:
+            # 下载不完整时不生成输出文件，已有的列表文件和索引保持不变
+            sink.discard()
+            print(f"{data_type_name}下载不完整，保留已有的 {output_file}")
+            success = False
+        else:
+            success = sink.close()
+        if success and sink.count:
+            # 列表文件写完后再写索引，索引的修改时间不早于列表文件；没有写出记录时保留已有的索引
+            write_live_id_index(output_file, index_entries)
+        record_count = sink.count
+    else:
+        # 单条请求处理（接口2、4）- 需要先获取liveObjectId列表
+        if live_ids is None:
+            live_ids = load_live_ids(list_file)
+            if live_ids is None:
+                return False
+        live_ids = [str(live_id) for live_id in live_ids]
+
+        # 整个下载过程复用同一个连接池会话，避免每次请求重新握手；
+        # 传入了会话时直接使用其 headers/cookies，不再获取浏览器会话
+        own_session = session is None
+        if own_session:
+            browser_headers, browser_cookies = acquire_browser_credentials(
+                user_data_dir,
+                url=URL_LIST if data_type_name == '列表数据' else None
+            )
+            session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
+        else:
+            browser_headers, browser_cookies = dict(session.headers), session.cookies.get_dict()
 
-            # 检查是否已下载所有数据
-            if len(all_records) >= total_count:
-                print(f"已获取所有 {total_count} 条数据")
-                break
+        # 新记录流式追加到中间文件，结束时一次性生成 xlsx
+        sink = RecordSink(output_file, sheet_name=sheet_name, id_column_name=id_column_name, render_excel=render_excel,
+                          schema=schema, flatten_func=flatten_func)
+        cache = open_response_cache(cache_file)
 
-            current_page += 1
-            time.sleep(1)  # 暂停1秒，避免请求过于频繁
-    else:
-        # 单条请求处理（接口2、4）- 需要先读取xlsx1.xlsx获取liveObjectId列表
-        # 读取 liveObjectId 列表（来自 xlsx1.xlsx）
-        try:
-            # 尝试读取新工作表名称，如果不存在则回退到旧名称（向后兼容）
-            try:
-                df_list = pd.read_excel('xlsx1.xlsx', sheet_name='列表数据')
-            except ValueError:
-                # 如果新工作表名称不存在，尝试旧的工作表名称
-                df_list = pd.read_excel('xlsx1.xlsx', sheet_name='直播数据')
-            live_ids = [str(live_id) for live_id in df_list['liveObjectId'].tolist()]
-        except Exception as e:
-            print(f"读取 xlsx1.xlsx 失败: {e}")
-            return False
+        skip_ids = plan_skipped_ids([stage_key], live_ids, list_file).get(stage_key) if plan else None
 
-        # 尝试从浏览器会话获取 headers/cookies（只做一次）
-        browser_headers, browser_cookies = get_browser_session_cookies_and_headers(
-            user_data_dir=user_data_dir,
-            url=URL_LIST if data_type_name == '列表数据' else None
+        # 多个工作线程共享同一个限速器，结果按 live_ids 原始顺序返回
+        results = iter_live_results(
+            live_ids, fetch_func, headers=browser_headers, cookies=browser_cookies,
+            workers=workers, rate_limit=rate_limit, burst=burst, transport=transport, session=session,
+            journal=journal, cache=cache, start_times=load_live_start_times(list_file) if cache else None,
+            skip_ids=skip_ids
         )
-        if browser_headers or browser_cookies:
-            print("已从浏览器会话获取 cookies/headers，将用于接口请求")
-        else:
-            browser_headers, browser_cookies = None, None
 
-        for idx, live_id in enumerate(live_ids, 1):
-            print(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的{data_type_name}...")
-            data = fetch_func(live_id, headers=browser_headers, cookies=browser_cookies)
-            if data is None:
-                print(f"  警告: 未获取到数据，保存空记录")
-                rec = {id_column_name: str(live_id)}
-                all_records.append(rec)
+        failed_ids = []
+        progress = ProgressView(data_type_name, len(live_ids))
+        for idx, (live_id, data) in enumerate(METRICS.timed_iter('fetch', results), 1):
+            log_detail(f"[{idx}/{len(live_ids)}] 获取 {live_id} 的{data_type_name}...")
+            if data is SKIPPED_RESPONSE:
+                sink.append_response(live_id, None)
+            elif data is None:
+                log_detail(f"  警告: 未获取到数据，保存空记录")
+                sink.append_response(live_id, None)
+                failed_ids.append(live_id)
             else:
-                rec = flatten_func(live_id, data)
-                all_records.append(rec)
-
-            # 每次请求间隔 1 秒，避免过快
-            time.sleep(1)
+                # 原始响应按批展平后写入（见 flatten_batch）
+                sink.append_response(live_id, data)
+            progress.update(failed=data is None)
 
             # 每 50 条实时保存一次，防止意外中断丢失数据
             if idx % 50 == 0:
-                save_records_to_excel_file(output_file, all_records, sheet_name=sheet_name, id_column_name=id_column_name, silent=True)
+                sink.flush()
+        progress.close()
+
+        if own_session:
+            session.close()
+        if cache is not None:
+            cache.close()
+
+        # 最终保存
+        success = sink.close() and not login_expired()
+        record_count = sink.count
+        if success:
+            record_dead_letters(journal_dir, stage_key, output_file, failed_ids, live_ids)
 
-    # 最终保存
-    success = save_records_to_excel_file(output_file, all_records, sheet_name=sheet_name, id_column_name=id_column_name, silent=False)
     if success:
-        print(f"{data_type_name}已保存到 {output_file}，共 {len(all_records)} 条记录")
+        if journal is not None:
+            journal.clear()
+        print(f"{data_type_name}已保存到 {output_file}，共 {record_count} 条记录")
+        if is_batch_request and return_ids:
+            return [entry['liveObjectId'] for entry in index_entries]
         return True
     else:
         print(f"保存{data_type_name}失败")
-        return False
+        return None if is_batch_request and return_ids else False
+
+def fetch_live_list_records(start_time, end_time, page_size=DEFAULT_PAGE_SIZE, headers=None, cookies=None, session=None,
+                            fetch_func=fetch_live_data, flatten_func=flatten_live_data, index=None,
+                            workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST, records=None):
+    """分页获取时间范围内的直播列表（接口1）并展平
+
+    先请求第1页得到 totalLiveCount，再计算出其余页码并发请求（所有页共用一个限速器），
+    结果按页码顺序合并。
+
+    Args:
+        page_size: 每页条数
+        index: 传入列表时，同时把每个直播的索引记录（liveObjectId、开播时间）追加到其中
+        workers: 第1页之后其余页的并发线程数，1 表示顺序请求
+        rate_limit: 列表接口的限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        records: 接收展平后记录的容器（有 append 方法，如 RecordSink，记录逐页写出而不在内存中累积），
+                 为 None 时新建一个列表
+
+    Returns:
+        tuple: (records, complete)，records 为接收了展平后记录的容器，
+               complete 表示是否完整获取（中途有页面请求失败时为 False）
+    """
+    all_records = [] if records is None else records
+    limiter = RATE_CONTROLLER.limiter(FETCH_API_NAMES.get(fetch_func, fetch_func.__name__), rate_limit, burst)
+
+    def fetch_page(current_page):
+        log_detail(f"正在下载第 {current_page} 页...")
+        return fetch_func(
+            page_size=page_size,
+            current_page=current_page,
+            start_time=start_time,
+            end_time=end_time,
+            headers=headers,
+            cookies=cookies,
+            session=session
+        )
+
+    def add_page(result):
+        # 展平数据并添加到列表
+        for data_obj in result.get('liveObjectList') or []:
+            flat_obj = flatten_func(data_obj)
+            all_records.append(flat_obj)
+            if index is not None:
+                index.append(build_live_index_entry(data_obj))
+
+    limiter.acquire()
+    result = fetch_page(1)
+    if result is None:
+        print("第 1 页下载失败，停止")
+        return all_records, False
+
+    if not result.get('liveObjectList'):
+        print("第 1 页无数据，下载完成")
+        return all_records, True
+    add_page(result)
+
+    # 获取总数，计算其余页码
+    total_count = int(result.get('totalLiveCount') or 0)
+    print(f"总共有 {total_count} 条数据")
+    page_count = (total_count + page_size - 1) // page_size
+
+    progress = ProgressView('列表数据（页）', page_count)
+    progress.update()
+    for current_page, result in iter_fetch_results(range(2, page_count + 1), fetch_page,
+                                                   workers=workers, limiter=limiter):
+        if result is None:
+            print(f"第 {current_page} 页下载失败，停止")
+            return all_records, False
+        add_page(result)
+        log_detail(f"已下载 {len(all_records)} 条数据")
+        progress.update()
+    progress.close()
+
+    print(f"已获取所有 {total_count} 条数据")
+    return all_records, True
+
+
+def split_time_windows(start_time, end_time, window_seconds):
+    """把 [start_time, end_time] 切成首尾相接、互不重叠的时间窗口（闭区间），按时间从新到旧排列"""
+    windows = []
+    window_end = end_time
+    while window_end >= start_time:
+        window_start = max(start_time, window_end - window_seconds + 1)
+        windows.append((window_start, window_end))
+        window_end = window_start - 1
+    return windows
+
+
+def fetch_live_list_records_by_window(start_time, end_time, page_size=DEFAULT_PAGE_SIZE, headers=None, cookies=None,
+                                      session=None, fetch_func=fetch_live_data, flatten_func=flatten_live_data,
+                                      index=None, workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT,
+                                      burst=DEFAULT_BURST, window_days=LIST_WINDOW_DAYS,
+                                      min_window_seconds=LIST_MIN_WINDOW_SECONDS, records=None):
+    """按开播时间窗口分片获取直播列表（接口1）并展平，参数和返回值同 fetch_live_list_records
+
+    每个窗口先请求第1页：总数不超过一页时窗口完成；超过一页时把窗口对半拆分后重新请求，
+    窗口短于 min_window_seconds 后才在窗口内分页。同一轮的窗口并发请求（共用一个限速器），
+    结果按时间从新到旧合并，并按 liveObjectId 去重。已完成窗口的原始数据暂存在临时文件中，
+    全部窗口完成后再按顺序读回，内存中最多保留一个窗口的数据。
+
+    Args:
+        window_days: 初始窗口长度（天）
+        min_window_seconds: 窗口不再拆分的最短长度（秒）
+    """
+    limiter = RATE_CONTROLLER.limiter(FETCH_API_NAMES.get(fetch_func, fetch_func.__name__), rate_limit, burst)
+
+    def fetch_page(window, current_page):
+        limiter.acquire()
+        return fetch_func(
+            page_size=page_size,
+            current_page=current_page,
+            start_time=window[0],
+            end_time=window[1],
+            headers=headers,
+            cookies=cookies,
+            session=session
+        )
 
-def download_half_year_data(output_file='xlsx1.xlsx', user_data_dir='./browser_data', start_date=None, end_date=None):
+    def fetch_window(window):
+        """返回 ('split', None) 或 ('done', 直播对象列表)，请求失败时返回 None"""
+        result = fetch_page(window, 1)
+        if result is None:
+            return None
+        lives = list(result.get('liveObjectList') or [])
+        total_count = int(result.get('totalLiveCount') or 0)
+        if total_count <= page_size:
+            return 'done', lives
+        if window[1] - window[0] + 1 > min_window_seconds:
+            return 'split', None
+
+        page_count = (total_count + page_size - 1) // page_size
+        for current_page in range(2, page_count + 1):
+            result = fetch_page(window, current_page)
+            if result is None:
+                return None
+            lives.extend(result.get('liveObjectList') or [])
+        return 'done', lives
+
+    def format_window(window):
+        return (f"{datetime.fromtimestamp(window[0]).strftime('%Y-%m-%d %H:%M:%S')} ~ "
+                f"{datetime.fromtimestamp(window[1]).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # {窗口: (在临时文件中的起始位置, 直播数)}
+    window_spans = {}
+    complete = True
+    with tempfile.TemporaryFile() as spool:
+        pending = split_time_windows(start_time, end_time, window_days * 86400)
+        while pending:
+            print(f"正在下载 {len(pending)} 个时间窗口...")
+            next_round = []
+            for window, outcome in iter_fetch_results(pending, fetch_window, workers=workers):
+                if outcome is None:
+                    print(f"时间窗口 {format_window(window)} 下载失败")
+                    complete = False
+                elif outcome[0] == 'split':
+                    middle = (window[0] + window[1]) // 2
+                    next_round.extend([(middle + 1, window[1]), (window[0], middle)])
+                else:
+                    window_spans[window] = (spool.tell(), len(outcome[1]))
+                    for data_obj in outcome[1]:
+                        spool.write(json.dumps(data_obj, ensure_ascii=False).encode('utf-8') + b'\n')
+            pending = next_round
+
+        # 窗口按时间从新到旧合并，窗口边界或抓取期间的变动可能产生重复，按 liveObjectId 去重
+        all_records = [] if records is None else records
+        seen_ids = set()
+        for window in sorted(window_spans, reverse=True):
+            offset, live_count = window_spans[window]
+            spool.seek(offset)
+            for _ in range(live_count):
+                data_obj = json.loads(spool.readline())
+                live_id = str(data_obj.get('liveObjectId'))
+                if live_id in seen_ids:
+                    continue
+                seen_ids.add(live_id)
+                all_records.append(flatten_func(data_obj))
+                if index is not None:
+                    index.append(build_live_index_entry(data_obj))
+
+    print(f"共 {len(window_spans)} 个时间窗口，已下载 {len(all_records)} 条数据")
+    return all_records, complete
+
+
+def get_list_crawler(list_mode='page'):
+    """根据抓取方式返回列表数据的获取函数"""
+    if list_mode not in LIST_MODES:
+        raise ValueError(f"不支持的列表抓取方式: {list_mode}，可选 {LIST_MODES}")
+    return fetch_live_list_records_by_window if list_mode == 'window' else fetch_live_list_records
+
+
+def download_half_year_data(output_file='xlsx1.xlsx', user_data_dir='./browser_data', start_date=None, end_date=None,
+                            session=None, output_format=None, render_excel=False, return_ids=False,
+                            page_size=DEFAULT_PAGE_SIZE, workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT,
+                            burst=DEFAULT_BURST, list_mode='page'):
     """下载列表数据（接口1）
 
+    除列表文件外还会写出 liveObjectId 索引文件（见 live_id_index_path），供后续接口快速读取 ID。
+
     Args:
         output_file: 输出文件名
         user_data_dir: 浏览器数据目录
         start_date: 开始日期，格式为 'YYYY-MM-DD'，默认为今年1月1号
         end_date: 结束日期，格式为 'YYYY-MM-DD'，默认为当前日期
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        output_format: 输出格式（'xlsx'/'parquet'/'csv'），为 None 时按 output_file 的扩展名决定
+        render_excel: 输出格式不是 xlsx 时，是否额外导出一份 xlsx
+        return_ids: 成功后返回 liveObjectId 列表（失败时返回 None），可直接传给后续接口的 live_ids 参数
+        page_size: 每页条数
+        workers: 第1页返回总数后，其余页的并发线程数
+        rate_limit: 列表接口的限速，每秒最多请求数
+        burst: 令牌桶容量，允许的瞬时突发请求数
+        list_mode: 'page' 按页码分页；'window' 按开播时间窗口分片并发获取并按 liveObjectId 去重
 
     Examples:
         # 使用默认时间范围（今年1月1号到当前时间）
@@ -962,6 +4530,17 @@ def download_half_year_data(output_file='xlsx1.xlsx', user_data_dir='./browser_d
 
         # 只指定结束日期，开始日期使用默认值（今年1月1号）
         download_half_year_data(end_date='2024-12-31')
+
+        # 第1页之后的页面用 4 个线程并发请求，每秒最多 5 个请求
+        download_half_year_data(workers=4, rate_limit=5)
+
+        # 按时间窗口分片抓取，抓取期间有新直播开播也不会错位
+        download_half_year_data(list_mode='window', workers=4, rate_limit=5)
+
+        # 在同一进程中把 ID 列表直接传给后续接口
+        live_ids = download_half_year_data(return_ids=True)
+        if live_ids is not None:
+            download_enrich_data(live_ids=live_ids)
     """
     return download_api_data(
         output_file=output_file,
@@ -970,58 +4549,351 @@ def download_half_year_data(output_file='xlsx1.xlsx', user_data_dir='./browser_d
         flatten_func=flatten_live_data,
         sheet_name='列表数据',
         id_column_name='liveObjectId',
+        schema=RECORD_SCHEMAS['list'],
         user_data_dir=user_data_dir,
         is_batch_request=True,
+        session=session,
+        output_format=output_format,
+        render_excel=render_excel,
+        return_ids=return_ids,
+        workers=workers,
+        rate_limit=rate_limit,
+        burst=burst,
         batch_params={
-            'page_size': 50,
+            'page_size': page_size,
+            'list_mode': list_mode,
             'start_date': start_date,
             'end_date': end_date
         }
     )
 
-if __name__ == '__main__':
+def load_sync_state(state_file=SYNC_STATE_FILE):
+    """读取增量同步状态，文件不存在或损坏时返回空字典"""
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Warning] 读取增量同步状态失败，将执行全量同步: {e}")
+        return {}
+
+
+def save_sync_state(state, state_file=SYNC_STATE_FILE):
+    """保存增量同步状态（先写临时文件再替换，避免写一半时中断损坏状态文件）"""
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, state_file)
+
+
+def download_incremental_data(
+    list_file='xlsx1.xlsx',
+    detail_file='xlsx2.xlsx',
+    product_file='xlsx3.xlsx',
+    ec_file='xlsx4.xlsx',
+    user_data_dir='./browser_data',
+    start_date=None,
+    stale_ids=None,
+    overlap_days=INCREMENTAL_OVERLAP_DAYS,
+    state_file=SYNC_STATE_FILE,
+    page_size=DEFAULT_PAGE_SIZE,
+    list_mode='page',
+    workers=len(ENRICH_STAGES),
+    rate_limit=DEFAULT_RATE_LIMIT,
+    burst=DEFAULT_BURST,
+    transport='thread',
+    session=None,
+    pool_size=DEFAULT_POOL_SIZE,
+    output_format=None,
+    cache_file=RESPONSE_CACHE_FILE,
+    resume=True,
+    journal_dir=JOURNAL_DIR,
+    plan=True
+):
+    """增量同步：只获取上次同步之后开播的直播，并合并进已有的输出文件
+
+    已结束的直播数据不会再变化，因此只对上次高水位（减去 overlap_days 的重叠期）之后的直播，
+    以及 stale_ids 中手动指定需要刷新的直播请求接口2~5。首次运行（没有同步状态）时执行全量同步。
+    接口2~5的断点续传日志使用 INCREMENTAL_JOURNAL_PREFIX 前缀，不会读取或清除被中断的普通下载的日志。
+
+    Args:
+        list_file: 列表数据文件
+        detail_file: 预约数据（接口2）输出文件
+        product_file: 带货商品数据（接口3）输出文件
+        ec_file: 带货数据的整体转换数据（接口4）输出文件
+        user_data_dir: 浏览器数据目录
+        start_date: 首次全量同步的开始日期，格式为 'YYYY-MM-DD'
+        stale_ids: 需要强制重新获取的 liveObjectId 列表
+        overlap_days: 向前重叠的天数，这段时间内的直播可能尚未结束，会重新获取
+        state_file: 增量同步状态文件
+        page_size: 列表接口每页条数
+        list_mode: 列表抓取方式，'page' 按页码分页，'window' 按开播时间窗口分片
+        workers: 接口2~5的并发数，也用于列表接口第1页之后其余页的并发请求
+        rate_limit: 每个接口各自的限速，每秒最多请求数
+        burst: 令牌桶容量
+        transport: 'thread' 或 'async'
+        session: 复用的 requests.Session，为 None 时根据浏览器会话创建一个
+        pool_size: 新建会话时的连接池大小
+        output_format: 接口2~4输出格式（'xlsx'/'parquet'/'csv'），为 None 时按各文件的扩展名决定
+        cache_file: 响应缓存文件，为 None 时不使用缓存；stale_ids 中的直播总是跳过缓存重新请求
+        resume: 是否从上次中断的增量同步的断点续传日志继续
+        journal_dir: 断点续传日志目录
+        plan: 是否按 STAGE_PREDICATES 和列表数据跳过不需要请求的接口
+
+    Returns:
+        bool: 同步是否成功，成功后才会更新高水位
+    """
+    detail_file = with_output_format(detail_file, output_format)
+    product_file = with_output_format(product_file, output_format)
+    ec_file = with_output_format(ec_file, output_format)
+
+    state = load_sync_state(state_file)
+    high_water = state.get('list_high_water')
+
+    if high_water and os.path.exists(list_file):
+        start_time = int(high_water) - overlap_days * 86400
+        end_time = int(time.time())
+        print(f"增量同步: 上次同步到 {datetime.fromtimestamp(int(high_water)).strftime('%Y-%m-%d %H:%M:%S')}，"
+              f"本次从 {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S')} 开始")
+    else:
+        print("未找到增量同步状态，执行全量同步")
+        start_time, end_time = get_time_range_for_half_year(start_date)
+
+    own_session = session is None
+    if own_session:
+        browser_headers, browser_cookies = acquire_browser_credentials(user_data_dir, url=URL_LIST)
+        session = create_http_session(browser_headers, browser_cookies, pool_size=max(pool_size, workers))
+
+    try:
+        index_entries = []
+        list_sink = RecordSink(list_file, '列表数据', 'liveObjectId', merge_ids=[], schema=RECORD_SCHEMAS['list'])
+        crawl_func = get_list_crawler(list_mode)
+        _, complete = crawl_func(start_time, end_time, page_size=page_size, session=session, index=index_entries,
+                                 workers=workers, rate_limit=rate_limit, burst=burst, records=list_sink)
+        if not complete:
+            list_sink.discard()
+            print("列表数据下载不完整，本次不更新同步状态")
+            return False
+
+        # 合并列表数据：重叠期内已有的直播用最新数据替换，新直播排在前面
+        for file_path in (list_file, detail_file, product_file, ec_file):
+            backup_file(file_path)
+        new_ids = [entry['liveObjectId'] for entry in index_entries]
+        old_index = load_live_index(list_file) if os.path.exists(list_file) else []
+        list_sink.merge_ids = new_ids
+        if not list_sink.close():
+            return False
+        # 索引与合并后的列表文件保持相同顺序：新直播在前，保留的已有直播在后
+        new_id_set = set(new_ids)
+        write_live_id_index(list_file, index_entries + [entry for entry in old_index or []
+                                                        if entry['liveObjectId'] not in new_id_set])
+
+        target_ids = list(dict.fromkeys(new_ids + [str(live_id) for live_id in (stale_ids or [])]))
+        print(f"需要获取接口2~5数据的直播: {len(target_ids)} 个（列表新增/近期 {len(new_ids)} 个，"
+              f"手动指定 {len(stale_ids or [])} 个）")
+
+        success = True
+        if target_ids:
+            success = download_enrich_data(
+                list_file=list_file,
+                detail_file=detail_file,
+                product_file=product_file,
+                ec_file=ec_file,
+                user_data_dir=user_data_dir,
+                workers=workers,
+                rate_limit=rate_limit,
+                burst=burst,
+                transport=transport,
+                session=session,
+                live_ids=target_ids,
+                merge=True,
+                backup=False,
+                cache_file=cache_file,
+                refresh_ids=stale_ids,
+                resume=resume,
+                journal_dir=journal_dir,
+                plan=plan,
+                journal_prefix=INCREMENTAL_JOURNAL_PREFIX
+            )
 
-    # 检查登录状态
-    if not check_login_status():
-        exit(0)
+        if success:
+            state['list_high_water'] = end_time
+            state['last_sync'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            save_sync_state(state, state_file)
+            print(f"增量同步完成，高水位更新为 {datetime.fromtimestamp(end_time).strftime('%Y-%m-%d %H:%M:%S')}")
+        return success
+    finally:
+        if own_session:
+            session.close()
+
+
+# ---------------------------------------------------------------------------
+# 命令行入口：python crawler.py <阶段> [选项]，不指定阶段时执行 all（列表 + 接口2~5）
+# ---------------------------------------------------------------------------
+
+# 可单独运行的阶段
+CLI_STAGES = ('all', 'list', 'detail', 'product', 'ec', 'diagnostic', 'enrich', 'incremental', 'replay', 'retry')
+# 需要请求接口（需要登录）的阶段
+CLI_NETWORK_STAGES = ('all', 'list', 'detail', 'product', 'ec', 'diagnostic', 'enrich', 'incremental', 'retry')
+
+
+def build_arg_parser():
+    """构造命令行参数解析器"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='微信视频号直播数据爬虫',
+        epilog='示例: python crawler.py diagnostic --no-prompt    python crawler.py list --start-date 2025-01-01'
+    )
+    parser.add_argument('stage', nargs='?', default='all', choices=CLI_STAGES,
+                        help='要运行的阶段，默认 all（下载列表数据后合并下载接口2~5）')
+
+    dates = parser.add_argument_group('时间范围（all、list、incremental）')
+    dates.add_argument('--start-date', help="开始日期 'YYYY-MM-DD'，all 阶段默认 2025-01-01，其余默认今年1月1日")
+    dates.add_argument('--end-date', help="结束日期 'YYYY-MM-DD'，默认当前时间")
+
+    files = parser.add_argument_group('文件')
+    files.add_argument('--list-file', default='xlsx1.xlsx', help='列表数据文件（接口1的输出，接口5写回其中）')
+    files.add_argument('--detail-file', help='预约数据（接口2）输出文件')
+    files.add_argument('--product-file', help='带货商品数据（接口3）输出文件')
+    files.add_argument('--ec-file', help='带货数据的整体转换数据（接口4）输出文件')
+    files.add_argument('--output-format', choices=OUTPUT_FORMATS, help='接口2~4的输出格式，默认按文件扩展名决定')
+    files.add_argument('--render-excel', action='store_true', help='输出格式不是 xlsx 时额外导出一份 xlsx')
+    files.add_argument('--archive-dir', default=ARCHIVE_DIR, help='原始响应归档目录（replay 阶段读取）')
+    files.add_argument('--journal-dir', default=JOURNAL_DIR, help='断点续传日志目录')
+    files.add_argument('--cache-file', default=RESPONSE_CACHE_FILE, help='响应缓存文件')
+    files.add_argument('--no-cache', action='store_true', help='不使用响应缓存')
+    files.add_argument('--no-resume', action='store_true', help='忽略断点续传日志，重新下载')
+
+    crawl = parser.add_argument_group('抓取')
+    crawl.add_argument('--stages', nargs='+', choices=['list'] + list(ENRICH_STAGES),
+                       help='enrich、replay、retry 阶段只处理这些接口（list 只用于 replay）')
+    crawl.add_argument('--stale-ids', nargs='+', help='incremental 阶段强制重新获取的 liveObjectId')
+    crawl.add_argument('--overlap-days', type=int, default=INCREMENTAL_OVERLAP_DAYS,
+                       help='incremental 阶段重新抓取上次同步之前多少天的列表数据')
+    crawl.add_argument('--workers', type=int, help='并发数')
+    crawl.add_argument('--rate-limit', type=float, default=DEFAULT_RATE_LIMIT,
+                       help='每个接口每秒最多请求数（自适应限速不会超过该值）')
+    crawl.add_argument('--burst', type=int, default=DEFAULT_BURST, help='令牌桶容量')
+    crawl.add_argument('--transport', choices=('thread', 'async'), default='thread')
+    crawl.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='列表接口每页条数')
+    crawl.add_argument('--list-mode', choices=LIST_MODES, default='page', help='列表抓取方式')
+    crawl.add_argument('--no-plan', action='store_true', help='不按列表数据跳过无成交直播的接口3、4请求')
+    crawl.add_argument('--user-data-dir', default=BROWSER_USER_DATA_DIR, help='浏览器 profile 目录')
+    crawl.add_argument('--no-prompt', action='store_true',
+                       help='登录凭据无效时直接退出（退出码 1），不询问，适合定时任务')
+
+    output = parser.add_argument_group('日志与报告')
+    output.add_argument('--verbose', action='store_true', help='打印逐条请求的详细日志')
+    output.add_argument('--progress-interval', type=float, default=PROGRESS_INTERVAL, help='进度输出的最短间隔（秒）')
+    output.add_argument('--report', default=RUN_REPORT_FILE, help='运行报告（JSON）文件，空字符串表示不写')
+    output.add_argument('--prometheus', default=PROMETHEUS_TEXTFILE, help='Prometheus textfile 路径')
+    return parser
+
+
+def run_stage(args, session):
+    """按命令行参数运行一个阶段，返回是否成功"""
+    cache_file = None if args.no_cache else args.cache_file
+    resume = not args.no_resume
+    plan = not args.no_plan
+    concurrency = dict(rate_limit=args.rate_limit, burst=args.burst, transport=args.transport, session=session)
+    if args.workers:
+        concurrency['workers'] = args.workers
+    files = {key: value for key, value in (('detail_file', args.detail_file), ('product_file', args.product_file),
+                                           ('ec_file', args.ec_file)) if value}
+    common = dict(user_data_dir=args.user_data_dir, journal_dir=args.journal_dir, cache_file=cache_file,
+                  **concurrency)
+
+    if args.stage in ('all', 'list'):
+        print("正在下载列表数据（接口1）...")
+        live_ids = download_half_year_data(
+            output_file=args.list_file, user_data_dir=args.user_data_dir,
+            start_date=args.start_date or ('2025-01-01' if args.stage == 'all' else None), end_date=args.end_date,
+            session=session, return_ids=True, page_size=args.page_size, workers=args.workers or DEFAULT_WORKERS,
+            rate_limit=args.rate_limit, burst=args.burst, list_mode=args.list_mode
+        )
+        if live_ids is None or args.stage == 'list':
+            if live_ids is None and args.stage == 'all':
+                print("列表数据下载失败，跳过其他接口的下载")
+            return live_ids is not None
+        # all：一次遍历 liveObjectId 列表，同时下载接口2~5（旧版默认的中文输出文件名）
+        files = {'detail_file': '预约数据.xlsx', 'product_file': '带货商品数据.xlsx', 'ec_file': '整体转换.xlsx',
+                 **files}
+        print("\n正在下载预约数据、带货商品数据、整体转换数据、数据增强诊断数据（接口2~5）...")
+        return download_enrich_data(list_file=args.list_file, live_ids=live_ids, resume=resume,
+                                    output_format=args.output_format, render_excel=args.render_excel,
+                                    plan=plan, **files, **common)
+
+    if args.stage in ('detail', 'product', 'ec'):
+        download_func = {'detail': download_detail_data, 'product': download_product_data,
+                         'ec': download_ec_summary}[args.stage]
+        output = {'output_file': files[f'{args.stage}_file']} if f'{args.stage}_file' in files else {}
+        return download_func(list_file=args.list_file, resume=resume, output_format=args.output_format,
+                             render_excel=args.render_excel, plan=plan, **output, **common)
+
+    if args.stage == 'diagnostic':
+        return download_live_diagnostic_data(input_file=args.list_file, resume=resume, **common)
+
+    if args.stage == 'enrich':
+        return download_enrich_data(list_file=args.list_file, resume=resume, output_format=args.output_format,
+                                    render_excel=args.render_excel, stages=args.stages, plan=plan,
+                                    **files, **common)
+
+    if args.stage == 'incremental':
+        return download_incremental_data(list_file=args.list_file, start_date=args.start_date,
+                                         stale_ids=args.stale_ids, overlap_days=args.overlap_days,
+                                         page_size=args.page_size, list_mode=args.list_mode,
+                                         output_format=args.output_format, resume=resume, plan=plan,
+                                         **files, **common)
+
+    if args.stage == 'retry':
+        return retry_dead_letters(list_file=args.list_file, stages=args.stages, render_excel=args.render_excel,
+                                  **common)
+
+    return replay_archive(archive_dir=args.archive_dir, list_file=args.list_file, output_format=args.output_format,
+                          render_excel=args.render_excel, stages=args.stages, **files)
+
+
+def main(argv=None):
+    """命令行入口，返回进程退出码：0 成功，1 失败或未登录"""
+    global VERBOSE_LOG, PROGRESS_INTERVAL
+
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.stages and 'list' in args.stages and args.stage != 'replay':
+        parser.error('--stages list 只能用于 replay 阶段')
+    VERBOSE_LOG = args.verbose
+    PROGRESS_INTERVAL = args.progress_interval
+
+    session = None
+    if args.stage in CLI_NETWORK_STAGES:
+        # 检查登录状态（--no-prompt 时凭据无效直接以退出码 1 退出，交互时选择不继续则正常退出）
+        if not check_login_status(args.user_data_dir, prompt=not args.no_prompt):
+            return 1 if args.no_prompt else 0
+
+        # 浏览器会话只获取一次，所有接口共用同一个连接池会话，连接池不小于并发数
+        headers, cookies = acquire_browser_credentials(args.user_data_dir, url=URL_LIST)
+        session = create_http_session(headers, cookies, pool_size=max(DEFAULT_POOL_SIZE, args.workers or 0))
 
     print("\n" + "=" * 60)
-    print("开始执行数据下载任务")
+    print(f"开始执行: {args.stage}")
     print("=" * 60 + "\n")
+    try:
+        success = run_stage(args, session)
+    finally:
+        if session is not None:
+            session.close()
 
-    # 下载列表数据（接口1）
-    print("正在下载列表数据（接口1）...")
-    success1 = download_half_year_data(start_date='2025-01-01')  # 使用默认时间范围（今年1月1号到当前时间）
-    # download_half_year_data(start_date='2024-01-01', end_date='2024-12-31')  # 指定时间范围
-
-    if success1:
-        print("\n" + "=" * 60)
-        print("列表数据下载完成，开始下载其他接口数据")
-        print("=" * 60 + "\n")
-
-        # 下载预约数据（接口2）- 下载全部数据
-        # 输出文件名为 xlsx2.xlsx
-        print("正在下载预约数据（接口2）...")
-        download_detail_data(output_file='预约数据.xlsx')
-
-        # 下载带货商品的数据（接口3）- 下载全部数据
-        # 输出文件名为 xlsx3.xlsx
-        print("正在下载带货商品的数据（接口3）...")
-        download_product_data(output_file='带货商品数据.xlsx')
-
-        # 下载带货数据的整体转换数据（接口4）
-        # 输出文件名为 xlsx4_YYYYMMDDHHMMSS.xlsx
-        print("正在下载带货数据的整体转换数据（接口4）...")
-        download_ec_summary(output_file='整体转换.xlsx')
-
-        # 下载数据增强诊断数据（接口5）- 更新xlsx1.xlsx文件
-        print("正在下载数据增强诊断数据（接口5）...")
-        download_live_diagnostic_data(input_file='xlsx1.xlsx')
-
-        print("\n" + "=" * 60)
-        print("所有接口数据下载完成！")
-        print("=" * 60 + "\n")
-    else:
-        print("\n" + "=" * 60)
-        print("列表数据下载失败，跳过其他接口的下载")
-        print("=" * 60 + "\n")
+    print("\n" + "=" * 60)
+    print(f"{args.stage} {'完成' if success else '失败'}")
+    print("=" * 60 + "\n")
+
+    # 各接口请求数、延迟、重试、错误码和各阶段耗时的汇总
+    METRICS.print_summary()
+    METRICS.write_report(args.report or None, args.prometheus or None)
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""本地模拟服务器：模拟 crawler.py 用到的五个接口，用于离线测试和性能基准
+
+    python mock_server.py --lives 10000 --latency 0.02 --error-rate 0.01 --throttle 200
+
+模拟的接口（按请求路径的最后一段区分，与真实接口路径一致）：
+    get_live_history                      接口1 直播列表（按开播时间筛选、分页，返回 totalLiveCount）
+    live_single_data                      接口2 预约数据
+    get_single_live_ec_spu_data_page_v2   接口3 带货商品数据（按 offset/limit 分页，返回 totalCount）
+    get_single_live_funnel                接口4 带货数据的整体转换数据
+    getLiveDiagnosticData                 接口5 数据增强诊断数据
+
+GET /__stats 返回各接口的请求数、错误数和限流次数，GET /__reset 清空统计。
+数据由随机种子确定，同一参数启动的服务器每次返回相同的数据。
+"""
+
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# 各接口请求路径的最后一段
+ENDPOINTS = {
+    'get_live_history': '接口1',
+    'live_single_data': '接口2',
+    'get_single_live_ec_spu_data_page_v2': '接口3',
+    'get_single_live_funnel': '接口4',
+    'getLiveDiagnosticData': '接口5',
+}
+
+# crawler.py 中各接口地址的变量名与请求路径的最后一段
+CRAWLER_URLS = {
+    'URL_LIST': 'get_live_history',
+    'URL_DETAIL': 'live_single_data',
+    'URL_PRODUCT': 'get_single_live_ec_spu_data_page_v2',
+    'URL_EC_SUMMARY': 'get_single_live_funnel',
+    'URL_DIAGNOSTIC': 'getLiveDiagnosticData',
+}
+
+DEFAULT_LIVES = 1000
+DEFAULT_DAYS = 180          # 直播开播时间分布在最近多少天内
+DEFAULT_MAX_SPUS = 40       # 每场直播最多的带货商品数
+
+
+class MockDataset:
+    """模拟数据集：直播按开播时间从新到旧排列，各接口的数据按 liveObjectId 即时生成，不占用额外内存"""
+
+    def __init__(self, lives=DEFAULT_LIVES, days=DEFAULT_DAYS, max_spus=DEFAULT_MAX_SPUS, seed=0, now=None):
+        self.seed = seed
+        self.max_spus = max_spus
+        now = int(now or time.time())
+        rng = random.Random(seed)
+        start_times = sorted((now - rng.randint(0, days * 86400) for _ in range(lives)), reverse=True)
+        # liveObjectId 为 19 位数字，与真实接口一致
+        self.lives = [(str(10 ** 18 + seed * 10 ** 9 + i), start_time) for i, start_time in enumerate(start_times)]
+        self._sort_keys = [-start_time for start_time in start_times]
+
+    def _rng(self, live_id, salt):
+        return random.Random(f'{self.seed}:{salt}:{live_id}')
+
+    def live_object(self, live_id, start_time):
+        """接口1返回的直播对象"""
+        rng = self._rng(live_id, 'list')
+        audience = rng.randint(0, 50000)
+        return {
+            'liveObjectId': live_id,
+            'description': f'模拟直播 {live_id[-6:]}',
+            'startTime': start_time,
+            'liveStats': {
+                'liveDurationInSeconds': rng.randint(600, 4 * 3600),
+                'totalAudienceCount': audience,
+            },
+            'maxOnlineCount': rng.randint(0, max(1, audience // 10)),
+            'hotQuota': rng.randint(0, 100000),
+            'payedGmv': str(rng.choice([0, rng.randint(0, 10 ** 7)])),
+        }
+
+    def list_page(self, start_time, end_time, current_page, page_size):
+        """接口1：开播时间在 [start_time, end_time] 内的直播的第 current_page 页"""
+        first = bisect.bisect_left(self._sort_keys, -end_time)
+        last = bisect.bisect_right(self._sort_keys, -start_time)
+        begin = first + (current_page - 1) * page_size
+        return {
+            'liveObjectList': [self.live_object(*live) for live in self.lives[begin:min(last, begin + page_size)]],
+            'totalLiveCount': max(0, last - first),
+        }
+
+    def single_data(self, live_id):
+        """接口2：预约数据，包含按场景拆分的预约人数"""
+        rng = self._rng(live_id, 'detail')
+        scenes = [{'scene': scene, 'reserveNoticeUserCount': rng.randint(0, 500)} for scene in (1, 2, 3)]
+        return {
+            'reserveNoticeUserCount': sum(item['reserveNoticeUserCount'] for item in scenes),
+            'reserveNoticeJoinliveRatio': round(rng.random(), 4),
+            'sceneList': scenes,
+        }
+
+    def spu_page(self, live_id, offset, limit):
+        """接口3：带货商品数据的一页"""
+        rng = self._rng(live_id, 'spu')
+        total = rng.randint(0, self.max_spus)
+        items = []
+        for i in range(offset, min(total, offset + limit)):
+            item_rng = self._rng(live_id, f'spu{i}')
+            items.append({
+                'baseData': {
+                    'srcSpuId': str(item_rng.randint(10 ** 9, 10 ** 10)),
+                    'spuId': str(9 * 10 ** 18 + item_rng.randint(0, 10 ** 17)),
+                    'src': 1,
+                    'spuName': f'模拟商品 {i + 1}',
+                    'thumbUrl': f'https://example.com/{live_id}/{i}.jpg',
+                    'price': item_rng.randint(100, 100000),
+                    'srcName': '模拟店铺',
+                    'stock': item_rng.randint(0, 1000),
+                },
+                'gmv': str(item_rng.randint(0, 10 ** 6)),
+                'pay_pv': item_rng.randint(0, 1000),
+                'clk_pv': item_rng.randint(0, 10000),
+                'clk_pay_ratio': str(round(item_rng.random(), 4)),
+                'refund_rate': str(round(item_rng.random() / 10, 4)),
+            })
+        return {'spuDataList': items, 'totalCount': total}
+
+    def ec_summary(self, live_id):
+        """接口4：带货数据的整体转换数据"""
+        rng = self._rng(live_id, 'ec')
+        return {
+            'exposureUv': rng.randint(0, 100000),
+            'clickUv': rng.randint(0, 10000),
+            'createOrderUv': rng.randint(0, 1000),
+            'payUv': rng.randint(0, 500),
+            'gmv': str(rng.randint(0, 10 ** 7)),
+        }
+
+    def diagnostic(self, live_id):
+        """接口5：数据增强诊断数据"""
+        rng = self._rng(live_id, 'diagnostic')
+        return {'newWatchPvPromotion': {'value': rng.randint(0, 10000)}}
+
+
+class _TokenBucket:
+    """每个接口一个令牌桶，超出速率的请求返回 HTTP 429"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务器
+
+    Args:
+        dataset: MockDataset 实例
+        host: 监听地址
+        port: 监听端口，0 表示自动选择
+        latency: 每个请求的平均延迟（秒），实际延迟在 latency 上下浮动 jitter 比例
+        jitter: 延迟浮动比例
+        error_rate: 返回 errCode 非 0 的请求比例
+        throttle: 每个接口每秒最多处理的请求数，超出时返回 HTTP 429，<=0 表示不限流
+        seed: 延迟和错误的随机种子
+    """
+
+    def __init__(self, dataset=None, host='127.0.0.1', port=0, latency=0.0, jitter=0.5, error_rate=0.0,
+                 throttle=0, seed=0):
+        self.dataset = dataset or MockDataset()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.buckets = {name: _TokenBucket(throttle) for name in ENDPOINTS.values()} if throttle > 0 else None
+        self.stats = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, endpoint):
+        """返回指定接口（请求路径的最后一段）的本地地址"""
+        return f'{self.base_url}/{endpoint}'
+
+    def apply_to(self, crawler):
+        """把 crawler 模块的五个接口地址指向本服务器"""
+        for name, endpoint in CRAWLER_URLS.items():
+            setattr(crawler, name, self.url(endpoint))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {}
+
+    def _count(self, api_name, field):
+        with self._lock:
+            stats = self.stats.setdefault(api_name, {'requests': 0, 'errors': 0, 'throttled': 0})
+            stats[field] += 1
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def handle(self, endpoint, body):
+        """处理一个接口请求，返回 (HTTP 状态码, 响应 JSON)"""
+        api_name = ENDPOINTS[endpoint]
+        self._count(api_name, 'requests')
+        if self.latency > 0:
+            time.sleep(max(0.0, self.latency * (1 + self.jitter * (2 * self._random() - 1))))
+        if self.buckets is not None and not self.buckets[api_name].allow():
+            self._count(api_name, 'throttled')
+            return 429, {'errCode': -1, 'errMsg': 'too many requests'}
+        if self.error_rate > 0 and self._random() < self.error_rate:
+            self._count(api_name, 'errors')
+            return 200, {'errCode': 1, 'errMsg': 'system busy'}
+
+        dataset = self.dataset
+        if endpoint == 'get_live_history':
+            data = dataset.list_page(int(body['filterStartTime']), int(body['filterEndTime']),
+                                     int(body.get('currentPage') or 1), int(body.get('pageSize') or 10))
+        elif endpoint == 'live_single_data':
+            data = dataset.single_data(str(body['liveObjectId']))
+        elif endpoint == 'get_single_live_ec_spu_data_page_v2':
+            data = dataset.spu_page(str(body['liveObjectId']), int(body.get('offset') or 0),
+                                    int(body.get('limit') or 15))
+        elif endpoint == 'get_single_live_funnel':
+            data = dataset.ec_summary(str(body['liveObjectId']))
+        else:
+            data = dataset.diagnostic(str(body['objectId']))
+        return 200, {'errCode': 0, 'errMsg': 'ok', 'data': data}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status, payload):
+                out = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == '/__stats':
+                    with server._lock:
+                        self._reply(200, server.stats)
+                elif path == '/__reset':
+                    server.reset_stats()
+                    self._reply(200, {})
+                else:
+                    self._reply(404, {'errCode': 404, 'errMsg': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length)
+                endpoint = urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1]
+                if endpoint not in ENDPOINTS:
+                    self._reply(404, {'errCode': 404, 'errMsg': 'not found'})
+                    return
+                try:
+                    body = json.loads(raw or b'{}')
+                    status, payload = server.handle(endpoint, body)
+                except (KeyError, TypeError, ValueError) as e:
+                    status, payload = 400, {'errCode': 400, 'errMsg': f'bad request: {e}'}
+                self._reply(status, payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='crawler.py 五个接口的本地模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--lives', type=int, default=DEFAULT_LIVES, help='直播数量')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='直播开播时间分布在最近多少天内')
+    parser.add_argument('--max-spus', type=int, default=DEFAULT_MAX_SPUS, help='每场直播最多的带货商品数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的平均延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.5, help='延迟浮动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 errCode 非 0 的请求比例')
+    parser.add_argument('--throttle', type=float, default=0, help='每个接口每秒最多处理的请求数，超出返回 HTTP 429')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dataset = MockDataset(lives=args.lives, days=args.days, max_spus=args.max_spus, seed=args.seed)
+    server = MockServer(dataset, host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, throttle=args.throttle, seed=args.seed)
+    print(f"模拟服务器已启动: {server.base_url}（{args.lives} 个直播）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""测试公共夹具：每个测试在独立的临时目录中运行，全局的限速、重试和凭据状态互不影响；
+需要接口时使用 mock_server.py 在本地启动的模拟服务器"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+from mock_server import CRAWLER_URLS, MockDataset, MockServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """切换到临时目录，替换全局状态，关闭原始响应归档；测试中启动浏览器视为错误"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler, 'RATE_CONTROLLER', crawler.RateController())
+    monkeypatch.setattr(crawler, 'RETRY_BUDGET', crawler.RetryBudget())
+    monkeypatch.setattr(crawler, 'CREDENTIAL_REFRESHER', crawler.CredentialRefresher())
+    monkeypatch.setattr(crawler, '_VERIFIED_CREDENTIALS', {})
+    monkeypatch.setattr(crawler.RESPONSE_ARCHIVE, 'enabled', False)
+    monkeypatch.setattr(crawler, 'RETRY_BACKOFF_BASE', 0.01)
+
+    def no_browser(*args, **kwargs):
+        raise AssertionError('测试中不应启动浏览器获取登录凭据')
+
+    monkeypatch.setattr(crawler, 'get_browser_session_cookies_and_headers', no_browser)
+    return tmp_path
+
+
+@pytest.fixture
+def start_server(monkeypatch):
+    """启动模拟服务器并把 crawler 的接口地址指向它：start_server(lives=..., **MockServer 参数)"""
+    servers = []
+
+    def start(lives=60, **kwargs):
+        server = MockServer(MockDataset(lives=lives), **kwargs).start()
+        for name, endpoint in CRAWLER_URLS.items():
+            monkeypatch.setattr(crawler, name, server.url(endpoint))
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def session():
+    """复用的 HTTP 会话（传入下载函数后不再获取浏览器会话）"""
+    http_session = crawler.create_http_session({'User-Agent': 'test'}, {})
+    yield http_session
+    http_session.close()
@@ -0,0 +1,60 @@
+"""原始响应归档的写入与读取"""
+
+import os
+
+import crawler
+
+
+def test_records_are_read_back_in_order():
+    archive = crawler.ResponseArchive(archive_dir='archive', enabled=True)
+    archive.record('接口2', 'http://x/a', {'liveObjectId': '1'}, {'value': 1})
+    archive.record('接口2', 'http://x/a', {'liveObjectId': '2'}, None)
+    archive.close()
+    # 关闭后的响应写入新文件（文件名按时间排序）
+    archive.record('接口4', 'http://x/b', {'liveObjectId': '3'}, {'value': 3})
+    archive.close()
+    assert archive.count == 2
+
+    records = list(crawler.iter_archive_records('archive'))
+    assert [(record['api'], record['payload'], record['data']) for record in records] == [
+        ('接口2', {'liveObjectId': '1'}, {'value': 1}),
+        ('接口4', {'liveObjectId': '3'}, {'value': 3}),
+    ]
+    assert all(isinstance(record['fetchedAt'], int) for record in records)
+
+
+def test_disabled_archive_writes_nothing():
+    archive = crawler.ResponseArchive(archive_dir='archive', enabled=False)
+    archive.record('接口2', 'http://x/a', {}, {'value': 1})
+    archive.close()
+    assert not os.path.exists('archive')
+    assert list(crawler.iter_archive_records('archive')) == []
+
+
+def test_truncated_archive_is_read_up_to_the_damage():
+    archive = crawler.ResponseArchive(archive_dir='archive', enabled=True)
+    for i in range(200):
+        archive.record('接口2', 'http://x/a', {'liveObjectId': str(i)}, {'value': 'x' * 100 + str(i)})
+    archive.close()
+    size = os.path.getsize(archive.path)
+    with open(archive.path, 'r+b') as f:
+        f.truncate(size - 20)
+
+    records = list(crawler.iter_archive_records('archive'))
+    assert 0 < len(records) < 200
+    assert [record['payload']['liveObjectId'] for record in records] == [str(i) for i in range(len(records))]
+
+
+def test_downloads_archive_successful_responses(start_server, session, monkeypatch):
+    archive = crawler.ResponseArchive(archive_dir='archive', enabled=True)
+    monkeypatch.setattr(crawler, 'RESPONSE_ARCHIVE', archive)
+    server = start_server(lives=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    assert crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session, workers=2,
+                                        rate_limit=0, cache_file=None, plan=False)
+    archive.close()
+
+    records = list(crawler.iter_archive_records('archive'))
+    assert sorted(record['payload']['liveObjectId'] for record in records) == sorted(live_ids)
+    assert {record['api'] for record in records} == {'接口2'}
+    assert {record['url'] for record in records} == {crawler.URL_DETAIL}
@@ -0,0 +1,29 @@
+"""benchmark.py 的单次运行"""
+
+import glob
+import os
+import tempfile
+
+import benchmark
+import crawler
+from mock_server import CRAWLER_URLS
+
+
+def bench_dirs():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), 'crawler-bench-*')))
+
+
+def test_run_one_cleans_up_workdir(monkeypatch):
+    # run_one 直接修改 crawler 的接口地址，测试结束后还原
+    for name in CRAWLER_URLS:
+        monkeypatch.setattr(crawler, name, getattr(crawler, name))
+    cwd = os.getcwd()
+    before = bench_dirs()
+
+    args = benchmark.parse_args(['--sizes', '20', '--workers', '4', '--days', '30'])
+    results = benchmark.run_one(args, 20)
+
+    assert results['listed'] == 20
+    assert set(results['stages']) == {'list', 'enrich', 'excel'}
+    assert os.getcwd() == cwd
+    assert bench_dirs() == before
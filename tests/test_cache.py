@@ -0,0 +1,37 @@
+"""接口响应缓存"""
+
+import crawler
+
+NOW = 1_700_000_000
+
+
+def test_cache_ttl_depends_on_live_age(monkeypatch):
+    monkeypatch.setattr(crawler.time, 'time', lambda: NOW)
+    cache = crawler.ResponseCache('cache.sqlite', final_age=1000, ttl=60)
+    cache.put('接口2', 'old', {'value': 1}, start_time=NOW - 2000)
+    cache.put('接口2', 'recent', {'value': 2}, start_time=NOW - 10)
+    cache.put('接口2', 'unknown', {'value': 3})
+    assert cache.fresh_ids('接口2', ['old', 'recent', 'unknown', 'missing']) == {'old', 'recent', 'unknown'}
+    assert cache.stats['接口2'] == {'hits': 3, 'misses': 1}
+
+    # 超过 ttl 后只有开播超过 final_age 的直播仍然有效
+    monkeypatch.setattr(crawler.time, 'time', lambda: NOW + 61)
+    assert cache.fresh_ids('接口2', ['old', 'recent', 'unknown']) == {'old'}
+    assert cache.get('接口2', 'old') == {'value': 1}
+    # 缓存按接口区分
+    assert cache.fresh_ids('接口4', ['old']) == set()
+    cache.close()
+
+
+def test_cached_responses_are_not_requested_again(start_server, session):
+    server = start_server(lives=20)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    options = dict(live_ids=live_ids, session=session, workers=4, rate_limit=0, cache_file='cache.sqlite',
+                   plan=False, resume=False)
+
+    assert crawler.download_detail_data(output_file='first.csv', **options)
+    assert server.stats['接口2']['requests'] == len(live_ids)
+    assert crawler.download_detail_data(output_file='second.csv', **options)
+    assert server.stats['接口2']['requests'] == len(live_ids)
+    with open('first.csv', encoding='utf-8-sig') as first, open('second.csv', encoding='utf-8-sig') as second:
+        assert first.read() == second.read()
@@ -0,0 +1,61 @@
+"""命令行参数"""
+
+import pytest
+
+import crawler
+
+
+@pytest.fixture
+def fake_run(monkeypatch):
+    """跳过登录检查和实际下载，记录创建会话时的参数和运行的阶段"""
+    calls = {}
+    monkeypatch.setattr(crawler, 'check_login_status', lambda *args, **kwargs: True)
+    monkeypatch.setattr(crawler, 'acquire_browser_credentials', lambda *args, **kwargs: ({}, {}))
+
+    def create_session(headers, cookies, pool_size=crawler.DEFAULT_POOL_SIZE):
+        calls['pool_size'] = pool_size
+        return crawler.requests.Session()
+
+    def run_stage(args, session):
+        calls['stages'] = args.stages
+        return True
+
+    monkeypatch.setattr(crawler, 'create_http_session', create_session)
+    monkeypatch.setattr(crawler, 'run_stage', run_stage)
+    return calls
+
+
+@pytest.mark.parametrize('workers, pool_size', [
+    ([], crawler.DEFAULT_POOL_SIZE),
+    (['--workers', '4'], crawler.DEFAULT_POOL_SIZE),
+    (['--workers', '32'], 32),
+])
+def test_pool_size_follows_workers(fake_run, workers, pool_size):
+    assert crawler.main(['enrich', '--report', '', '--prometheus', ''] + workers) == 0
+    assert fake_run['pool_size'] == pool_size
+
+
+def test_replay_accepts_list_stage(fake_run):
+    assert crawler.main(['replay', '--stages', 'list', 'diagnostic', '--report', '', '--prometheus', '']) == 0
+    assert fake_run['stages'] == ['list', 'diagnostic']
+    assert 'pool_size' not in fake_run
+
+
+def test_list_stage_only_for_replay(fake_run):
+    with pytest.raises(SystemExit):
+        crawler.main(['enrich', '--stages', 'list'])
+
+
+def test_incremental_passes_journal_options(monkeypatch):
+    calls = {}
+
+    def incremental(**kwargs):
+        calls.update(kwargs)
+        return True
+
+    monkeypatch.setattr(crawler, 'download_incremental_data', incremental)
+    args = crawler.build_arg_parser().parse_args(['incremental', '--journal-dir', 'j', '--no-resume', '--no-plan'])
+    assert crawler.run_stage(args, session=None)
+    assert calls['journal_dir'] == 'j'
+    assert calls['resume'] is False
+    assert calls['plan'] is False
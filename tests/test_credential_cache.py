@@ -0,0 +1,70 @@
+"""登录凭据的磁盘缓存与探测"""
+
+import os
+import stat
+import time
+
+import pytest
+
+import crawler
+
+HEADERS = {'User-Agent': 'cached'}
+COOKIES = {'token': 'abc'}
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """替换探测函数，记录探测的凭据；valid 控制探测结果"""
+    state = {'valid': True, 'calls': []}
+
+    def probe(headers=None, cookies=None, timeout=10):
+        state['calls'].append((headers, cookies))
+        return state['valid']
+
+    monkeypatch.setattr(crawler, 'probe_credentials', probe)
+    return state
+
+
+def test_cached_credentials_round_trip():
+    assert crawler.load_cached_credentials() is None
+    crawler.save_cached_credentials(HEADERS, COOKIES)
+    assert crawler.load_cached_credentials() == (HEADERS, COOKIES)
+    assert stat.S_IMODE(os.stat(crawler.CREDENTIALS_FILE).st_mode) == 0o600
+
+    crawler.save_cached_credentials(HEADERS, COOKIES, expires_at=int(time.time()) - 1)
+    assert crawler.load_cached_credentials() is None
+
+    with open(crawler.CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
+        f.write('{')
+    assert crawler.load_cached_credentials() is None
+
+
+def test_valid_cache_skips_browser(probes):
+    crawler.save_cached_credentials(HEADERS, COOKIES)
+    assert crawler.get_credentials() == (HEADERS, COOKIES, True)
+    assert probes['calls'] == [(HEADERS, COOKIES)]
+    # 刚探测通过的凭据在本进程内不再重复探测
+    assert crawler.get_credentials() == (HEADERS, COOKIES, True)
+    assert len(probes['calls']) == 1
+
+
+def test_invalid_cache_falls_back_to_browser(probes, monkeypatch):
+    crawler.save_cached_credentials(HEADERS, COOKIES)
+    probes['valid'] = False
+    browser = {'User-Agent': 'browser'}, {'token': 'new'}, int(time.time()) + 100
+
+    def read_browser(user_data_dir=None, url=None, with_expiry=False):
+        probes['valid'] = True
+        return browser
+
+    monkeypatch.setattr(crawler, 'get_browser_session_cookies_and_headers', read_browser)
+    assert crawler.get_credentials() == (browser[0], browser[1], True)
+    # 浏览器读取的凭据探测通过后写入缓存
+    assert crawler.load_cached_credentials() == (browser[0], browser[1])
+
+
+def test_probe_credentials(start_server):
+    start_server(lives=5)
+    assert crawler.probe_credentials(HEADERS, COOKIES)
+    start_server(lives=5, error_rate=1.0)
+    assert not crawler.probe_credentials(HEADERS, COOKIES)
@@ -0,0 +1,95 @@
+"""登录失效检测与凭据热刷新"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    """替换从浏览器读取凭据和探测凭据的函数，记录读取次数；delay 模拟启动浏览器的耗时"""
+    calls = []
+
+    def read_browser(user_data_dir=None, url=None, with_expiry=False):
+        calls.append(time.monotonic())
+        time.sleep(fake_browser_state['delay'])
+        return {'User-Agent': f'refreshed-{len(calls)}'}, {'token': str(len(calls))}, None
+
+    fake_browser_state = {'delay': 0.0, 'calls': calls}
+    monkeypatch.setattr(crawler, 'get_browser_session_cookies_and_headers', read_browser)
+    monkeypatch.setattr(crawler, 'probe_credentials', lambda headers=None, cookies=None, timeout=10: True)
+    return fake_browser_state
+
+
+@pytest.mark.parametrize('status, j, expected', [
+    (401, None, True),
+    (403, {'errCode': 403}, True),
+    (200, {'errCode': 1, 'errMsg': '请重新登录'}, True),
+    (200, {'errCode': 1, 'errMsg': 'system busy'}, False),
+    (200, {'errCode': 0, 'errMsg': 'login ok'}, False),
+    # 网关或代理返回的不是 JSON 对象
+    (200, ['x'], False),
+    (502, 'bad gateway', False),
+])
+def test_is_auth_error(status, j, expected):
+    assert crawler.is_auth_error(status, j) is expected
+
+
+def test_concurrent_failures_refresh_once(fake_browser):
+    fake_browser['delay'] = 0.2
+    refresher = crawler.CredentialRefresher()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(refresher.refresh(0))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 8
+    assert len(fake_browser['calls']) == 1
+    assert refresher.generation == 1
+    # 已过期的代数再次失效时不重新刷新
+    assert refresher.refresh(0)
+    assert len(fake_browser['calls']) == 1
+
+
+def test_sync_session_is_not_blocked_by_refresh(fake_browser, session):
+    refresher = crawler.CredentialRefresher()
+    assert refresher.refresh(0)
+
+    fake_browser['delay'] = 0.5
+    thread = threading.Thread(target=refresher.refresh, args=(1,))
+    thread.start()
+    while not refresher._refreshing:
+        time.sleep(0.01)
+    started = time.monotonic()
+    refresher.sync_session(session)
+    assert time.monotonic() - started < 0.2
+    assert session.headers['User-Agent'] == 'refreshed-1'
+    thread.join()
+    assert refresher.generation == 2
+
+
+def test_auth_failure_mid_run_refreshes_and_resends(start_server, session, fake_browser, monkeypatch):
+    server = start_server(lives=20)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    handle = server.handle
+
+    def expiring_handle(endpoint, body):
+        # 刷新凭据之前的请求全部按登录失效处理
+        if endpoint == 'live_single_data' and not fake_browser['calls']:
+            return 401, {'errCode': 401, 'errMsg': 'unauthorized'}
+        return handle(endpoint, body)
+
+    monkeypatch.setattr(server, 'handle', expiring_handle)
+    assert crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session, workers=4,
+                                        rate_limit=0, cache_file=None, plan=False)
+
+    assert len(fake_browser['calls']) == 1
+    assert session.headers['User-Agent'] == 'refreshed-1'
+    detail = pd.read_csv('xlsx2.csv', dtype=str)
+    assert detail['reserveNoticeUserCount'].notna().all()
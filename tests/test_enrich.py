@@ -0,0 +1,42 @@
+"""合并下载接口2~5"""
+
+import pandas as pd
+
+import crawler
+
+
+def test_enrich_fetches_each_endpoint_once_per_live(start_server, session):
+    server = start_server(lives=12)
+    assert crawler.download_half_year_data(output_file='xlsx1.csv', start_date='2020-01-01', session=session)
+    live_ids = crawler.load_live_ids('xlsx1.csv')
+    server.reset_stats()
+
+    assert crawler.download_enrich_data(list_file='xlsx1.csv', detail_file='xlsx2.csv', product_file='xlsx3.csv',
+                                        ec_file='xlsx4.csv', session=session, rate_limit=0, cache_file=None,
+                                        plan=False)
+
+    # 一次遍历 liveObjectId 列表：接口2、4、5 每个直播各请求一次，接口3 每个直播至少一页
+    for api_name in ('接口2', '接口4', '接口5'):
+        assert server.stats[api_name]['requests'] == len(live_ids)
+    assert server.stats['接口3']['requests'] >= len(live_ids)
+    assert '接口1' not in server.stats
+
+    for output in ('xlsx2.csv', 'xlsx4.csv'):
+        assert pd.read_csv(output, dtype=str)['liveObjectId'].tolist() == live_ids
+    product = pd.read_csv('xlsx3.csv', dtype=str)
+    assert list(dict.fromkeys(product['liveObjectId'])) == live_ids
+
+    # 接口5的结果写回列表文件
+    listed = pd.read_csv('xlsx1.csv', dtype=str)
+    expected = [str(server.dataset.diagnostic(live_id)['newWatchPvPromotion']['value']) for live_id in live_ids]
+    assert listed['newWatchPvPromotion'].tolist() == expected
+
+
+def test_enrich_only_selected_stages(start_server, session):
+    server = start_server(lives=5)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    assert crawler.download_enrich_data(detail_file='xlsx2.csv', product_file='xlsx3.csv', ec_file='xlsx4.csv',
+                                        live_ids=live_ids, session=session, stages=['ec'], rate_limit=0,
+                                        cache_file=None, plan=False)
+    assert set(server.stats) == {'接口4'}
+    assert pd.read_csv('xlsx4.csv', dtype=str)['liveObjectId'].tolist() == live_ids
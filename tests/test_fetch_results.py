@@ -0,0 +1,59 @@
+"""并发获取结果的顺序与在途任务数"""
+
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import crawler
+
+
+def slow_double(item):
+    time.sleep(random.random() * 0.01)
+    if item == 7:
+        raise ValueError('boom')
+    return item * 2
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_iter_fetch_results_keeps_order(workers):
+    items = list(range(40))
+    results = list(crawler.iter_fetch_results(items, slow_double, workers=workers))
+    assert [item for item, _ in results] == items
+    # 抛出异常的元素结果为 None
+    assert [result for _, result in results] == [None if item == 7 else item * 2 for item in items]
+
+
+def test_iter_fetch_results_bounds_in_flight_tasks():
+    started = []
+    lock = threading.Lock()
+
+    def fetch(item):
+        with lock:
+            started.append(item)
+        return item
+
+    workers = 3
+    results = crawler.iter_fetch_results(range(100), fetch, workers=workers)
+    next(results)
+    time.sleep(0.05)
+    # 第一个结果被取走时，最多提交了 workers * 2 个任务
+    assert len(started) <= workers * 2
+    assert [item for item, _ in results] == list(range(1, 100))
+
+
+def test_iter_async_fetch_results_keeps_order():
+    pytest.importorskip('aiohttp')
+
+    async def fetch(session, item):
+        await asyncio.sleep(random.random() * 0.01)
+        if item == 5:
+            raise ValueError('boom')
+        return item * 2
+
+    items = list(range(30))
+    results = list(crawler.iter_async_fetch_results(items, fetch, concurrency=4))
+    assert [item for item, _ in results] == items
+    assert [result for _, result in results] == [None if item == 5 else item * 2 for item in items]
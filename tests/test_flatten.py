@@ -0,0 +1,67 @@
+"""批量展平与逐条展平的结果一致"""
+
+import pytest
+
+import crawler
+
+
+def flatten_one_by_one(monkeypatch, flatten_func, live_ids, responses):
+    with monkeypatch.context() as patch:
+        patch.setattr(crawler, 'BATCH_FLATTEN_FUNCS', {})
+        return crawler.flatten_batch(flatten_func, live_ids, responses)
+
+
+def as_rows(buffer):
+    return buffer.columns, list(buffer.rows(buffer.columns))
+
+
+DETAIL = [
+    {'reserveNoticeUserCount': 5, 'reserveNoticeJoinliveRatio': 0.5,
+     'sceneList': [{'scene': 1, 'reserveNoticeUserCount': 2}, {'scene': 3, 'reserveNoticeUserCount': 3}]},
+    None,
+    {'reserveNoticeUserCount': 1, 'extra': ' text '},
+]
+PRODUCT = [
+    {'spuDataList': [{'baseData': {'spuId': '1', 'stock': 3}, 'gmv': '100', 'clk_pay_ratio': '0.5'},
+                     {'baseData': {'spuId': '2'}, 'pay_pv': 2, 'newField': ' x '}]},
+    {'spuDataList': []},
+    None,
+    {'spuDataList': [{'baseData': {'spuId': '3', 'price': 10}, 'gmv': 7}]},
+]
+EC = [
+    {'exposureUv': 10, 'clickUv': 5, 'gmv': '300', 'newMetric': 1},
+    None,
+    {'payUv': 1, 'gmv': ' 2 '},
+]
+
+
+@pytest.mark.parametrize('flatten_func, responses', [
+    (crawler.flatten_live_single_data, DETAIL),
+    (crawler.flatten_spu_data, PRODUCT),
+    (crawler.flatten_ec_summary, EC),
+], ids=['detail', 'product', 'ec'])
+def test_batch_flatten_matches_per_record(monkeypatch, flatten_func, responses):
+    live_ids = [str(index) for index in range(len(responses))]
+    batch = crawler.flatten_batch(flatten_func, live_ids, responses)
+    assert as_rows(batch) == as_rows(flatten_one_by_one(monkeypatch, flatten_func, live_ids, responses))
+
+
+def test_record_sink_output_matches_per_record(monkeypatch):
+    live_ids = [str(index) for index in range(len(PRODUCT))]
+    schema = crawler.RECORD_SCHEMAS['product']
+
+    sink = crawler.RecordSink('batch.csv', '商品', schema=schema, flatten_func=crawler.flatten_spu_data,
+                              batch_size=2)
+    for live_id, data in zip(live_ids, PRODUCT):
+        sink.append_response(live_id, data)
+    assert sink.close()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(crawler, 'BATCH_FLATTEN_FUNCS', {})
+        sink = crawler.RecordSink('single.csv', '商品', schema=schema, flatten_func=crawler.flatten_spu_data)
+        for live_id, data in zip(live_ids, PRODUCT):
+            sink.append_response(live_id, data)
+        assert sink.close()
+
+    with open('batch.csv', encoding='utf-8-sig') as batch, open('single.csv', encoding='utf-8-sig') as single:
+        assert batch.read() == single.read()
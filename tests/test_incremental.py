@@ -0,0 +1,54 @@
+"""增量同步"""
+
+import os
+
+import pandas as pd
+
+import crawler
+
+
+def sync(session, **kwargs):
+    return crawler.download_incremental_data(
+        list_file='xlsx1.csv', detail_file='xlsx2.csv', product_file='xlsx3.csv', ec_file='xlsx4.csv',
+        start_date='2020-01-01', session=session, workers=4, rate_limit=0, cache_file=None, plan=False, **kwargs
+    )
+
+
+def test_incremental_sync_does_not_touch_enrich_journals(start_server, session):
+    server = start_server(lives=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    # 被中断的普通下载留下的日志
+    interrupted = crawler.CheckpointJournal('detail')
+    interrupted.append(live_ids[0], {'reserveNoticeUserCount': -1})
+    interrupted.close()
+
+    assert sync(session)
+
+    detail = pd.read_csv('xlsx2.csv', dtype={'liveObjectId': str}).set_index('liveObjectId')
+    expected = server.dataset.single_data(live_ids[0])['reserveNoticeUserCount']
+    assert detail.loc[live_ids[0], 'reserveNoticeUserCount'] == expected
+    assert server.stats['接口2']['requests'] == len(live_ids)
+    assert crawler.CheckpointJournal('detail').completed[live_ids[0]] == {'reserveNoticeUserCount': -1}
+
+
+def test_incremental_sync_resumes_its_own_journal(start_server, session):
+    server = start_server(lives=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    journal = crawler.CheckpointJournal(crawler.INCREMENTAL_JOURNAL_PREFIX + 'detail', 'journal')
+    journal.append(live_ids[0], {'reserveNoticeUserCount': 7})
+    journal.close()
+
+    assert sync(session, journal_dir='journal')
+    detail = pd.read_csv('xlsx2.csv', dtype={'liveObjectId': str}).set_index('liveObjectId')
+    assert detail.loc[live_ids[0], 'reserveNoticeUserCount'] == 7
+    assert server.stats['接口2']['requests'] == len(live_ids) - 1
+    assert not os.path.exists(journal.path)
+
+    # 增量同步不续传时丢弃自己的日志重新请求
+    journal = crawler.CheckpointJournal(crawler.INCREMENTAL_JOURNAL_PREFIX + 'detail', 'journal')
+    journal.append(live_ids[0], {'reserveNoticeUserCount': 7})
+    journal.close()
+    os.remove(crawler.SYNC_STATE_FILE)
+    assert sync(session, journal_dir='journal', resume=False)
+    detail = pd.read_csv('xlsx2.csv', dtype={'liveObjectId': str}).set_index('liveObjectId')
+    assert detail.loc[live_ids[0], 'reserveNoticeUserCount'] != 7
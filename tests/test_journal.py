@@ -0,0 +1,88 @@
+"""断点续传日志"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+def test_journal_resume_reads_completed_entries():
+    journal = crawler.CheckpointJournal('detail', 'journal')
+    journal.append('1', {'value': 1})
+    journal.append('2', {'value': 2})
+    journal.append('1', {'value': 3})
+    journal.close()
+    # 中断时写了一半的最后一行
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"liveObjectId": "4", "da')
+
+    resumed = crawler.CheckpointJournal('detail', 'journal')
+    assert sorted(resumed.completed) == ['1', '2']
+    assert resumed.completed['1'] == {'value': 3}
+    assert resumed.completed['2'] == {'value': 2}
+    resumed.clear()
+    assert not os.path.exists(journal.path)
+
+
+@pytest.mark.parametrize('tail', ['{"liveObjectId": "2", "da', '{"liveObjectId": "2", "data": 2}'])
+def test_append_after_torn_line_starts_a_new_line(tail):
+    journal = crawler.CheckpointJournal('detail', 'journal')
+    journal.append('1', {'value': 1})
+    journal.close()
+    # 最后一行写了一半，或写完了内容但还没写换行符
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write(tail)
+
+    resumed = crawler.CheckpointJournal('detail', 'journal')
+    resumed.append('3', {'value': 3})
+    resumed.close()
+
+    reloaded = crawler.CheckpointJournal('detail', 'journal')
+    assert reloaded.completed['3'] == {'value': 3}
+    assert reloaded.completed['1'] == {'value': 1}
+    assert ('2' in reloaded.completed) == tail.endswith('}')
+    reloaded.clear()
+
+
+def test_journal_without_resume_starts_over():
+    journal = crawler.CheckpointJournal('detail', 'journal')
+    journal.append('1', {'value': 1})
+    journal.close()
+
+    assert len(crawler.CheckpointJournal('detail', 'journal', resume=False).completed) == 0
+    assert not os.path.exists(journal.path)
+
+
+def test_interrupted_download_resumes_from_journal(start_server, session, monkeypatch):
+    server = start_server(lives=30)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    options = dict(output_file='xlsx2.csv', live_ids=live_ids, session=session, workers=4, rate_limit=0,
+                   cache_file=None, plan=False)
+
+    update = crawler.ProgressView.update
+    processed = []
+
+    def interrupt_after_10(self, *args, **kwargs):
+        processed.append(None)
+        if len(processed) == 10:
+            raise KeyboardInterrupt
+        return update(self, *args, **kwargs)
+
+    monkeypatch.setattr(crawler.ProgressView, 'update', interrupt_after_10)
+    with pytest.raises(KeyboardInterrupt):
+        crawler.download_detail_data(**options)
+    monkeypatch.setattr(crawler.ProgressView, 'update', update)
+
+    journaled = len(crawler.CheckpointJournal('detail').completed)
+    assert journaled >= 10
+    requests_before = server.stats['接口2']['requests']
+
+    assert crawler.download_detail_data(**options)
+    # 日志中已完成的直播不再请求
+    assert server.stats['接口2']['requests'] - requests_before == len(live_ids) - journaled
+    detail = pd.read_csv('xlsx2.csv', dtype={'liveObjectId': str})
+    assert detail['liveObjectId'].tolist() == live_ids
+    assert detail['reserveNoticeUserCount'].notna().all()
+    assert not os.path.exists(os.path.join(crawler.JOURNAL_DIR, 'detail.jsonl'))
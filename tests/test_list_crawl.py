@@ -0,0 +1,53 @@
+"""列表数据（接口1）：分页并发获取、按时间窗口获取，以及下载不完整时不覆盖已有文件"""
+
+import os
+
+import pytest
+
+import crawler
+
+
+def download_list(session, list_mode='page', **kwargs):
+    return crawler.download_half_year_data(output_file='xlsx1.xlsx', start_date='2020-01-01', session=session,
+                                           return_ids=True, rate_limit=0, workers=4, page_size=10,
+                                           list_mode=list_mode, **kwargs)
+
+
+@pytest.mark.parametrize('list_mode', ['page', 'window'])
+def test_list_pages_are_merged_in_order(start_server, session, list_mode):
+    server = start_server(lives=95)
+    live_ids = download_list(session, list_mode)
+
+    # 模拟数据集中的直播按开播时间从新到旧排列，与接口返回的顺序一致
+    assert live_ids == [live_id for live_id, _ in server.dataset.lives]
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
+
+
+def test_failed_first_page_keeps_existing_list(start_server, session):
+    start_server(lives=120)
+    live_ids = download_list(session)
+    list_mtime = os.path.getmtime('xlsx1.xlsx')
+
+    # 所有请求都返回错误：第 1 页下载失败，本次下载失败，已有的列表文件和索引保持不变
+    start_server(lives=120, error_rate=1.0)
+    assert download_list(session) is None
+    assert os.path.getmtime('xlsx1.xlsx') == list_mtime
+    assert not os.path.exists('xlsx1.xlsx.partial.jsonl')
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
+
+
+def test_failed_later_page_keeps_existing_list(start_server, session, monkeypatch):
+    start_server(lives=120)
+    live_ids = download_list(session)
+
+    fetch_live_data = crawler.fetch_live_data
+
+    def fail_page_3(*args, **kwargs):
+        if kwargs.get('current_page') == 3:
+            return None
+        return fetch_live_data(*args, **kwargs)
+
+    monkeypatch.setattr(crawler, 'fetch_live_data', fail_page_3)
+    start_server(lives=150)
+    assert download_list(session) is None
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
@@ -0,0 +1,52 @@
+"""列表数据（接口1）按开播时间窗口分片获取"""
+
+import crawler
+
+DAY = 86400
+
+
+def test_split_time_windows():
+    windows = crawler.split_time_windows(0, 10 * DAY - 1, 4 * DAY)
+    assert windows == [(6 * DAY, 10 * DAY - 1), (2 * DAY, 6 * DAY - 1), (0, 2 * DAY - 1)]
+    # 闭区间首尾相接
+    assert crawler.split_time_windows(5, 5, DAY) == [(5, 5)]
+
+
+def fetch_by_window(session, server, **kwargs):
+    start_time = min(start_time for _, start_time in server.dataset.lives)
+    end_time = max(start_time for _, start_time in server.dataset.lives)
+    records, complete = crawler.fetch_live_list_records_by_window(start_time, end_time, session=session,
+                                                                  rate_limit=0, workers=4, **kwargs)
+    assert complete
+    return [record['liveObjectId'] for record in records]
+
+
+def test_windows_are_split_until_they_fit_one_page(start_server, session):
+    server = start_server(lives=200)
+    live_ids = fetch_by_window(session, server, page_size=10, min_window_seconds=60)
+    assert live_ids == [live_id for live_id, _ in server.dataset.lives]
+    # 拆分后的窗口不再分页
+    assert server.stats['接口1']['requests'] > 200 // 10
+
+
+def test_short_windows_are_paged(start_server, session):
+    server = start_server(lives=50)
+    # 窗口不拆分时在窗口内分页
+    live_ids = fetch_by_window(session, server, page_size=10, window_days=1000, min_window_seconds=1000 * DAY)
+    assert live_ids == [live_id for live_id, _ in server.dataset.lives]
+    assert server.stats['接口1']['requests'] == 5
+
+
+def test_duplicates_across_windows_are_dropped():
+    pages = []
+
+    def fetch_func(page_size, current_page, start_time, end_time, headers=None, cookies=None, session=None):
+        pages.append((start_time, end_time))
+        # 每个窗口都返回同一个直播，以及一个窗口内独有的直播
+        return {'liveObjectList': [{'liveObjectId': 'same'}, {'liveObjectId': str(start_time)}], 'totalLiveCount': 2}
+
+    records, complete = crawler.fetch_live_list_records_by_window(
+        0, 3 * DAY - 1, fetch_func=fetch_func, flatten_func=dict, rate_limit=0, window_days=1)
+    assert complete
+    assert len(pages) == 3
+    assert [record['liveObjectId'] for record in records] == ['same', str(2 * DAY), str(DAY), '0']
@@ -0,0 +1,49 @@
+"""liveObjectId 索引文件（接口1 的输出旁的 *.ids.tsv）"""
+
+import os
+
+import crawler
+
+
+def download_list(session, **kwargs):
+    kwargs.setdefault('start_date', '2020-01-01')
+    return crawler.download_half_year_data(output_file='xlsx1.xlsx', session=session, return_ids=True,
+                                           rate_limit=0, **kwargs)
+
+
+def test_list_download_writes_index(start_server, session):
+    start_server(lives=120)
+    live_ids = download_list(session)
+
+    assert len(live_ids) == 120
+    assert os.path.exists(crawler.live_id_index_path('xlsx1.xlsx'))
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
+
+
+def test_empty_list_run_keeps_existing_index(start_server, session):
+    start_server(lives=120)
+    live_ids = download_list(session)
+
+    # 时间范围内没有直播：不写出记录，已有的列表文件和索引都保持不变
+    assert download_list(session, start_date='2000-01-01', end_date='2000-01-02') == []
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
+
+
+def test_empty_index_falls_back_to_list_file(start_server, session):
+    start_server(lives=120)
+    live_ids = download_list(session)
+
+    crawler.write_live_id_index('xlsx1.xlsx', [])
+    assert crawler.read_live_id_index('xlsx1.xlsx') is None
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
+
+
+def test_stale_index_falls_back_to_list_file(start_server, session):
+    start_server(lives=120)
+    live_ids = download_list(session)
+
+    index_file = crawler.live_id_index_path('xlsx1.xlsx')
+    crawler.write_live_id_index('xlsx1.xlsx', [{'liveObjectId': 'stale'}])
+    list_mtime = os.path.getmtime('xlsx1.xlsx')
+    os.utime(index_file, (list_mtime - 10, list_mtime - 10))
+    assert crawler.load_live_ids('xlsx1.xlsx') == live_ids
@@ -0,0 +1,82 @@
+"""运行指标与运行报告"""
+
+import json
+import threading
+
+import crawler
+
+
+def test_endpoint_stats_and_latency_percentiles():
+    metrics = crawler.RunMetrics()
+    for i in range(1, 101):
+        metrics.observe_request('接口2', i / 1000, status=200, err_code=0, succeeded=True)
+    metrics.observe_request('接口2', 2.0, status=None)
+    metrics.observe_request('接口2', 0.5, status=200, err_code=-1)
+    metrics.record_retry('接口2')
+    metrics.record_skipped('接口3', 4)
+
+    endpoints = metrics.summary()['endpoints']
+    stats = endpoints['接口2']
+    assert (stats['requests'], stats['succeeded'], stats['failed'], stats['retries']) == (102, 100, 2, 1)
+    assert stats['http_status'] == {'200': 101, 'no_response': 1}
+    assert stats['err_codes'] == {'0': 100, '-1': 1}
+    latency = stats['latency_seconds']
+    assert latency['p50'] == 0.051
+    assert latency['max'] == 2.0
+    assert endpoints['接口3']['skipped'] == 4
+    assert endpoints['接口3']['latency_seconds']['p50'] is None
+
+
+def test_nested_phase_is_timed_once():
+    metrics = crawler.RunMetrics()
+    with metrics.phase('save'):
+        with metrics.phase('save'):
+            pass
+        with metrics.phase('flatten'):
+            pass
+
+    phases = metrics.summary()['phases']
+    assert phases['save']['count'] == 1
+    assert phases['flatten']['count'] == 1
+
+    # 其他线程中的同名阶段另外计时
+    def save():
+        with metrics.phase('save'):
+            pass
+
+    with metrics.phase('save'):
+        thread = threading.Thread(target=save)
+        thread.start()
+        thread.join()
+    assert metrics.summary()['phases']['save']['count'] == 3
+
+
+def test_write_report():
+    metrics = crawler.RunMetrics()
+    metrics.observe_request('接口2', 0.1, status=200, err_code=0, succeeded=True)
+    with metrics.phase('fetch'):
+        pass
+    metrics.write_report('report.json', 'metrics.prom')
+
+    with open('report.json', encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['endpoints']['接口2']['requests'] == 1
+    assert 'fetch' in report['phases']
+    with open('metrics.prom', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert 'crawler_requests_total{endpoint="接口2"} 1' in lines
+    assert 'crawler_http_responses_total{endpoint="接口2",status="200"} 1' in lines
+    assert 'crawler_request_latency_seconds{endpoint="接口2",quantile="p50"} 0.100000' in lines
+    assert any(line.startswith('crawler_phase_seconds{phase="fetch"} ') for line in lines)
+
+
+def test_downloads_are_measured(start_server, session, monkeypatch):
+    metrics = crawler.RunMetrics()
+    monkeypatch.setattr(crawler, 'METRICS', metrics)
+    server = start_server(lives=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    assert crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session, workers=2,
+                                        rate_limit=0, cache_file=None, plan=False)
+    stats = metrics.summary()['endpoints']['接口2']
+    assert stats['requests'] == stats['succeeded'] == server.stats['接口2']['requests'] == 10
+    assert stats['http_status'] == {'200': 10}
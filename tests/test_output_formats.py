@@ -0,0 +1,51 @@
+"""按扩展名选择的输出格式：xlsx、parquet、csv"""
+
+import pytest
+
+import crawler
+
+RECORDS = [
+    {'liveObjectId': '12345678901234567890', 'name': '直播A', 'gmv': '100', 'ratio': '0.5'},
+    {'liveObjectId': '2', 'name': 'B', 'gmv': '7', 'ratio': ''},
+]
+COLUMNS = ['liveObjectId', 'name', 'gmv', 'ratio']
+
+
+def test_output_format_by_extension():
+    assert crawler.get_output_format('a/out.parquet') == 'parquet'
+    assert crawler.get_output_format('out.CSV') == 'csv'
+    assert crawler.get_output_format('out.xlsx') == 'xlsx'
+    assert crawler.get_output_format('out.txt') == 'xlsx'
+    assert crawler.with_output_format('a/out.xlsx', 'parquet') == 'a/out.parquet'
+    assert crawler.with_output_format('a/out.xlsx') == 'a/out.xlsx'
+    with pytest.raises(ValueError):
+        crawler.with_output_format('out.xlsx', 'json')
+
+
+@pytest.mark.parametrize('output_format', crawler.OUTPUT_FORMATS)
+def test_round_trip(output_format):
+    output_file = 'out.' + output_format
+    assert crawler.write_records(output_file, iter(RECORDS), COLUMNS, 'Sheet') == len(RECORDS)
+    assert crawler.read_table_columns(output_file) == COLUMNS
+    df = crawler.read_records_table(output_file)
+    assert list(df['liveObjectId']) == ['12345678901234567890', '2']
+    assert list(df['name']) == ['直播A', 'B']
+
+
+def test_parquet_keeps_numbers_numeric_and_ids_text():
+    import pyarrow.parquet as pq
+
+    crawler.write_records('out.parquet', iter(RECORDS), COLUMNS, 'Sheet')
+    schema = pq.read_schema('out.parquet')
+    assert str(schema.field('liveObjectId').type) == 'string'
+    assert str(schema.field('name').type) == 'string'
+    assert str(schema.field('gmv').type) == 'int64'
+    assert str(schema.field('ratio').type) == 'double'
+
+
+def test_export_to_excel():
+    crawler.write_records('out.parquet', iter(RECORDS), COLUMNS, 'Sheet')
+    assert crawler.export_to_excel('out.parquet')
+    df = crawler.read_records_table('out.xlsx')
+    assert list(df.columns) == COLUMNS
+    assert list(df['liveObjectId']) == ['12345678901234567890', '2']
@@ -0,0 +1,65 @@
+"""按列表数据预先跳过无成交直播的请求"""
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('0', False),
+    ('0.0', False),
+    ('100', True),
+    (None, True),
+    ('', True),
+    ('n/a', True),
+])
+def test_live_has_sales(value, expected):
+    assert crawler.live_has_sales({'liveObjectId': '1', 'payedGmv': value}) is expected
+
+
+def test_lives_without_sales_skip_product_and_ec(start_server, session, monkeypatch):
+    metrics = crawler.RunMetrics()
+    monkeypatch.setattr(crawler, 'METRICS', metrics)
+    server = start_server(lives=30)
+    assert crawler.download_half_year_data(output_file='xlsx1.csv', start_date='2020-01-01', session=session)
+    live_ids = crawler.load_live_ids('xlsx1.csv')
+    no_sales = {live_id for live_id, start_time in server.dataset.lives
+                if server.dataset.live_object(live_id, start_time)['payedGmv'] == '0'}
+    assert 0 < len(no_sales) < len(live_ids)
+    server.reset_stats()
+
+    assert crawler.download_enrich_data(list_file='xlsx1.csv', detail_file='xlsx2.csv', product_file='xlsx3.csv',
+                                        ec_file='xlsx4.csv', session=session, rate_limit=0, cache_file=None)
+
+    # 接口2、5 照常请求，接口4 只请求有成交的直播
+    assert server.stats['接口2']['requests'] == server.stats['接口5']['requests'] == len(live_ids)
+    assert server.stats['接口4']['requests'] == len(live_ids) - len(no_sales)
+    endpoints = metrics.summary()['endpoints']
+    assert endpoints['接口3']['skipped'] == endpoints['接口4']['skipped'] == len(no_sales)
+
+    # 跳过的直播写入只有 liveObjectId 的占位记录
+    ec = pd.read_csv('xlsx4.csv', dtype=str)
+    assert ec['liveObjectId'].tolist() == live_ids
+    skipped_rows = ec[ec['liveObjectId'].isin(no_sales)].drop(columns='liveObjectId')
+    assert skipped_rows.isna().all().all()
+    product = pd.read_csv('xlsx3.csv', dtype=str)
+    assert list(dict.fromkeys(product['liveObjectId'])) == live_ids
+    assert (product['liveObjectId'].isin(no_sales)).sum() == len(no_sales)
+
+
+@pytest.mark.parametrize('plan', [True, False])
+def test_single_stage_download_plan(start_server, session, plan):
+    server = start_server(lives=30)
+    assert crawler.download_half_year_data(output_file='xlsx1.csv', start_date='2020-01-01', session=session)
+    live_ids = crawler.load_live_ids('xlsx1.csv')
+    no_sales = [live_id for live_id, start_time in server.dataset.lives
+                if server.dataset.live_object(live_id, start_time)['payedGmv'] == '0']
+    server.reset_stats()
+
+    assert crawler.download_ec_summary(output_file='xlsx4.csv', list_file='xlsx1.csv', session=session,
+                                       rate_limit=0, cache_file=None, plan=plan)
+    # plan=False 时不跳过任何请求
+    expected = len(live_ids) - len(no_sales) if plan else len(live_ids)
+    assert server.stats['接口4']['requests'] == expected
+    assert pd.read_csv('xlsx4.csv', dtype=str)['liveObjectId'].tolist() == live_ids
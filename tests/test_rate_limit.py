@@ -0,0 +1,123 @@
+"""限速：所有请求（含接口3的分页请求）的速率不超过 rate_limit"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+def observed_requests(server, api_name):
+    return server.stats.get(api_name, {}).get('requests', 0)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = crawler.RateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.45
+
+
+def test_unlimited_rate_does_not_wait():
+    limiter = crawler.RateLimiter(rate=0)
+    assert all(limiter.reserve() == 0 for _ in range(100))
+
+
+def test_adaptive_rate_never_exceeds_rate_limit():
+    limiter = crawler.RateController().limiter('接口2', rate=3)
+    for _ in range(1000):
+        limiter.on_success()
+    assert limiter.rate == 3
+
+
+def test_endpoint_max_rate_caps_rate_limit():
+    limiter = crawler.RateController().limiter('接口1', rate=100)
+    assert limiter.rate == crawler.ENDPOINT_MAX_RATES['接口1']
+
+
+def test_adaptive_rate_backs_off_and_recovers_to_rate_limit():
+    controller = crawler.RateController()
+    limiter = controller.limiter('接口2', rate=4)
+    controller.report('接口2', False)
+    assert limiter.rate == 2
+    for _ in range(100):
+        controller.report('接口2', True)
+    assert limiter.rate == 4
+
+
+def test_later_stage_lowers_ceiling_and_keeps_reduced_rate():
+    controller = crawler.RateController()
+    limiter = controller.limiter('接口2', rate=8)
+    controller.report('接口2', False)
+    assert controller.limiter('接口2', rate=6) is limiter
+    assert (limiter.rate, limiter.max_rate) == (4, 6)
+    assert controller.limiter('接口2', rate=2).rate == 2
+
+
+@pytest.mark.parametrize('transport', ['thread', 'async'])
+@pytest.mark.parametrize('adaptive', [False, True])
+def test_spu_pages_respect_rate_limit(start_server, session, monkeypatch, transport, adaptive):
+    monkeypatch.setattr(crawler, 'ADAPTIVE_RATE_CONTROL', adaptive)
+    server = start_server(lives=8)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    rate_limit = 5
+
+    started = time.monotonic()
+    assert crawler.download_product_data(output_file='p.csv', live_ids=live_ids, session=session, workers=4,
+                                         rate_limit=rate_limit, transport=transport, cache_file=None, plan=False)
+    elapsed = time.monotonic() - started
+
+    requests = observed_requests(server, '接口3')
+    # 有商品超过一页的直播，分页请求确实发生了
+    assert requests > len(live_ids)
+    # 令牌桶容量为 1：第一个请求不等待，之后每个请求间隔 1/rate_limit 秒
+    assert (requests - 1) / elapsed <= rate_limit * 1.05
+
+
+def test_throttled_server_slows_down_and_completes(start_server, session, monkeypatch):
+    monkeypatch.setattr(crawler, 'RETRY_BACKOFF_BASE', 0.5)
+    monkeypatch.setitem(crawler.ENDPOINT_MAX_RATES, '接口2', 100.0)
+    server = start_server(lives=30, throttle=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    rate_limit = 40
+
+    assert crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session, workers=4,
+                                        rate_limit=rate_limit, cache_file=None, plan=False)
+    # 收到 429 后降低速率并退避重试，限流的请求只占一小部分
+    stats = server.stats['接口2']
+    assert 0 < stats['throttled'] < len(live_ids)
+    assert crawler.RATE_CONTROLLER.rates()['接口2'] < rate_limit
+    # 重试后仍失败的直播记入失败记录，其余全部获取成功
+    detail = pd.read_csv('xlsx2.csv', dtype={'liveObjectId': str}).set_index('liveObjectId')
+    missing = detail.index[detail['reserveNoticeUserCount'].isna()].tolist()
+    assert crawler.DeadLetterQueue().ids('detail') == missing
+    assert len(missing) <= 1
+
+
+def test_spu_pages_stay_within_worker_connections(start_server, session, monkeypatch):
+    server = start_server(lives=8, latency=0.02)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    handle = server.handle
+    in_flight = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def counting_handle(endpoint, body):
+        with lock:
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        try:
+            return handle(endpoint, body)
+        finally:
+            with lock:
+                in_flight['now'] -= 1
+
+    monkeypatch.setattr(server, 'handle', counting_handle)
+    workers = 2
+    assert crawler.download_product_data(output_file='p.csv', live_ids=live_ids, session=session, workers=workers,
+                                         rate_limit=0, cache_file=None, plan=False)
+    # 分页请求在工作线程中依次发送，同时在途的请求数不超过工作线程数（即会话连接池的大小）
+    assert observed_requests(server, '接口3') > len(live_ids)
+    assert in_flight['max'] <= workers
@@ -0,0 +1,65 @@
+"""流式输出：追加的记录在结束时一次性写出，合并时只替换对应的行"""
+
+import os
+
+import pandas as pd
+
+import crawler
+
+
+def read_rows(file_path):
+    df = crawler.read_records_table(file_path)
+    return [{key: None if pd.isna(value) else value for key, value in row.items()} for row in df.to_dict('records')]
+
+
+def test_appended_records_are_written_on_close():
+    sink = crawler.RecordSink('out.xlsx', 'Sheet')
+    sink.append({'liveObjectId': 1, 'a': 'x'})
+    sink.extend({'liveObjectId': i, 'b': str(i)} for i in range(2, 50))
+    sink.flush()
+    assert os.path.exists(sink.partial_file)
+    assert not os.path.exists('out.xlsx')
+
+    assert sink.close(silent=True)
+    assert len(sink) == 49
+    assert not os.path.exists(sink.partial_file)
+    rows = read_rows('out.xlsx')
+    assert [row['liveObjectId'] for row in rows] == [str(i) for i in range(1, 50)]
+    assert rows[0] == {'liveObjectId': '1', 'a': 'x', 'b': None}
+    assert rows[-1] == {'liveObjectId': '49', 'a': None, 'b': '49'}
+
+
+def test_discard_keeps_existing_output():
+    sink = crawler.RecordSink('out.csv', 'Sheet')
+    sink.append({'liveObjectId': 'old', 'a': '1'})
+    assert sink.close(silent=True)
+
+    sink = crawler.RecordSink('out.csv', 'Sheet')
+    sink.append({'liveObjectId': 'new', 'a': '2'})
+    sink.discard()
+    assert not os.path.exists(sink.partial_file)
+    assert read_rows('out.csv') == [{'liveObjectId': 'old', 'a': '1'}]
+
+
+def test_merge_replaces_matching_rows():
+    sink = crawler.RecordSink('out.csv', 'Sheet')
+    sink.extend({'liveObjectId': live_id, 'a': 'old'} for live_id in ('1', '2', '3'))
+    assert sink.close(silent=True)
+
+    sink = crawler.RecordSink('out.csv', 'Sheet', merge_ids=['2', '4'])
+    sink.append({'liveObjectId': '2', 'a': 'new', 'b': 'x'})
+    sink.append({'liveObjectId': '4', 'a': 'new'})
+    assert sink.close(silent=True)
+    rows = {row['liveObjectId']: row for row in read_rows('out.csv')}
+    assert sorted(rows) == ['1', '2', '3', '4']
+    assert rows['2'] == {'liveObjectId': '2', 'a': 'new', 'b': 'x'}
+    assert rows['1']['a'] == rows['3']['a'] == 'old'
+
+    # patch 模式下新记录放在被替换行的原位置
+    sink = crawler.RecordSink('out.csv', 'Sheet', merge_ids=['3'], patch=True)
+    sink.append({'liveObjectId': '3', 'a': 'patched'})
+    assert sink.close(silent=True)
+    rows = read_rows('out.csv')
+    ids = [row['liveObjectId'] for row in rows]
+    assert ids.index('3') == ids.index('1') + 1
+    assert rows[ids.index('3')]['a'] == 'patched'
@@ -0,0 +1,84 @@
+"""原始响应归档与离线重放"""
+
+import inspect
+import os
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+@pytest.fixture
+def archive(monkeypatch):
+    """启用归档，写入到当前目录下的 archive 目录"""
+    response_archive = crawler.ResponseArchive(archive_dir='archive', enabled=True)
+    monkeypatch.setattr(crawler, 'RESPONSE_ARCHIVE', response_archive)
+    yield response_archive
+    response_archive.close()
+
+
+def read_output(path):
+    if path.endswith('.xlsx'):
+        return pd.read_excel(path, dtype=str)
+    return pd.read_csv(path, dtype=str)
+
+
+def test_replay_reproduces_downloaded_outputs(start_server, session, archive):
+    start_server(lives=30)
+    live_ids = crawler.download_half_year_data(output_file='xlsx1.xlsx', session=session, return_ids=True,
+                                               page_size=10)
+    assert crawler.download_enrich_data(list_file='xlsx1.xlsx', detail_file='xlsx2.csv', product_file='xlsx3.csv',
+                                        ec_file='xlsx4.csv', live_ids=live_ids, session=session, workers=4,
+                                        rate_limit=0, cache_file=None, plan=False, backup=False)
+    archive.close()
+
+    assert crawler.replay_archive(archive_dir='archive', list_file='replay1.xlsx', detail_file='replay2.csv',
+                                  product_file='replay3.csv', ec_file='replay4.csv')
+    for downloaded, replayed in (('xlsx1.xlsx', 'replay1.xlsx'), ('xlsx2.csv', 'replay2.csv'),
+                                 ('xlsx3.csv', 'replay3.csv'), ('xlsx4.csv', 'replay4.csv')):
+        pd.testing.assert_frame_equal(read_output(replayed), read_output(downloaded))
+
+
+def test_replay_only_selected_stages(start_server, session, archive):
+    start_server(lives=5)
+    crawler.download_half_year_data(output_file='xlsx1.xlsx', session=session)
+    archive.close()
+
+    assert crawler.replay_archive(archive_dir='archive', list_file='replay1.csv', detail_file='replay2.csv',
+                                  stages=['list'])
+    assert os.path.exists('replay1.csv')
+    assert not os.path.exists('replay2.csv')
+    assert len(read_output('replay1.csv')) == 5
+
+
+def spu_page(count, offset=0, total=None):
+    page = {'spuDataList': [{'spuId': str(offset + i)} for i in range(count)]}
+    if total is not None:
+        page['totalCount'] = total
+    return page
+
+
+def test_load_archived_responses_streams_merged_responses(archive):
+    size = crawler.SPU_PAGE_SIZE
+    record = archive.record
+    record('接口1', '', {}, {'liveObjectList': [{'liveObjectId': '1'}, {'liveObjectId': '2'}]})
+    record('接口2', '', {'liveObjectId': '1'}, {'reserveNoticeUserCount': 3})
+    # 直播 1：带总数的两页
+    record('接口3', '', {'liveObjectId': '1', 'offset': 0}, spu_page(size, total=size + 2))
+    record('接口3', '', {'liveObjectId': '1', 'offset': size}, spu_page(2, offset=size, total=size + 2))
+    # 直播 2：没有总数，逐页请求到不满一页为止
+    record('接口3', '', {'liveObjectId': '2', 'offset': 0}, spu_page(size))
+    record('接口3', '', {'liveObjectId': '2', 'offset': size}, spu_page(1, offset=size))
+    # 直播 1 重新获取时只拿到了第1页，不覆盖之前完整的数据
+    record('接口3', '', {'liveObjectId': '1', 'offset': 0}, spu_page(size, total=size * 3))
+    archive.close()
+
+    responses = crawler.load_archived_responses('archive')
+    assert inspect.isgenerator(responses)
+    responses = list(responses)
+    assert [(key, live_id) for key, live_id, _ in responses] == [
+        ('list', '1'), ('list', '2'), ('detail', '1'), ('product', '1'), ('product', '2')]
+    products = {live_id: data for key, live_id, data in responses if key == 'product'}
+    assert len(products['1']['spuDataList']) == size + 2
+    assert len(products['2']['spuDataList']) == size + 1
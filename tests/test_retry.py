@@ -0,0 +1,102 @@
+"""重试与失败记录：限流信号的判断、失败记录的写入与单独重试"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import crawler
+
+
+@pytest.mark.parametrize('status, j, data, expected', [
+    (200, {'errCode': 0, 'data': {}}, {}, True),
+    (None, None, None, False),                                   # 超时、连接失败
+    (429, {'errCode': -1}, None, False),
+    (502, None, None, False),
+    (200, {'errCode': 1, 'errMsg': 'system busy'}, None, False),
+    (200, {'errCode': 45009, 'errMsg': ''}, None, False),
+    (200, {'errCode': 300001, 'errMsg': 'invalid param'}, None, None),
+    (400, {'errCode': 400, 'errMsg': 'bad request'}, None, None),
+])
+def test_rate_feedback(status, j, data, expected):
+    assert crawler._rate_feedback(status, j, data) is expected
+
+
+@pytest.mark.parametrize('j, expected', [
+    ({'errCode': 1, 'errMsg': '系统繁忙'}, True),
+    ({'errCode': 45011, 'errMsg': ''}, True),
+    ({'errCode': 300001, 'errMsg': 'invalid param'}, False),
+    ({'errCode': 0, 'errMsg': 'busy'}, False),
+    (None, False),
+    (['x'], False),                                              # 网关或代理返回的不是 JSON 对象
+    ('too many requests', False),
+])
+def test_is_busy_error(j, expected):
+    assert crawler.is_busy_error(j) is expected
+
+
+def fail_endpoint(monkeypatch, server, endpoint, reply, live_ids=None):
+    """让模拟服务器的某个接口对 live_ids（为 None 时为全部直播）总是返回 reply"""
+    handle = server.handle
+
+    def failing_handle(name, body):
+        if name == endpoint and (live_ids is None or str(body.get('liveObjectId')) in live_ids):
+            server._count('failing', 'requests')
+            return reply
+        return handle(name, body)
+
+    monkeypatch.setattr(server, 'handle', failing_handle)
+
+
+def download_detail(session, live_ids):
+    return crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session,
+                                        rate_limit=0, cache_file=None, plan=False)
+
+
+def test_business_error_is_not_retried_and_goes_to_dead_letters(start_server, session, monkeypatch):
+    server = start_server(lives=5)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    fail_endpoint(monkeypatch, server, 'live_single_data', (200, {'errCode': 300001, 'errMsg': 'invalid param'}))
+
+    assert download_detail(session, live_ids)
+    assert server.stats['failing']['requests'] == len(live_ids)
+    assert crawler.DeadLetterQueue(crawler.JOURNAL_DIR).ids('detail') == live_ids
+
+
+def test_busy_error_is_retried(start_server, session, monkeypatch):
+    server = start_server(lives=3)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    fail_endpoint(monkeypatch, server, 'live_single_data', (200, {'errCode': 1, 'errMsg': 'system busy'}))
+
+    assert download_detail(session, live_ids)
+    assert server.stats['failing']['requests'] == len(live_ids) * (1 + crawler.MAX_RETRIES)
+    assert crawler.DeadLetterQueue(crawler.JOURNAL_DIR).ids('detail') == live_ids
+
+
+def test_retry_dead_letters_fills_failed_rows(start_server, session, monkeypatch):
+    server = start_server(lives=20)
+    assert crawler.download_half_year_data(output_file='xlsx1.csv', start_date='2020-01-01', session=session,
+                                           rate_limit=0)
+    live_ids = crawler.load_live_ids('xlsx1.csv')
+
+    handle = server.handle
+    fail_endpoint(monkeypatch, server, 'live_single_data', (200, {'errCode': 300001, 'errMsg': 'invalid param'}),
+                  live_ids=set(live_ids[5:8]))
+    assert crawler.download_enrich_data(list_file='xlsx1.csv', detail_file='xlsx2.csv', stages=['detail'],
+                                        session=session, rate_limit=0, cache_file=None, plan=False)
+    assert crawler.DeadLetterQueue(crawler.JOURNAL_DIR).ids('detail') == live_ids[5:8]
+
+    # 被中断的普通下载留下的断点续传日志不受重试影响
+    interrupted = crawler.CheckpointJournal('detail')
+    interrupted.append(live_ids[0], {'reserveNoticeUserCount': 1})
+    interrupted.close()
+
+    monkeypatch.setattr(server, 'handle', handle)
+    assert crawler.retry_dead_letters(list_file='xlsx1.csv', session=session, rate_limit=0, cache_file=None)
+    assert crawler.DeadLetterQueue(crawler.JOURNAL_DIR).ids('detail') == []
+    assert os.path.exists(interrupted.path)
+    assert crawler.CheckpointJournal('detail').completed[live_ids[0]] == {'reserveNoticeUserCount': 1}
+
+    detail = pd.read_csv('xlsx2.csv', dtype=str).set_index('liveObjectId')
+    assert detail.index.tolist() == live_ids
+    assert detail.loc[live_ids[5:8], 'reserveNoticeUserCount'].notna().all()
@@ -0,0 +1,48 @@
+"""输出列定义（RECORD_SCHEMAS）"""
+
+import pandas as pd
+import pytest
+
+import crawler
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+@pytest.mark.parametrize('key', ['list', 'detail', 'product', 'ec'])
+def test_schema_dtypes_are_known(key):
+    schema = crawler.RECORD_SCHEMAS[key]
+    assert schema.columns[0] == 'liveObjectId'
+    assert len(set(schema.columns)) == len(schema.columns)
+    assert set(schema.dtypes.values()) <= {'text', 'int', 'float'}
+
+
+def test_spu_metric_fields_are_declared():
+    schema = crawler.RECORD_SCHEMAS['product']
+    fields = crawler.build_spu_payload('1')['fieldList']
+    assert {field for field in fields if field not in ('stock', 'id')} <= set(schema.columns)
+
+
+def test_parquet_columns_use_declared_dtypes(start_server, session):
+    server = start_server(lives=10)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    options = dict(live_ids=live_ids, session=session, workers=4, rate_limit=0, cache_file=None, plan=False)
+    assert crawler.download_product_data(output_file='xlsx3.parquet', **options)
+    assert crawler.download_ec_summary(output_file='xlsx4.parquet', **options)
+
+    product = pq.read_schema('xlsx3.parquet')
+    declared = crawler.RECORD_SCHEMAS['product'].columns
+    assert product.names[:len(declared)] == declared
+    assert product.field('spuId').type == pa.string()
+    assert product.field('gmv').type == pa.int64()
+    assert product.field('pay_pv').type == pa.int64()
+    assert product.field('clk_pay_ratio').type == pa.float64()
+    # 模拟服务器不返回的指标也按声明的类型输出（全部缺失）
+    assert product.field('share_uv').type == pa.int64()
+    assert pd.read_parquet('xlsx3.parquet')['share_uv'].isna().all()
+
+    # 接口4只声明 liveObjectId，返回的字段按原始键名追加在后面
+    ec = pq.read_schema('xlsx4.parquet')
+    assert crawler.RECORD_SCHEMAS['ec'].columns == ['liveObjectId']
+    assert ec.names == ['liveObjectId'] + list(server.dataset.ec_summary(live_ids[0]))
+    assert len(pd.read_parquet('xlsx4.parquet')) == len(live_ids)
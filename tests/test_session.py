@@ -0,0 +1,41 @@
+"""复用连接池的 HTTP 会话"""
+
+import threading
+
+import crawler
+
+
+def test_create_http_session_presets_credentials_and_pool():
+    session = crawler.create_http_session({'User-Agent': 'ua'}, {'token': 't'}, pool_size=7)
+    adapter = session.get_adapter('https://channels.weixin.qq.com')
+    assert adapter._pool_maxsize == 7
+    assert session.get_adapter('http://127.0.0.1') is adapter
+    assert session.headers['User-Agent'] == 'ua'
+    assert session.headers['Connection'] == 'keep-alive'
+    assert session.cookies.get('token') == 't'
+    session.close()
+
+
+def test_download_reuses_connections(start_server, monkeypatch):
+    server = start_server(lives=30)
+    live_ids = [live_id for live_id, _ in server.dataset.lives]
+    httpd = server._httpd
+    accept = httpd.get_request
+    connections = []
+    lock = threading.Lock()
+
+    def counting_accept():
+        request = accept()
+        with lock:
+            connections.append(request[1])
+        return request
+
+    monkeypatch.setattr(httpd, 'get_request', counting_accept)
+    workers = 4
+    session = crawler.create_http_session({'User-Agent': 'test'}, {}, pool_size=workers)
+    assert crawler.download_detail_data(output_file='xlsx2.csv', live_ids=live_ids, session=session,
+                                        workers=workers, rate_limit=0, cache_file=None, plan=False)
+    session.close()
+    # 30 个请求复用连接池中的连接，新建的连接数不超过并发数
+    assert server.stats['接口2']['requests'] == len(live_ids)
+    assert 1 <= len(connections) <= workers